@@ -2,11 +2,25 @@ import time
 import threading
 import json
 import uuid
+import datetime as dt
+from collections import deque
+from urllib.parse import urlsplit
 import requests
 from ping3 import ping
 
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import websocket  # websocket-client
+except ImportError:
+    websocket = None
+
 class NetAgent:
-    def __init__(self, name, api_url="http://127.0.0.1:8000/telemetry", peers=None, location=None, ssid=None, bssid=None):
+    def __init__(self, name, api_url="http://127.0.0.1:8000/telemetry", peers=None, location=None, ssid=None, bssid=None,
+                 use_msgpack=False, transport="http"):
         self.name = name
         self.device_id = str(uuid.uuid4())
         self.api_url = api_url
@@ -15,6 +29,21 @@ class NetAgent:
         self.location = location
         self.ssid = ssid
         self.bssid = bssid
+        # Compact binary bodies when the msgpack package is available
+        self.use_msgpack = use_msgpack and msgpack is not None
+        # One keep-alive connection instead of a new TCP handshake per sample
+        self.session = requests.Session()
+        # "ws" streams samples over /ws/telemetry; falls back to HTTP without websocket-client
+        self.transport = "ws" if transport == "ws" and websocket is not None else "http"
+        self.interval = 5  # seconds between samples; the server can change it over the socket
+        self.ws = None
+        self.seq = 0
+        self.unacked = {}  # seq -> sample sent over the socket but not yet acked
+        self._ws_lock = threading.Lock()
+        # Samples measured while the backend was unreachable, uploaded in one batch later
+        self.backlog = deque(maxlen=10000)
+        # time.monotonic() before which the server has asked us not to send (Retry-After)
+        self.resume_at = 0.0
 
     def measure_network(self, target="8.8.8.8"):
         latency = ping(target, unit="ms")
@@ -35,11 +64,129 @@ class NetAgent:
             data["ssid"] = self.ssid
         if self.bssid:
             data["bssid"] = self.bssid
+        if self._backing_off():
+            return  # the server is shedding load; this sample is dropped, not buffered
         try:
-            requests.post(self.api_url, json=data)
+            if self.transport == "ws":
+                self._send_ws(data)
+            else:
+                if self.use_msgpack:
+                    response = self.session.post(self.api_url, data=msgpack.packb(data), timeout=5,
+                                                 headers={"Content-Type": "application/msgpack"})
+                else:
+                    response = self.session.post(self.api_url, json=data, timeout=5)
+                if response.status_code in (429, 503):
+                    self._back_off(response.headers.get("Retry-After"))
+                    print(f"[{self.name}] Telemetry shed by server, backing off")
+                    return
+                response.raise_for_status()
             print(f"[{self.name}] Sent telemetry → {data}")
         except Exception as e:
-            print(f"[{self.name}] Error sending telemetry: {e}")
+            data["timestamp"] = dt.datetime.utcnow().isoformat() + "Z"
+            self.backlog.append(data)
+            print(f"[{self.name}] Error sending telemetry ({len(self.backlog)} buffered): {e}")
+            return
+        if self.backlog:
+            self.flush_backlog()
+
+    def flush_backlog(self):
+        """Upload buffered samples to /telemetry/batch in a single request"""
+        if self._backing_off():
+            return
+        samples = list(self.backlog)
+        try:
+            response = self.session.post(self.api_url.rstrip("/") + "/batch", json=samples, timeout=30)
+            if response.status_code in (429, 503):
+                self._back_off(response.headers.get("Retry-After"))
+                print(f"[{self.name}] Buffered samples shed by server, backing off")
+                return
+            response.raise_for_status()
+            body = response.json()
+            for _ in samples:
+                self.backlog.popleft()
+            # Samples the server could not admit yet stay buffered until its retry_after has passed
+            shed = body.get("shed") or []
+            self.backlog.extendleft(reversed([samples[i] for i in shed]))
+            if shed:
+                self._back_off(body.get("retry_after"))
+            print(f"[{self.name}] Uploaded {len(samples) - len(shed)} buffered samples ({len(shed)} deferred)")
+        except Exception as e:
+            print(f"[{self.name}] Error uploading buffered samples: {e}")
+
+    def _back_off(self, retry_after):
+        try:
+            delay = float(retry_after)
+        except (TypeError, ValueError):
+            delay = self.interval
+        self.resume_at = max(self.resume_at, time.monotonic() + delay)
+
+    def _backing_off(self):
+        return time.monotonic() < self.resume_at
+
+    def _ws_url(self):
+        parts = urlsplit(self.api_url)
+        scheme = "wss" if parts.scheme == "https" else "ws"
+        base = parts.path.rsplit("/telemetry", 1)[0]
+        return f"{scheme}://{parts.netloc}{base}/ws/telemetry"
+
+    def _send_ws(self, data):
+        """Stream one sample over the persistent socket, (re)connecting if needed"""
+        with self._ws_lock:
+            if self.ws is None:
+                self.ws = websocket.create_connection(self._ws_url(), timeout=5)
+                # The 5s timeout is for the handshake only; the reader idles between samples
+                self.ws.settimeout(None)
+                threading.Thread(target=self._ws_reader, args=(self.ws,), daemon=True).start()
+            self.seq += 1
+            # Timestamped so that, if never acked, the batch upload keeps the measurement time
+            sample = dict(data, timestamp=dt.datetime.utcnow().isoformat() + "Z")
+            self.unacked[self.seq] = sample
+            try:
+                message = {"seq": self.seq, "sample": sample}
+                if self.use_msgpack:
+                    self.ws.send_binary(msgpack.packb(message))
+                else:
+                    self.ws.send(json.dumps(message))
+            except Exception:
+                del self.unacked[self.seq]
+                self.ws.close()
+                self.ws = None
+                raise
+
+    def _ws_reader(self, ws):
+        """Handle acks and config pushes until the socket drops"""
+        try:
+            while self.running:
+                try:
+                    raw = ws.recv()
+                except Exception:
+                    break
+                if not raw:
+                    break
+                self.handle_server_message(msgpack.unpackb(raw) if isinstance(raw, bytes) else json.loads(raw))
+        finally:
+            try:
+                ws.close()
+            except Exception:
+                pass
+            with self._ws_lock:
+                if self.ws is ws:
+                    self.ws = None
+                # Anything the server never acknowledged is re-sent through /telemetry/batch
+                self.backlog.extend(self.unacked.values())
+                self.unacked.clear()
+
+    def handle_server_message(self, msg):
+        if msg.get("type") == "config":
+            self.interval = msg.get("interval_s", self.interval)
+            print(f"[{self.name}] Config from server: {msg}")
+        elif msg.get("type") == "ack" and msg.get("seq") is not None:
+            # Shed samples are dropped, not re-sent; the send loop pauses for retry_after instead
+            if msg.get("shed"):
+                self._back_off(msg.get("retry_after") or self.interval)
+            with self._ws_lock:
+                for seq in [s for s in self.unacked if s <= msg["seq"]]:
+                    del self.unacked[seq]
 
     def receive_message(self, msg):
         """Handle messages from peers"""
@@ -62,7 +209,7 @@ class NetAgent:
                 alert = f"⚠️ High latency ({latency:.1f}ms)"
                 self.broadcast(alert)
 
-            time.sleep(5)
+            time.sleep(self.interval)
 
     def start(self):
         thread = threading.Thread(target=self.monitor_loop)
@@ -0,0 +1,136 @@
+"""
+Ingest admission control
+Per-device token buckets, a global ingest budget and priority-aware load
+shedding: duplicates go first, alerts and first-seen devices last
+"""
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+# Sample priorities, lowest value shed first
+PRIORITY_LOW = 0      # repeats the device's previous reading
+PRIORITY_NORMAL = 1
+PRIORITY_HIGH = 2     # alert-worthy reading or a device we have not seen yet
+
+PRIORITY_NAMES = {PRIORITY_LOW: "low", PRIORITY_NORMAL: "normal", PRIORITY_HIGH: "high"}
+
+# Fraction of the global burst that must remain for a priority to be admitted
+GLOBAL_RESERVE = {PRIORITY_LOW: 0.5, PRIORITY_NORMAL: 0.1, PRIORITY_HIGH: 0.0}
+# Ingest queue fill ratio above which a priority is shed regardless of tokens
+QUEUE_PRESSURE_LIMIT = {PRIORITY_LOW: 0.5, PRIORITY_NORMAL: 0.8, PRIORITY_HIGH: 1.0}
+
+
+class TokenBucket:
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_for(self, level: float) -> float:
+        """Seconds until the bucket holds `level` tokens"""
+        return max(0.0, (level - self.tokens) / self.rate) if self.rate > 0 else math.inf
+
+
+class AdmissionController:
+    def __init__(self, device_rate: float = 1.0, device_burst: float = 10,
+                 global_rate: float = 2000, global_burst: float = 4000, max_devices: int = 10000):
+        self.device_rate = device_rate
+        self.device_burst = device_burst
+        self.max_devices = max_devices
+        self.global_bucket = TokenBucket(global_rate, global_burst, time.monotonic())
+        self.devices: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        # device -> {"admitted": n, "shed": n}
+        self.device_counters: "OrderedDict[str, Dict[str, int]]" = OrderedDict()
+        self.counters = {"admitted": 0, "shed_device_rate": 0, "shed_global": 0, "shed_backpressure": 0,
+                         "shed_batches": 0}
+        self.shed_by_priority = {name: 0 for name in PRIORITY_NAMES.values()}
+        self._lock = threading.Lock()
+
+    def admit(self, device_id: str, priority: int = PRIORITY_NORMAL,
+              queue_pressure: float = 0.0) -> Tuple[bool, float, Optional[str]]:
+        """(admitted, retry_after_seconds, shed_reason) for one sample"""
+        with self._lock:
+            reason, retry_after = self._admit_locked(device_id, priority, queue_pressure, time.monotonic())
+        return reason is None, retry_after, reason
+
+    def admit_batch(self, samples: List[Tuple[str, int]],
+                    queue_pressure: float = 0.0) -> Tuple[List[bool], float, Optional[str]]:
+        """(admitted per sample, retry_after_seconds, shed_reason) for a bulk upload of (device_id, priority)
+
+        Every sample is charged to its device and to the global bucket exactly as a live
+        one would be, so an upload can never overdraw either; the longest wait is reported.
+        """
+        now = time.monotonic()
+        admitted, retry_after, reason = [], 0.0, None
+        with self._lock:
+            for device_id, priority in samples:
+                shed, wait = self._admit_locked(device_id, priority, queue_pressure, now)
+                admitted.append(shed is None)
+                if shed is not None and (reason is None or wait > retry_after):
+                    reason, retry_after = shed, wait
+            if reason is not None:
+                self.counters["shed_batches"] += 1
+        return admitted, retry_after, reason
+
+    def _admit_locked(self, device_id: str, priority: int, queue_pressure: float,
+                      now: float) -> Tuple[Optional[str], float]:
+        bucket = self.devices.get(device_id)
+        if bucket is None:
+            if len(self.devices) >= self.max_devices:
+                self.devices.popitem(last=False)
+            bucket = self.devices[device_id] = TokenBucket(self.device_rate, self.device_burst, now)
+        else:
+            self.devices.move_to_end(device_id)
+        bucket.refill(now)
+        self.global_bucket.refill(now)
+
+        reason, retry_after = None, 0.0
+        reserve = GLOBAL_RESERVE[priority] * self.global_bucket.burst
+        if queue_pressure >= QUEUE_PRESSURE_LIMIT[priority]:
+            reason, retry_after = "backpressure", 1.0
+        elif bucket.tokens < 1:
+            reason, retry_after = "device_rate", bucket.wait_for(1)
+        elif self.global_bucket.tokens < reserve + 1:
+            reason, retry_after = "global", self.global_bucket.wait_for(reserve + 1)
+
+        if reason is None:
+            bucket.tokens -= 1
+            self.global_bucket.tokens -= 1
+            self.counters["admitted"] += 1
+        else:
+            self.counters[f"shed_{reason}"] += 1
+            self.shed_by_priority[PRIORITY_NAMES[priority]] += 1
+        self._count(device_id, "admitted" if reason is None else "shed")
+        return reason, retry_after
+
+    def stats(self, per_device: bool = True) -> Dict[str, Any]:
+        with self._lock:
+            out = {
+                "device_rate": self.device_rate,
+                "device_burst": self.device_burst,
+                "global_rate": self.global_bucket.rate,
+                "global_burst": self.global_bucket.burst,
+                "global_tokens": round(self.global_bucket.tokens, 1),
+                **self.counters,
+                "shed_by_priority": dict(self.shed_by_priority),
+            }
+            if per_device:
+                out["devices"] = {d: dict(c) for d, c in self.device_counters.items()}
+        return out
+
+    def _count(self, device_id: str, key: str):
+        counters = self.device_counters.get(device_id)
+        if counters is None:
+            if len(self.device_counters) >= self.max_devices:
+                self.device_counters.popitem(last=False)
+            counters = self.device_counters[device_id] = {"admitted": 0, "shed": 0}
+        counters[key] += 1
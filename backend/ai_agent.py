@@ -1,10 +1,26 @@
 import os, json
 import logging
-from anthropic import Anthropic
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout
 from dotenv import load_dotenv
+from starlette.concurrency import run_in_threadpool
+from backend.telemetry import LOG_PATH, tail_records
+from backend.llm import LLMClient
+from backend.prompt_cache import PromptCache, signature
+from backend.device_windows import trend_of
+from backend.incident_outbox import RetryLater
 
 load_dotenv()
-client = Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
+llm = LLMClient.from_env()
+
+# Recommendations keyed by quantized conditions; set PROMPT_CACHE_PATH= (empty) for memory only
+PROMPT_CACHE_PATH = os.getenv("PROMPT_CACHE_PATH", os.path.join(os.path.dirname(__file__), "prompt_cache.db"))
+prompt_cache = PromptCache(
+    PROMPT_CACHE_PATH,
+    ttl=float(os.getenv("PROMPT_CACHE_TTL", "3600")),
+    max_entries=int(os.getenv("PROMPT_CACHE_SIZE", "1024")),
+)
 logger = logging.getLogger("NetAgent")
 
 # Optional Composio import
@@ -15,96 +31,232 @@ except ImportError:
     COMPOSIO_AVAILABLE = False
     logger.warning("Composio SDK not available")
 
-def analyze_logs():
-    log_file = os.path.join(os.path.dirname(__file__), "telemetry_log.json")
+def summarize_logs(tail=tail_records):
+    """Average latency, packet loss and latency trend over the recent telemetry
 
-    if not os.path.exists(log_file):
+    `tail(n)` returns the newest n records; the JSONL log by default.
+    """
+    if not os.path.exists(LOG_PATH):
         return {"error": "No telemetry data yet. Please run the client first."}
 
-    with open(log_file, "r") as f:
-        lines = [line.strip() for line in f.readlines() if line.strip()]
-
-    if not lines:
-        return {"error": "No telemetry entries found."}
-
+    # Only the tail of the log is read, so cost does not grow with file size
     try:
-        records = [json.loads(line) for line in lines[-20:]]
+        records = tail(20)
     except Exception as e:
         return {"error": f"Error parsing telemetry: {e}"}
 
+    if not records:
+        return {"error": "No telemetry entries found."}
+
     valid = [r for r in records if r["latency"] < 9000]
     avg_latency = sum(r["latency"] for r in valid) / len(valid) if valid else 9999
     avg_loss = sum(r["packetLoss"] for r in records) / len(records)
 
+    return {
+        "avg_latency_ms": round(avg_latency, 2),
+        "avg_packet_loss": round(avg_loss, 2),
+        "latency_trend": trend_of([r["latency"] for r in valid]),
+    }
+
+
+async def analyze_logs():
+    """Averages of the recent telemetry plus a Claude recommendation"""
+    result = await run_in_threadpool(summarize_logs)
+    if "error" not in result:
+        text, source = await recommend(result["avg_latency_ms"], result["avg_packet_loss"], result["latency_trend"])
+        result["claude_recommendation"] = text
+        result["recommendation_source"] = source
+    return result
+
+
+def local_recommendation(avg_latency, avg_loss):
+    """Rule-based recommendation used when the LLM is unavailable"""
+    if avg_latency >= 9000 or avg_loss >= 0.5:
+        return "Connection drop is very likely: most pings are failing, so check the access point and uplink now."
+    if avg_loss >= 0.1:
+        return f"Connection drop is likely: packet loss is {avg_loss * 100:.0f}%, so move clients to a less congested access point."
+    if avg_latency > 200:
+        return f"Connection is degraded at {avg_latency:.0f} ms average latency; a drop is possible, so check for congestion."
+    return "Connection looks stable; no action needed."
+
+
+async def recommend(avg_latency, avg_loss, trend="flat", location=None, use_llm=True, on_text=None):
+    """(recommendation, source) for the given averages; served from the prompt cache when conditions repeat
+
+    With use_llm=False a cache miss is answered by the local rules (source "rules").
+    `on_text` receives the recommendation as it streams (in one piece when not from the LLM)."""
+    # Scoped by backend so a stand-in's answers never stand in for Claude's
+    sig = f"{llm.backend.name}|{signature(avg_latency, avg_loss, trend, location)}"
+    cached = prompt_cache.get(sig)
+    if cached is not None:
+        if on_text:
+            on_text(cached)
+        return cached, "cache"
+    if not use_llm:
+        text = local_recommendation(avg_latency, avg_loss)
+        if on_text:
+            on_text(text)
+        return text, "rules"
+
+    where = f" at {location}" if location else ""
     prompt = f"""
-    You are NetAgent analyzing real network telemetry.
+    You are NetAgent analyzing real network telemetry{where}.
     Average latency: {avg_latency:.2f} ms
     Average packet loss: {avg_loss:.2f}
+    Latency trend: {trend}
     Predict if a connection drop is likely and give a one-sentence recommendation.
     """
 
-    msg = client.messages.create(
-        model="claude-sonnet-4-20250514",
-        max_tokens=300,
-        messages=[{"role": "user", "content": prompt}]
+    text, source = await llm.complete(
+        prompt, fallback=lambda: local_recommendation(avg_latency, avg_loss), max_tokens=300, on_text=on_text
     )
+    if source != "fallback":
+        prompt_cache.put(sig, text)
+    return text, source
 
-    return {
-        "avg_latency_ms": round(avg_latency, 2),
-        "avg_packet_loss": round(avg_loss, 2),
-        "claude_recommendation": msg.content[0].text.strip()
-    }
 
+def _zone_signature(zone):
+    return f"{llm.backend.name}|{signature(zone['avg_latency_ms'], zone['avg_packet_loss'], zone['trend'], zone['name'])}"
 
-def trigger_incident_response(alert_reason: str, telemetry_data: dict) -> dict:
+
+def _parse_zone_answers(text):
+    """JSON object of zone id -> recommendation from a model reply, tolerating surrounding prose"""
+    start, end = text.find("{"), text.rfind("}")
+    if start < 0 or end <= start:
+        return {}
+    try:
+        answers = json.loads(text[start:end + 1])
+    except ValueError:
+        return {}
+    return {str(k): str(v).strip() for k, v in answers.items() if isinstance(v, str) and v.strip()} if isinstance(answers, dict) else {}
+
+
+async def recommend_batch(zones, max_zones=25):
+    """One LLM call per `max_zones` zones instead of one per zone
+
+    `zones` are dicts with name, avg_latency_ms, avg_packet_loss and trend. Returns a
+    (recommendation, source) per zone in the same order; answers are also stored per
+    zone in the prompt cache, and zones the reply does not cover fall back to the local rules.
     """
-    Multi-step incident response workflow:
-    1. Send email alert via Gmail
-    2. Create Jira ticket for tracking
-    3. Send Slack notification to team
-    
-    Args:
-        alert_reason: Description of the alert/incident
-        telemetry_data: Network telemetry data (latency, packet loss, etc.)
-    
-    Returns:
-        dict: Results of each action (email, jira, slack)
+    results = [None] * len(zones)
+    pending = []
+    for index, zone in enumerate(zones):
+        cached = prompt_cache.get(_zone_signature(zone))
+        if cached is not None:
+            results[index] = (cached, "cache")
+        else:
+            pending.append((index, zone))
+
+    for i in range(0, len(pending), max_zones):
+        chunk = pending[i:i + max_zones]
+        # Short numeric ids keep zone names out of the JSON keys the model has to echo back
+        lines = "\n".join(
+            f"    {n}. {zone['name']}: avg latency {zone['avg_latency_ms']:.2f} ms, "
+            f"avg packet loss {zone['avg_packet_loss']:.2f}, latency trend {zone['trend']}"
+            for n, (_, zone) in enumerate(chunk, 1)
+        )
+        prompt = f"""
+    You are NetAgent analyzing real network telemetry for several venue zones.
+{lines}
+    For each zone, predict if a connection drop is likely and give a one-sentence recommendation.
+    Respond with only a JSON object mapping each zone number (as a string) to its recommendation.
     """
-    if not COMPOSIO_AVAILABLE:
-        return {"error": "Composio SDK not available"}
-    
-    # Get configuration from environment
-    composio_api_key = os.getenv("COMPOSIO_API_KEY")
-    composio_entity_id = os.getenv("COMPOSIO_ENTITY_ID", "netagent-default")
+        text, source = await llm.complete(prompt, fallback=lambda: "", max_tokens=100 + 80 * len(chunk))
+        answers = _parse_zone_answers(text) if source != "fallback" else {}
+        if source != "fallback" and not answers:
+            logger.warning(f"Batched analysis reply could not be parsed for {len(chunk)} zones")
+        for n, (index, zone) in enumerate(chunk, 1):
+            answer = answers.get(str(n))
+            if answer:
+                prompt_cache.put(_zone_signature(zone), answer)
+                results[index] = (answer, source)
+            else:
+                results[index] = (local_recommendation(zone["avg_latency_ms"], zone["avg_packet_loss"]), "fallback")
+    return results
+
+
+# Incident actions run on a small shared pool so Gmail, Jira and Slack overlap
+INCIDENT_STEP_TIMEOUT = float(os.getenv("INCIDENT_STEP_TIMEOUT", "8"))   # seconds per action
+INCIDENT_DEADLINE = float(os.getenv("INCIDENT_DEADLINE", "15"))          # seconds for the whole workflow
+SLACK_UPDATE_SLUG = os.getenv("SLACK_UPDATE_SLUG", "SLACK_UPDATES_A_SLACK_MESSAGE")
+JIRA_COMMENT_SLUG = os.getenv("JIRA_COMMENT_SLUG", "JIRA_ADD_COMMENT")
+_incident_pool = ThreadPoolExecutor(max_workers=int(os.getenv("INCIDENT_WORKERS", "6")), thread_name_prefix="incident")
+_composio_lock = threading.Lock()
+_composio_client = None
+
+
+def get_composio_client(api_key):
+    """One Composio client for every incident (built on first use)"""
+    global _composio_client
+    with _composio_lock:
+        if _composio_client is None:
+            _composio_client = Composio(api_key=api_key)
+        return _composio_client
+
+
+def _find_key(obj, key):
+    """First value for `key` anywhere in a nested tool result"""
+    if isinstance(obj, dict):
+        if obj.get(key):
+            return obj[key]
+        obj = list(obj.values())
+    if isinstance(obj, list):
+        for item in obj:
+            found = _find_key(item, key)
+            if found:
+                return found
+    return None
+
+
+def _timed(fn):
+    """Run fn() and return (result, error, duration_ms)"""
+    start = time.perf_counter()
+    try:
+        return fn(), None, round((time.perf_counter() - start) * 1000, 1)
+    except Exception as e:
+        return None, e, round((time.perf_counter() - start) * 1000, 1)
+
+
+def _await_step(future, submitted, deadline):
+    """(result, error, duration_ms) of a step submitted at `submitted`, or a timeout once its budget runs out"""
+    cutoff = min(submitted + INCIDENT_STEP_TIMEOUT, deadline)
+    try:
+        return future.result(timeout=max(0.0, cutoff - time.monotonic()))
+    except FuturesTimeout:
+        # The call keeps running on its worker; the workflow stops waiting for it
+        waited = cutoff - submitted
+        return None, TimeoutError(f"no response within {waited:.1f}s"), round(waited * 1000, 1)
+
+
+def execute_action(slug, arguments):
+    """Run one Composio tool call with the shared client"""
+    composio_client = get_composio_client(os.getenv("COMPOSIO_API_KEY"))
+    return composio_client.tools.execute(
+        slug=slug,
+        arguments=arguments,
+        user_id=os.getenv("COMPOSIO_ENTITY_ID", "netagent-default"),
+        dangerously_skip_version_check=True
+    )
+
+
+def incident_actions(alert_reason: str, telemetry_data: dict) -> dict:
+    """Tool calls for one incident: {"email"?, "jira", "slack"} -> {"slug", "arguments"}"""
     alert_email_to = os.getenv("ALERT_EMAIL_TO")
     jira_project_key = os.getenv("JIRA_PROJECT_KEY", "NET")  # Default project key
     slack_channel = os.getenv("SLACK_CHANNEL", "#connectivity-alerts")  # Default channel
+
+    # Extract telemetry details
+    avg_latency = telemetry_data.get("avg_latency_ms", "N/A")
+    avg_loss = telemetry_data.get("avg_packet_loss", "N/A")
+    device_id = telemetry_data.get("deviceId", "unknown")
+    location = telemetry_data.get("location", "N/A")
     
-    if not composio_api_key:
-        return {"error": "COMPOSIO_API_KEY not configured"}
+    # Incident details for all integrations
+    incident_title = f"Network Alert: {alert_reason.split(':')[0]}"
     
-    results = {
-        "email": {"status": "skipped", "reason": "not configured"},
-        "jira": {"status": "skipped", "reason": "not configured"},
-        "slack": {"status": "skipped", "reason": "not configured"},
-        "timestamp": telemetry_data.get("timestamp", "N/A")
-    }
+    claude_rec = telemetry_data.get('claude_recommendation', '')
     
-    try:
-        composio_client = Composio(api_key=composio_api_key)
-        
-        # Extract telemetry details
-        avg_latency = telemetry_data.get("avg_latency_ms", "N/A")
-        avg_loss = telemetry_data.get("avg_packet_loss", "N/A")
-        device_id = telemetry_data.get("deviceId", "unknown")
-        location = telemetry_data.get("location", "N/A")
-        
-        # Incident details for all integrations
-        incident_title = f"Network Alert: {alert_reason.split(':')[0]}"
-        
-        claude_rec = telemetry_data.get('claude_recommendation', '')
-        
-        incident_description = f"""
+    incident_description = f"""
 **Network Issue Detected**
 
 **Alert Reason:** {alert_reason}
@@ -122,94 +274,8 @@ def trigger_incident_response(alert_reason: str, telemetry_data: dict) -> dict:
 **Action Required:**
 Please investigate the network conditions and take corrective action if necessary.
 """
-        
-        # Step 1: Send Email Alert
-        if alert_email_to:
-            try:
-                logger.info(f"Step 1/3: Sending email alert to {alert_email_to}...")
-                email_result = composio_client.tools.execute(
-                    slug="GMAIL_SEND_EMAIL",
-                    arguments={
-                        "recipient_email": alert_email_to,
-                        "subject": incident_title,
-                        "body": incident_description,
-                    },
-                    user_id=composio_entity_id,
-                    dangerously_skip_version_check=True
-                )
-                
-                results["email"] = {
-                    "status": "success",
-                    "recipient": alert_email_to,
-                    "result": email_result
-                }
-                logger.info(f"✅ Email alert sent successfully")
-                
-            except Exception as e:
-                logger.error(f"❌ Email alert failed: {e}")
-                results["email"] = {
-                    "status": "error",
-                    "error": str(e)
-                }
-        
-        # Step 2: Create Jira Ticket
-        try:
-            logger.info(f"Step 2/3: Creating Jira ticket in project {jira_project_key}...")
-            
-            # Try to create Jira ticket with common issue type
-            # Note: If "Task" doesn't work, check your Jira project settings for available issue types
-            issue_type = os.getenv("JIRA_ISSUE_TYPE", "Task")  # Most projects have "Task"
-            
-            jira_result = composio_client.tools.execute(
-                slug="JIRA_CREATE_ISSUE",
-                arguments={
-                    "project_key": jira_project_key,
-                    "summary": incident_title,
-                    "description": incident_description,
-                    "issue_type": issue_type,
-                    "priority": "High" if avg_latency > 500 or avg_loss > 0.10 else "Medium"
-                },
-                user_id=composio_entity_id,
-                dangerously_skip_version_check=True
-            )
-            
-            # Extract ticket key and URL from result
-            # Composio returns the data in a nested structure
-            ticket_key = "N/A"
-            ticket_url = "N/A"
-            
-            if isinstance(jira_result, dict):
-                # Check if data exists in the response
-                data = jira_result.get("data", {})
-                if isinstance(data, dict):
-                    ticket_key = data.get("key", "N/A")
-                    # Use browser_url if available, otherwise construct it
-                    ticket_url = data.get("browser_url", "N/A")
-                    if ticket_url == "N/A" and ticket_key != "N/A":
-                        # Fallback: construct URL from key
-                        ticket_url = f"https://your-domain.atlassian.net/browse/{ticket_key}"
-            
-            results["jira"] = {
-                "status": "success",
-                "ticket_key": ticket_key,
-                "ticket_url": ticket_url,
-                "result": jira_result
-            }
-            logger.info(f"✅ Jira ticket created: {ticket_key}")
-            
-        except Exception as e:
-            logger.error(f"❌ Jira ticket creation failed: {e}")
-            results["jira"] = {
-                "status": "error",
-                "error": str(e)
-            }
-        
-        # Step 3: Send Slack Notification
-        try:
-            logger.info(f"Step 3/3: Sending Slack notification to {slack_channel}...")
-            
-            # Build Slack message with ticket link if available
-            slack_message = f"""🚨 *{incident_title}*
+
+    slack_message = f"""🚨 *{incident_title}*
 
 *Alert:* {alert_reason}
 
@@ -220,36 +286,144 @@ Please investigate the network conditions and take corrective action if necessar
 • Location: {location}
 
 *Status:* Investigating"""
-            
-            # Add Jira ticket link if created
-            if results["jira"]["status"] == "success":
-                ticket_key = results["jira"]["ticket_key"]
-                ticket_url = results["jira"]["ticket_url"]
-                slack_message += f"\n\n*Jira Ticket:* <{ticket_url}|{ticket_key}>"
-            
-            slack_result = composio_client.tools.execute(
-                slug="SLACK_SEND_MESSAGE",
-                arguments={
-                    "channel": slack_channel,
-                    "text": slack_message,
-                },
-                user_id=composio_entity_id,
-                dangerously_skip_version_check=True
-            )
-            
-            results["slack"] = {
+
+    # Note: If "Task" doesn't work, check your Jira project settings for available issue types
+    issue_type = os.getenv("JIRA_ISSUE_TYPE", "Task")  # Most projects have "Task"
+    actions = {
+        "jira": {"slug": "JIRA_CREATE_ISSUE", "arguments": {
+            "project_key": jira_project_key,
+            "summary": incident_title,
+            "description": incident_description,
+            "issue_type": issue_type,
+            "priority": "High" if avg_latency > 500 or avg_loss > 0.10 else "Medium"
+        }},
+        "slack": {"slug": "SLACK_SEND_MESSAGE", "arguments": {"channel": slack_channel, "text": slack_message}},
+    }
+    if alert_email_to:
+        actions["email"] = {"slug": "GMAIL_SEND_EMAIL", "arguments": {
+            "recipient_email": alert_email_to,
+            "subject": incident_title,
+            "body": incident_description,
+        }}
+    return actions
+
+
+def ticket_from_result(jira_result):
+    """(ticket_key, ticket_url) from a JIRA_CREATE_ISSUE result"""
+    # Composio returns the data in a nested structure
+    ticket_key = "N/A"
+    ticket_url = "N/A"
+    if isinstance(jira_result, dict):
+        data = jira_result.get("data", {})
+        if isinstance(data, dict):
+            ticket_key = data.get("key", "N/A")
+            # Use browser_url if available, otherwise construct it
+            ticket_url = data.get("browser_url", "N/A")
+            if ticket_url == "N/A" and ticket_key != "N/A":
+                # Fallback: construct URL from key
+                ticket_url = f"https://your-domain.atlassian.net/browse/{ticket_key}"
+    return ticket_key, ticket_url
+
+
+def slack_link_action(slack_arguments, slack_result, ticket_key, ticket_url):
+    """Edit the posted Slack message to carry the Jira link, or post it as a follow-up if it can't be edited"""
+    link = f"*Jira Ticket:* <{ticket_url}|{ticket_key}>"
+    message_ts = _find_key(slack_result, "ts")
+    if message_ts:
+        channel_id = _find_key(slack_result, "channel") or slack_arguments["channel"]
+        return SLACK_UPDATE_SLUG, {"channel": channel_id, "ts": message_ts, "text": slack_arguments["text"] + "\n\n" + link}
+    return "SLACK_SEND_MESSAGE", {"channel": slack_arguments["channel"], "text": link}
+
+
+def trigger_incident_response(alert_reason: str, telemetry_data: dict) -> dict:
+    """
+    Multi-step incident response workflow, run concurrently:
+    1. Send email alert via Gmail        } started together, each with
+    2. Create Jira ticket for tracking   } its own timeout
+    3. Post Slack notification to team   }
+    4. Update the Slack message with the Jira link once the ticket exists
+    
+    Args:
+        alert_reason: Description of the alert/incident
+        telemetry_data: Network telemetry data (latency, packet loss, etc.)
+    
+    Returns:
+        dict: Results of each action (email, jira, slack) plus per-step timings_ms
+    """
+    if not COMPOSIO_AVAILABLE:
+        return {"error": "Composio SDK not available"}
+    
+    if not os.getenv("COMPOSIO_API_KEY"):
+        return {"error": "COMPOSIO_API_KEY not configured"}
+    
+    results = {
+        "email": {"status": "skipped", "reason": "not configured"},
+        "jira": {"status": "skipped", "reason": "not configured"},
+        "slack": {"status": "skipped", "reason": "not configured"},
+        "timestamp": telemetry_data.get("timestamp", "N/A")
+    }
+    timings = {}
+    started = time.perf_counter()
+    deadline = time.monotonic() + INCIDENT_DEADLINE
+    
+    try:
+        actions = incident_actions(alert_reason, telemetry_data)
+        slack_arguments = actions["slack"]["arguments"]
+
+        # Start all of them at once
+        logger.info(f"Starting incident actions: {', '.join(actions)}")
+        submitted = time.monotonic()
+        futures = {
+            name: _incident_pool.submit(_timed, lambda action=action: execute_action(action["slug"], action["arguments"]))
+            for name, action in actions.items()
+        }
+
+        # Jira ticket
+        jira_result, error, timings["jira"] = _await_step(futures["jira"], submitted, deadline)
+        if error is None:
+            ticket_key, ticket_url = ticket_from_result(jira_result)
+            results["jira"] = {
                 "status": "success",
-                "channel": slack_channel,
-                "result": slack_result
+                "ticket_key": ticket_key,
+                "ticket_url": ticket_url,
+                "result": jira_result
             }
-            logger.info(f"✅ Slack notification sent successfully")
-            
-        except Exception as e:
-            logger.error(f"❌ Slack notification failed: {e}")
+            logger.info(f"✅ Jira ticket created: {ticket_key} ({timings['jira']} ms)")
+        else:
+            logger.error(f"❌ Jira ticket creation failed: {error}")
+            results["jira"] = {"status": "timeout" if isinstance(error, TimeoutError) else "error", "error": str(error)}
+
+        # Slack post, then the Jira link added to it
+        slack_result, error, timings["slack"] = _await_step(futures["slack"], submitted, deadline)
+        if error is None:
             results["slack"] = {
-                "status": "error",
-                "error": str(e)
+                "status": "success",
+                "channel": slack_arguments["channel"],
+                "result": slack_result
             }
+            logger.info(f"✅ Slack notification sent ({timings['slack']} ms)")
+            if results["jira"]["status"] == "success":
+                slug, arguments = slack_link_action(slack_arguments, slack_result, ticket_key, ticket_url)
+                step = _incident_pool.submit(_timed, lambda: execute_action(slug, arguments))
+                _, error, timings["slack_update"] = _await_step(step, time.monotonic(), deadline)
+                results["slack"]["jira_link"] = "added" if error is None else f"failed: {error}"
+        else:
+            logger.error(f"❌ Slack notification failed: {error}")
+            results["slack"] = {"status": "timeout" if isinstance(error, TimeoutError) else "error", "error": str(error)}
+
+        # Email alert
+        if "email" in futures:
+            email_result, error, timings["email"] = _await_step(futures["email"], submitted, deadline)
+            if error is None:
+                results["email"] = {
+                    "status": "success",
+                    "recipient": actions["email"]["arguments"]["recipient_email"],
+                    "result": email_result
+                }
+                logger.info(f"✅ Email alert sent successfully ({timings['email']} ms)")
+            else:
+                logger.error(f"❌ Email alert failed: {error}")
+                results["email"] = {"status": "timeout" if isinstance(error, TimeoutError) else "error", "error": str(error)}
         
         # Summary
         success_count = sum(1 for r in [results["email"], results["jira"], results["slack"]] 
@@ -269,4 +443,55 @@ Please investigate the network conditions and take corrective action if necessar
         logger.error(f"Incident response workflow failed: {e}")
         results["error"] = str(e)
     
+    timings["total"] = round((time.perf_counter() - started) * 1000, 1)
+    results["timings_ms"] = timings
     return results
+
+
+def enqueue_incident(outbox, incident_id: str, alert_reason: str, telemetry_data: dict) -> list:
+    """Queue every action of an incident in the outbox; returns the idempotency keys"""
+    keys = []
+    for name, action in incident_actions(alert_reason, telemetry_data).items():
+        key = f"{incident_id}:{name}"
+        outbox.enqueue(key, incident_id, name, action)
+        keys.append(key)
+    return keys
+
+
+def enqueue_incident_update(outbox, incident_id: str, seq: str, text: str) -> str:
+    """Queue a child update for an open incident: one comment on its Jira ticket"""
+    key = f"{incident_id}:update-{seq}"
+    outbox.enqueue(key, incident_id, "update", {"text": text})
+    return key
+
+
+def deliver_incident_action(outbox, entry: dict):
+    """Outbox handler: run one queued action; a created Jira ticket queues the Slack link"""
+    payload = entry["payload"]
+    if entry["action"] == "update":
+        jira = outbox.get(f"{entry['incident']}:jira")
+        if jira is None or jira["status"] == "dead":
+            return {"skipped": "incident has no Jira ticket"}
+        if jira["status"] != "delivered":
+            raise RetryLater("waiting for the Jira ticket")
+        ticket_key, _ = ticket_from_result(jira["result"])
+        return execute_action(JIRA_COMMENT_SLUG, {"issue_id_or_key": ticket_key, "comment": payload["text"]})
+    if entry["action"] == "slack_link":
+        slack = outbox.get(f"{entry['incident']}:slack")
+        if slack is None or slack["status"] == "dead":
+            return {"skipped": "Slack message was never posted"}
+        if slack["status"] != "delivered":
+            raise RetryLater("waiting for the Slack post")
+        slug, arguments = slack_link_action(slack["payload"]["arguments"], slack["result"],
+                                            payload["ticket_key"], payload["ticket_url"])
+        return execute_action(slug, arguments)
+
+    result = execute_action(payload["slug"], payload["arguments"])
+    # Composio reports tool-level failures in the result instead of raising
+    if isinstance(result, dict) and result.get("successful") is False:
+        raise RuntimeError(result.get("error") or f"{payload['slug']} failed")
+    if entry["action"] == "jira":
+        ticket_key, ticket_url = ticket_from_result(result)
+        outbox.enqueue(f"{entry['incident']}:slack_link", entry["incident"], "slack_link",
+                       {"ticket_key": ticket_key, "ticket_url": ticket_url})
+    return result
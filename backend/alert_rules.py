@@ -0,0 +1,315 @@
+"""
+Ingest-time alert rules
+Declarative rules are evaluated on every accepted sample against bucketed
+sliding windows per location/SSID, so a zone alerts without anyone polling
+/predict. Each rule can require a short-window and a long-window condition,
+override its thresholds per location or SSID, and has its own cooldown and
+dedup fingerprint per zone.
+
+Rules are JSON (ALERT_RULES_PATH), e.g.
+    [{"name": "high_latency", "metric": "latency", "op": ">",
+      "threshold": 200, "short_window_s": 60,
+      "long_threshold": 150, "long_window_s": 600,
+      "scope": ["location", "ssid"], "min_samples": 5, "cooldown_s": 300,
+      "match": {"location": ["Library"]},
+      "overrides": {"location:Lab": {"threshold": 400}}}]
+"""
+import hashlib
+import json
+import operator
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from backend.device_windows import TIMEOUT_LATENCY_MS
+
+FIRING = "firing"
+RESOLVED = "resolved"
+
+METRICS = ("latency", "loss")
+SCOPES = ("global", "location", "ssid")
+OPS = {">": operator.gt, ">=": operator.ge, "<": operator.lt, "<=": operator.le}
+# Fields a per-location/SSID override may replace
+OVERRIDABLE = ("threshold", "long_threshold", "min_samples", "cooldown_s")
+
+DEFAULT_RULES = [
+    {"name": "high_latency", "metric": "latency", "op": ">", "threshold": 200, "short_window_s": 60,
+     "long_threshold": 150, "long_window_s": 600, "description": "High latency"},
+    {"name": "packet_loss", "metric": "loss", "op": ">", "threshold": 0.1, "short_window_s": 60,
+     "long_threshold": 0.05, "long_window_s": 600, "description": "High packet loss"},
+]
+
+
+def sample_value(metric: str, latency: float, packet_loss: float) -> Optional[float]:
+    """Value a sample contributes to `metric`; timed-out pings count as loss, not latency"""
+    if metric == "latency":
+        return None if latency >= TIMEOUT_LATENCY_MS else latency
+    return 1.0 if latency >= TIMEOUT_LATENCY_MS else packet_loss
+
+
+class SlidingWindow:
+    """Sum and count over the last `window_s` seconds in fixed buckets (O(buckets) to read)"""
+
+    __slots__ = ("bucket_s", "sums", "counts", "stamps")
+
+    def __init__(self, window_s: float, buckets: int = 12):
+        self.bucket_s = window_s / buckets
+        self.sums = [0.0] * buckets
+        self.counts = [0] * buckets
+        self.stamps = [-1] * buckets
+
+    def add(self, ts: float, value: float):
+        b = int(ts // self.bucket_s)
+        i = b % len(self.stamps)
+        if self.stamps[i] > b:
+            return  # backfilled sample; its slot already holds a newer bucket
+        if self.stamps[i] != b:
+            self.stamps[i] = b
+            self.sums[i] = 0.0
+            self.counts[i] = 0
+        self.sums[i] += value
+        self.counts[i] += 1
+
+    def mean(self, ts: float) -> Tuple[Optional[float], int]:
+        oldest = int(ts // self.bucket_s) - len(self.stamps)
+        total, count = 0.0, 0
+        for stamp, s, n in zip(self.stamps, self.sums, self.counts):
+            if stamp > oldest:
+                total += s
+                count += n
+        return (total / count if count else None), count
+
+
+class AlertRule:
+    def __init__(self, name: str, metric: str, threshold: float, op: str = ">", short_window_s: float = 60,
+                 long_threshold: Optional[float] = None, long_window_s: Optional[float] = None,
+                 scope: Optional[List[str]] = None, min_samples: int = 5, cooldown_s: float = 300,
+                 match: Optional[Dict[str, List[str]]] = None, overrides: Optional[Dict[str, Dict[str, Any]]] = None,
+                 description: Optional[str] = None):
+        if metric not in METRICS:
+            raise ValueError(f"rule {name}: metric must be one of {', '.join(METRICS)}")
+        if op not in OPS:
+            raise ValueError(f"rule {name}: op must be one of {', '.join(OPS)}")
+        scope = scope or ["location", "ssid"]
+        if any(kind not in SCOPES for kind in scope):
+            raise ValueError(f"rule {name}: scope must be drawn from {', '.join(SCOPES)}")
+        if (long_threshold is None) != (long_window_s is None):
+            raise ValueError(f"rule {name}: long_threshold and long_window_s go together")
+        for key, values in (overrides or {}).items():
+            unknown = set(values) - set(OVERRIDABLE)
+            if ":" not in key or unknown:
+                raise ValueError(f"rule {name}: bad override {key!r} (keys are kind:name, fields {', '.join(OVERRIDABLE)})")
+        self.name = name
+        self.metric = metric
+        self.op = op
+        self.threshold = threshold
+        self.short_window_s = short_window_s
+        self.long_threshold = long_threshold
+        self.long_window_s = long_window_s
+        self.scope = scope
+        self.min_samples = min_samples
+        self.cooldown_s = cooldown_s
+        self.match = match or {}
+        self.overrides = overrides or {}
+        self.description = description or name
+
+    @classmethod
+    def from_dict(cls, spec: Dict[str, Any]) -> "AlertRule":
+        return cls(**spec)
+
+    def settings(self, kind: str, name: str) -> Dict[str, Any]:
+        """Thresholds for one zone, with its override applied"""
+        base = {field: getattr(self, field) for field in OVERRIDABLE}
+        base.update(self.overrides.get(f"{kind}:{name}", {}))
+        return base
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name, "metric": self.metric, "op": self.op, "threshold": self.threshold,
+            "short_window_s": self.short_window_s, "long_threshold": self.long_threshold,
+            "long_window_s": self.long_window_s, "scope": self.scope, "min_samples": self.min_samples,
+            "cooldown_s": self.cooldown_s, "match": self.match, "overrides": self.overrides,
+            "description": self.description,
+        }
+
+
+def load_rules(path: Optional[str] = None) -> List[AlertRule]:
+    """Rules from a JSON file, or the defaults when no path is given"""
+    if not path:
+        return [AlertRule.from_dict(spec) for spec in DEFAULT_RULES]
+    with open(path) as f:
+        return [AlertRule.from_dict(spec) for spec in json.load(f)]
+
+
+def fingerprint(rule: str, kind: str, name: str) -> str:
+    return hashlib.sha1(f"{rule}|{kind}|{name}".encode()).hexdigest()[:12]
+
+
+class AlertState:
+    __slots__ = ("fingerprint", "firing", "since", "last_fired", "value", "long_value", "fired")
+
+    def __init__(self, fp: str):
+        self.fingerprint = fp
+        self.firing = False
+        self.since = 0.0
+        self.last_fired = None
+        self.value = None
+        self.long_value = None
+        self.fired = 0
+
+
+class AlertRuleEngine:
+    def __init__(self, rules: List[AlertRule], max_keys: int = 20000):
+        self.rules = rules
+        self.max_keys = max_keys
+        # Rules that apply to every zone of a kind, and rules limited to named zones
+        self.by_kind: Dict[str, List[AlertRule]] = {kind: [] for kind in SCOPES}
+        self.by_zone: Dict[Tuple[str, str], List[AlertRule]] = {}
+        for rule in rules:
+            for kind in rule.scope:
+                names = rule.match.get(kind)
+                if names is None:
+                    self.by_kind[kind].append(rule)
+                else:
+                    for name in names:
+                        self.by_zone.setdefault((kind, name), []).append(rule)
+        # (kind, name, metric, window_s) -> window, shared by every rule reading it
+        self.windows: Dict[Tuple[str, str, str, float], SlidingWindow] = {}
+        # (rule, kind, name) -> state
+        self.states: Dict[Tuple[str, str, str], AlertState] = {}
+        self.events: List[Dict[str, Any]] = []
+        self.counters = {"samples": 0, "evaluations": 0, "fired": 0, "suppressed": 0, "resolved": 0}
+        self._lock = threading.Lock()
+
+    def _window(self, key: Tuple[str, str, str, float]) -> SlidingWindow:
+        window = self.windows.get(key)
+        if window is None:
+            if len(self.windows) >= self.max_keys:
+                self.windows.pop(next(iter(self.windows)))
+            window = self.windows[key] = SlidingWindow(key[3])
+        return window
+
+    def observe(self, ts: float, latency: float, packet_loss: float, location: Optional[str] = None,
+                ssid: Optional[str] = None, now: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Feed one sample (epoch seconds); returns firing/resolved events
+
+        Rules are evaluated at `now` (wall time), not at `ts`, so a backfilled
+        sample lands in its own bucket without rewinding the windows.
+        """
+        now = time.time() if now is None else now
+        zones = [("global", "all")]
+        if location:
+            zones.append(("location", location))
+        if ssid:
+            zones.append(("ssid", ssid))
+        events = []
+        with self._lock:
+            self.counters["samples"] += 1
+            for kind, name in zones:
+                rules = self.by_kind[kind] + self.by_zone.get((kind, name), [])
+                if not rules:
+                    continue
+                fed = set()
+                for rule in rules:
+                    value = sample_value(rule.metric, latency, packet_loss)
+                    for window_s in (rule.short_window_s, rule.long_window_s):
+                        key = (kind, name, rule.metric, window_s)
+                        if window_s is not None and value is not None and key not in fed:
+                            self._window(key).add(ts, value)
+                            fed.add(key)
+                    event = self._evaluate(rule, kind, name, now)
+                    if event is not None:
+                        events.append(event)
+            if events:
+                self.events = (self.events + events)[-200:]
+        return events
+
+    def _evaluate(self, rule: AlertRule, kind: str, name: str, now: float) -> Optional[Dict[str, Any]]:
+        self.counters["evaluations"] += 1
+        settings = self._settings(rule, kind, name)
+        compare = OPS[rule.op]
+        value, count = self._window((kind, name, rule.metric, rule.short_window_s)).mean(now)
+        met = value is not None and count >= settings["min_samples"] and compare(value, settings["threshold"])
+        long_value = None
+        if met and rule.long_window_s is not None:
+            long_value, _ = self._window((kind, name, rule.metric, rule.long_window_s)).mean(now)
+            met = long_value is not None and compare(long_value, settings["long_threshold"])
+
+        key = (rule.name, kind, name)
+        state = self.states.get(key)
+        if state is None:
+            if not met:
+                return None
+            if len(self.states) >= self.max_keys:
+                self._evict_state()
+            state = self.states[key] = AlertState(fingerprint(rule.name, kind, name))
+        if met:
+            state.value, state.long_value = value, long_value
+        if met == state.firing:
+            return None
+
+        state.firing = met
+        state.since = now
+        if not met:
+            self.counters["resolved"] += 1
+            return self._event(RESOLVED, rule, kind, name, state, settings, notify=False)
+        # A zone that flaps back within its cooldown is firing again but not re-notified
+        notify = state.last_fired is None or now - state.last_fired >= settings["cooldown_s"]
+        if notify:
+            state.last_fired = now
+            state.fired += 1
+            self.counters["fired"] += 1
+        else:
+            self.counters["suppressed"] += 1
+        return self._event(FIRING, rule, kind, name, state, settings, notify=notify)
+
+    def _settings(self, rule: AlertRule, kind: str, name: str) -> Dict[str, Any]:
+        if not rule.overrides:
+            return {field: getattr(rule, field) for field in OVERRIDABLE}
+        return rule.settings(kind, name)
+
+    def _evict_state(self):
+        # Drop the oldest quiet zone; firing ones are kept
+        for key, state in self.states.items():
+            if not state.firing:
+                del self.states[key]
+                return
+        self.states.pop(next(iter(self.states)))
+
+    def _event(self, status: str, rule: AlertRule, kind: str, name: str, state: AlertState,
+               settings: Dict[str, Any], notify: bool) -> Dict[str, Any]:
+        scale, unit = (1, "ms") if rule.metric == "latency" else (100, "%")
+        return {
+            "status": status,
+            "rule": rule.name,
+            "metric": rule.metric,
+            "kind": kind,
+            "name": name,
+            "fingerprint": state.fingerprint,
+            "occurrence": state.fired,
+            "value": state.value,
+            "long_value": state.long_value,
+            "threshold": settings["threshold"],
+            "at": state.since,
+            "notify": notify,
+            "reason": f"{rule.description} in {kind} {name}: {state.value * scale:.1f}{unit} over "
+                      f"{rule.short_window_s:g}s (threshold: {settings['threshold'] * scale:g}{unit})",
+        }
+
+    def firing(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [
+                {"rule": rule, "kind": kind, "name": name, "fingerprint": s.fingerprint, "since": s.since,
+                 "value": s.value, "long_value": s.long_value, "occurrence": s.fired}
+                for (rule, kind, name), s in self.states.items() if s.firing
+            ]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "rules": len(self.rules),
+                "windows": len(self.windows),
+                "tracked_zones": len(self.states),
+                "firing": sum(1 for s in self.states.values() if s.firing),
+                **self.counters,
+            }
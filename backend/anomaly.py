@@ -0,0 +1,160 @@
+"""
+Incremental change detection on telemetry
+An EWMA baseline plus an upward CUSUM per device, per location and globally
+classifies each stream as stable, degrading or recovering. State changes are
+what justify a fresh LLM recommendation.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from backend.device_windows import TIMEOUT_LATENCY_MS
+
+STABLE = "stable"
+DEGRADING = "degrading"
+RECOVERING = "recovering"
+
+# A lost ping counts as this much latency in the detector signal
+LOSS_PENALTY_MS = 1000.0
+
+
+def signal(latency: float, packet_loss: float) -> float:
+    """One scalar per sample: latency capped at the loss penalty, plus loss"""
+    if latency >= TIMEOUT_LATENCY_MS:
+        latency = LOSS_PENALTY_MS
+    return min(latency, LOSS_PENALTY_MS) + LOSS_PENALTY_MS * packet_loss
+
+
+class ChangeDetector:
+    __slots__ = ("alpha", "k", "h", "warmup", "settle", "mean", "var", "n",
+                 "pos", "calm", "state", "changed_at")
+
+    def __init__(self, alpha: float = 0.05, k: float = 0.5, h: float = 5.0, warmup: int = 10, settle: int = 10):
+        """`k` is the CUSUM slack and `h` the decision threshold, both in baseline std units"""
+        self.alpha = alpha
+        self.k = k
+        self.h = h
+        self.warmup = warmup
+        self.settle = settle
+        self.mean = 0.0
+        self.var = 0.0
+        self.n = 0
+        self.pos = 0.0
+        self.calm = 0
+        self.state = STABLE
+        self.changed_at = time.time()
+
+    def update(self, x: float) -> Optional[str]:
+        """Feed one value; returns the new state when it changes"""
+        self.n += 1
+        if self.n <= self.warmup:
+            self._learn(x)
+            return None
+
+        # Noise floor keeps a very steady baseline from flagging a few ms of jitter
+        std = max(self.var ** 0.5, 0.1 * self.mean, 5.0)
+        z = (x - self.mean) / std
+        self.pos = max(0.0, self.pos + z - self.k)
+        # Consecutive samples back inside the baseline band
+        self.calm = self.calm + 1 if abs(z) < 2 else 0
+
+        previous = self.state
+        if self.state == STABLE:
+            if self.pos > self.h:
+                self._set(DEGRADING)
+        elif self.state == DEGRADING:
+            if self.calm >= self.settle:
+                self._set(RECOVERING)
+        elif self.pos > self.h:
+            self._set(DEGRADING)
+        elif self.calm >= self.settle:
+            self._set(STABLE)
+
+        # The baseline only follows the stream while it is healthy
+        if self.state == STABLE:
+            self._learn(x)
+        return self.state if self.state != previous else None
+
+    def _learn(self, x: float):
+        if self.n == 1:
+            self.mean = x
+            return
+        delta = x - self.mean
+        self.mean += self.alpha * delta
+        self.var = (1 - self.alpha) * (self.var + self.alpha * delta * delta)
+
+    def _set(self, state: str):
+        self.state = state
+        self.pos = 0.0
+        self.calm = 0
+        self.changed_at = time.time()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "baseline": round(self.mean, 2),
+            "baseline_std": round(self.var ** 0.5, 2),
+            "samples": self.n,
+            "since": self.changed_at,
+        }
+
+
+class DetectorStore:
+    def __init__(self, max_keys: int = 10000, **detector_args):
+        self.max_keys = max_keys
+        self.detector_args = detector_args
+        self.detectors: Dict[Tuple[str, str], ChangeDetector] = {}
+        # Device keys, least recently updated first; only devices are evicted past max_keys
+        self.device_lru: "OrderedDict[Tuple[str, str], None]" = OrderedDict()
+        # Bumped on global/location transitions so callers can tell "anything changed?";
+        # individual devices flap too often to drive LLM refreshes
+        self.version = 0
+        self.transitions: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def update(self, latency: float, packet_loss: float, device_id: Optional[str] = None,
+               location: Optional[str] = None, ssid: Optional[str] = None) -> List[Dict[str, Any]]:
+        x = signal(latency, packet_loss)
+        keys = [("global", "all")]
+        if device_id is not None:
+            keys.append(("device", device_id))
+        if location is not None:
+            keys.append(("location", location))
+        if ssid is not None:
+            keys.append(("ssid", ssid))
+        changes = []
+        with self._lock:
+            for key in keys:
+                detector = self.detectors.get(key)
+                if detector is None:
+                    if len(self.detectors) >= self.max_keys and self.device_lru:
+                        del self.detectors[self.device_lru.popitem(last=False)[0]]
+                    detector = self.detectors[key] = ChangeDetector(**self.detector_args)
+                if key[0] == "device":
+                    self.device_lru[key] = None
+                    self.device_lru.move_to_end(key)
+                state = detector.update(x)
+                if state is not None:
+                    if key[0] != "device":
+                        self.version += 1
+                    change = {"kind": key[0], "name": key[1], "state": state, "at": detector.changed_at}
+                    changes.append(change)
+                    self.transitions = (self.transitions + [change])[-100:]
+        return changes
+
+    def state(self, kind: str = "global", name: str = "all") -> str:
+        with self._lock:
+            detector = self.detectors.get((kind, name))
+            return detector.state if detector else STABLE
+
+    def detail(self, kind: str, name: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            detector = self.detectors.get((kind, name))
+            return detector.to_dict() if detector else None
+
+    def states(self, kind: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {
+                f"{k}:{n}": d.to_dict() for (k, n), d in self.detectors.items() if kind is None or k == kind
+            }
@@ -6,7 +6,7 @@ import os
 import asyncio
 
 # Import both systems
-from backend.telemetry import collect_metrics
+from backend.telemetry import write_records, sample_adapter
 from backend.ai_agent import analyze_logs
 from livekit import api
 
@@ -35,13 +35,13 @@ def root():
 # ---- AI Insight ----
 @app.post("/telemetry")
 def post_telemetry(data: dict):
-    collect_metrics(data)
+    write_records([sample_adapter.validate_python(data).to_record(dt.datetime.utcnow())])
     return {"status": "Telemetry received", "data": data}
 
 @app.get("/predict")
-def predict():
+async def predict():
     try:
-        insight = analyze_logs()
+        insight = await analyze_logs()
         return {"insight": insight}
     except Exception as e:
         import traceback
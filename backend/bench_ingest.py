@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""Benchmark POST /telemetry: legacy dict+echo handler vs typed JSON vs msgpack
+
+Runs in-process over ASGI (no sockets), so it measures the per-request CPU
+cost of decoding, validating and acknowledging a sample.
+
+    python -m backend.bench_ingest [--requests 5000] [--concurrency 50]
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+
+# Keep the benchmark off disk: nothing is flushed while it runs
+os.environ.setdefault("TELEMETRY_DB_PATH", "")
+os.environ.setdefault("TELEMETRY_QUEUE_MAX", str(10 ** 7))
+# Every request reuses one deviceId; lift the admission limits so none are shed
+for name in ("INGEST_DEVICE_RATE", "INGEST_DEVICE_BURST", "INGEST_GLOBAL_RATE", "INGEST_GLOBAL_BURST"):
+    os.environ.setdefault(name, str(10 ** 9))
+
+import httpx
+from fastapi import FastAPI
+
+from backend import main
+
+SAMPLE = {
+    "deviceId": "3f1b7c9e-2a44-4d0e-9a51-0c6f6f1b2d11",
+    "latency": 42.137,
+    "packetLoss": 0,
+    "agent": "Alpha",
+    "location": "Main Hall",
+    "ssid": "venue-guest",
+    "bssid": "aa:bb:cc:dd:ee:ff",
+}
+
+
+def legacy_app() -> FastAPI:
+    """The pre-schema handler: untyped dict body, .get chains, payload echoed back"""
+    app = FastAPI()
+    queued = []
+
+    @app.post("/telemetry")
+    def post_telemetry(data: dict):
+        device_id = data.get('deviceId', data.get('agent', 'unknown'))
+        latency = data.get('latency', 0)
+        packet_loss = data.get('packetLoss', data.get('packet_loss', 0))
+        queued.append((device_id, latency, packet_loss))
+        return {"status": "Telemetry received", "data": data}
+
+    return app
+
+
+async def run(app, body: bytes, content_type: str, requests: int, concurrency: int):
+    transport = httpx.ASGITransport(app=app)
+    headers = {"content-type": content_type}
+    sent = received = 0
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def worker(n):
+            nonlocal received
+            for _ in range(n):
+                r = await client.post("/telemetry", content=body, headers=headers)
+                assert r.status_code == 200, r.text
+                received += len(r.content)
+
+        per_worker = requests // concurrency
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(per_worker) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+        sent = per_worker * concurrency
+    return sent / elapsed, len(body), received / sent
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+
+    cases = [("legacy dict + echo (JSON)", legacy_app(), json.dumps(SAMPLE).encode(), "application/json"),
+             ("typed schema (JSON)", main.app, json.dumps(SAMPLE).encode(), "application/json")]
+    if main.msgpack is not None:
+        cases.append(("typed schema (msgpack)", main.app, main.msgpack.packb(SAMPLE), "application/msgpack"))
+
+    print(f"{'handler':<28} {'req/s':>10} {'req bytes':>10} {'resp bytes':>11}")
+    for name, app, body, content_type in cases:
+        rps, req_bytes, resp_bytes = asyncio.run(run(app, body, content_type, args.requests, args.concurrency))
+        print(f"{name:<28} {rps:>10.0f} {req_bytes:>10} {resp_bytes:>11.0f}")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""Benchmark the LLM layer against the local stand-in backend (no network)
+
+Compares the old pattern (a blocking call per request on the threadpool) with
+the async client, and shows deadlines/circuit breaker under injected failures.
+
+    python -m backend.bench_llm [--calls 400] [--concurrency 100] [--latency-ms 200]
+"""
+import argparse
+import asyncio
+import logging
+import time
+
+from starlette.concurrency import run_in_threadpool
+
+from backend.llm import CircuitBreaker, LLMClient, LocalBackend
+from backend.sketches import LatencySketch
+
+
+async def drive(call, calls: int, concurrency: int):
+    """Run `calls` invocations of `call` from `concurrency` workers; (calls/s, latency sketch, results)"""
+    latency = LatencySketch(timeout_ms=None)
+    results = []
+    per_worker = calls // concurrency
+
+    async def worker():
+        for _ in range(per_worker):
+            start = time.perf_counter()
+            results.append(await call())
+            latency.add((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return per_worker * concurrency / (time.perf_counter() - start), latency, results
+
+
+def blocking_call(latency_ms: float):
+    # Stands in for the old synchronous client.messages.create
+    time.sleep(latency_ms / 1000)
+    return "ok"
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--latency-ms", type=float, default=200)
+    parser.add_argument("--max-concurrency", type=int, default=40, help="async client semaphore size (threadpool default is 40)")
+    parser.add_argument("--timeout", type=float, default=2.0)
+    parser.add_argument("--failure-rate", type=float, default=0.5)
+    args = parser.parse_args()
+    # Injected failures would otherwise log one line per call
+    logging.getLogger("NetAgent").disabled = True
+
+    def client(failure_rate=0.0, latency_ms=args.latency_ms):
+        backend = LocalBackend(latency_ms=latency_ms, jitter_ms=latency_ms * 0.2, failure_rate=failure_rate)
+        return LLMClient(backend, timeout=args.timeout, max_concurrency=args.max_concurrency,
+                         breaker=CircuitBreaker(failure_threshold=3, reset_timeout=1.0))
+
+    healthy, flaky, slow = client(), client(args.failure_rate), client(latency_ms=args.timeout * 2000)
+    cases = [
+        ("sync call on threadpool", lambda: run_in_threadpool(blocking_call, args.latency_ms), None),
+        ("async client", lambda: healthy.complete("bench", fallback=lambda: "local"), healthy),
+        (f"async, {args.failure_rate:.0%} failures", lambda: flaky.complete("bench", fallback=lambda: "local"), flaky),
+        ("async, backend past deadline", lambda: slow.complete("bench", fallback=lambda: "local"), slow),
+    ]
+
+    print(f"{'case':<32} {'calls/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'fallbacks':>10} {'circuit':>10}")
+    for name, call, llm in cases:
+        rps, latency, _ = asyncio.run(drive(call, args.calls, args.concurrency))
+        summary = latency.summary()
+        fallbacks = llm.counters["fallbacks"] if llm else "-"
+        circuit = llm.breaker.state if llm else "-"
+        print(f"{name:<32} {rps:>9.0f} {summary['p50']:>8.0f} {summary['p95']:>8.0f} {fallbacks:>10} {circuit:>10}")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -1,19 +1,156 @@
 """
 Chroma Vector Store for Network Health Tracking
-Stores telemetry as embeddings for similarity search and zone clustering
+Stores telemetry as embeddings for similarity search and zone clustering.
+Writes are buffered and sent in one `add` per CHROMA_FLUSH_SIZE records or
+CHROMA_FLUSH_MS milliseconds, whichever comes first.
 """
 import chromadb
 from chromadb.config import Settings
 import json
 import logging
-from typing import List, Dict, Any
+import os
+import threading
+import time
+from typing import List, Dict, Any, Optional
 import datetime as dt
 
+from backend.sketches import LatencySketch
+from backend.zone_clusters import embed, health_score, health_color
+
 logger = logging.getLogger("NetAgent")
 
+class ChromaBatchWriter:
+    """Accumulates (id, embedding, document, metadata) rows and adds them to a collection in bulk"""
+
+    def __init__(self, store: "NetworkHealthStore", flush_size: int = 500, flush_interval_ms: float = 1000):
+        self.store = store
+        self.flush_size = max(1, flush_size)
+        self.flush_interval = flush_interval_ms / 1000
+        self._ids, self._embeddings, self._documents, self._metadatas = [], [], [], []
+        self._seen = set()
+        self._oldest = None
+        self._cond = threading.Condition()
+        # Serialises flushes so records reach Chroma in the order they were buffered
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._running = False
+        self.counters = {"buffered": 0, "written": 0, "flushes": 0, "failed": 0}
+        self.flush_latency = LatencySketch(timeout_ms=None)  # durations; slow cloud flushes must stay in the quantiles
+        self.last_flush_ms = 0.0
+
+    def start(self):
+        """Start the interval flusher (idempotent)"""
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._run, name="chroma-flusher", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        """Stop the flusher and write out whatever is still buffered"""
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+        self.flush()
+
+    def add(self, rows: List[tuple]):
+        """Buffer (id, embedding, document, metadata) rows; flushes inline once `flush_size` is reached"""
+        with self._cond:
+            for doc_id, embedding, document, metadata in rows:
+                # Samples can share a receive time
+                if doc_id in self._seen:
+                    doc_id = f"{doc_id}_{len(self._ids)}"
+                self._seen.add(doc_id)
+                self._ids.append(doc_id)
+                self._embeddings.append(embedding)
+                self._documents.append(document)
+                self._metadatas.append(metadata)
+            if self._oldest is None and self._ids:
+                self._oldest = time.monotonic()
+            self.counters["buffered"] += len(rows)
+            full = len(self._ids) >= self.flush_size
+        if full:
+            self.flush()
+
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._ids)
+
+    def _take(self):
+        with self._cond:
+            batch = (self._ids, self._embeddings, self._documents, self._metadatas)
+            self._ids, self._embeddings, self._documents, self._metadatas = [], [], [], []
+            self._seen = set()
+            self._oldest = None
+            return batch
+
+    def flush(self) -> bool:
+        """Write everything buffered so far; False if the add failed (those records are dropped)"""
+        with self._flush_lock:
+            ids, embeddings, documents, metadatas = self._take()
+            if not ids:
+                return True
+            start = time.perf_counter()
+            try:
+                # Chunked to the server's batch limit
+                max_batch = self.store._max_batch_size()
+                for i in range(0, len(ids), max_batch):
+                    self.store.collection.add(
+                        embeddings=embeddings[i:i + max_batch],
+                        documents=documents[i:i + max_batch],
+                        metadatas=metadatas[i:i + max_batch],
+                        ids=ids[i:i + max_batch]
+                    )
+            except Exception as e:
+                self.counters["failed"] += len(ids)
+                logger.error(f"Failed to add telemetry to Chroma: {e}")
+                return False
+            finally:
+                self.last_flush_ms = round((time.perf_counter() - start) * 1000, 2)
+                self.flush_latency.add(self.last_flush_ms)
+                self.counters["flushes"] += 1
+            self.counters["written"] += len(ids)
+            logger.debug(f"Added {len(ids)} telemetry records to Chroma in {self.last_flush_ms} ms")
+            return True
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._running:
+                    return
+                wait = self.flush_interval
+                if self._oldest is not None:
+                    wait = max(0.0, self._oldest + self.flush_interval - time.monotonic())
+                if wait > 0:
+                    self._cond.wait(wait)
+                due = self._oldest is not None and time.monotonic() - self._oldest >= self.flush_interval
+            if due:
+                self.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending": self.pending(),
+            "flush_size": self.flush_size,
+            "flush_interval_ms": self.flush_interval * 1000,
+            "last_flush_ms": self.last_flush_ms,
+            **self.counters,
+            "flush_ms": self.flush_latency.summary(),
+        }
+
+
 class NetworkHealthStore:
-    def __init__(self, persist_directory: str = "./chroma_data", use_cloud: bool = False):
-        """Initialize Chroma client and collection"""
+    def __init__(self, persist_directory: str = "./chroma_data", use_cloud: bool = False,
+                 flush_size: int = 500, flush_interval_ms: float = 1000, flush_before_read: bool = False):
+        """Initialize Chroma client and collection
+
+        `flush_before_read` makes the read methods write out buffered records first (read-your-writes).
+        """
+        self.flush_before_read = flush_before_read
+        self.writer = ChromaBatchWriter(self, flush_size=flush_size, flush_interval_ms=flush_interval_ms)
         try:
             if use_cloud:
                 # Use Chroma Cloud
@@ -65,58 +202,84 @@ class NetworkHealthStore:
             self.client = None
             self.collection = None
     
-    def add_telemetry(self, device_id: str, latency: float, packet_loss: float, metadata: Dict[str, Any] = None):
+    def add_telemetry(self, device_id: str, latency: float, packet_loss: float, metadata: Dict[str, Any] = None,
+                      timestamp: dt.datetime = None):
         """Add telemetry snapshot as a vector"""
+        return self.add_telemetry_batch([(device_id, latency, packet_loss, metadata, timestamp)])
+    
+    def add_telemetry_batch(self, entries: List[tuple]) -> bool:
+        """Buffer many (device_id, latency, packet_loss, metadata, timestamp) snapshots for the next flush"""
         if not self.collection:
             return False
+        if not entries:
+            return True
         
         try:
-            # Create a simple embedding: [latency_normalized, packet_loss_normalized, timestamp_factor]
-            # Normalize to 0-1 range for better clustering
-            latency_norm = min(latency / 1000.0, 1.0)  # Normalize latency (0-1000ms → 0-1)
-            packet_loss_norm = min(packet_loss, 1.0)   # Already 0-1
-            
-            # Time factor for temporal clustering (hour of day: 0-1)
-            now = dt.datetime.utcnow()
-            time_factor = (now.hour * 60 + now.minute) / 1440.0  # 0-1 for time of day
-            
-            # Simple 3D embedding
-            embedding = [latency_norm, packet_loss_norm, time_factor]
-            
-            # Metadata for filtering and display
-            meta = {
-                "device_id": device_id,
-                "latency": latency,
-                "packet_loss": packet_loss,
-                "timestamp": now.isoformat(),
-                "health_score": self._calculate_health_score(latency, packet_loss)
-            }
-            if metadata:
-                meta.update(metadata)
-            
-            # Generate unique ID
-            doc_id = f"{device_id}_{now.timestamp()}"
-            
-            # Add to collection
-            self.collection.add(
-                embeddings=[embedding],
-                documents=[json.dumps(meta)],
-                metadatas=[meta],
-                ids=[doc_id]
-            )
-            
-            logger.debug(f"Added telemetry to Chroma: {device_id} (total: {self.collection.count()})")
+            rows = []
+            for device_id, latency, packet_loss, metadata, timestamp in entries:
+                doc_id, embedding, meta = self._build_entry(device_id, latency, packet_loss, metadata, timestamp)
+                rows.append((doc_id, embedding, json.dumps(meta), meta))
+            self.writer.add(rows)
             return True
         except Exception as e:
             logger.error(f"Failed to add telemetry to Chroma: {e}")
             return False
     
-    def get_health_zones(self, num_zones: int = 10) -> List[Dict[str, Any]]:
+    def flush(self) -> bool:
+        """Write out buffered records now"""
+        if not self.collection:
+            return False
+        return self.writer.flush()
+    
+    def _flush_for_read(self, fresh: Optional[bool]):
+        # `fresh` overrides flush_before_read for one call
+        if self.flush_before_read if fresh is None else fresh:
+            self.writer.flush()
+    
+    def start(self):
+        if self.collection:
+            self.writer.start()
+    
+    def close(self):
+        """Flush-on-shutdown hook"""
+        if self.collection:
+            self.writer.stop()
+    
+    def _max_batch_size(self) -> int:
+        try:
+            return int(self.client.get_max_batch_size())
+        except Exception:
+            return 5000
+    
+    def _build_entry(self, device_id: str, latency: float, packet_loss: float, metadata: Dict[str, Any] = None,
+                     timestamp: dt.datetime = None):
+        """Build (id, embedding, metadata) for one telemetry snapshot"""
+        # Simple 3D embedding: [latency_normalized, packet_loss_normalized, time_of_day], shared with zone clustering
+        now = timestamp or dt.datetime.utcnow()
+        embedding = embed(latency, packet_loss, now)
+        
+        # Metadata for filtering and display
+        meta = {
+            "device_id": device_id,
+            "latency": latency,
+            "packet_loss": packet_loss,
+            "timestamp": now.isoformat(),
+            "health_score": self._calculate_health_score(latency, packet_loss)
+        }
+        if metadata:
+            meta.update(metadata)
+        
+        # Generate unique ID
+        doc_id = f"{device_id}_{now.timestamp()}"
+        return doc_id, embedding, meta
+    
+    def get_health_zones(self, num_zones: int = 10, fresh: Optional[bool] = None) -> List[Dict[str, Any]]:
         """Get recent health zones for heatmap visualization"""
         if not self.collection:
             return []
         
         try:
+            self._flush_for_read(fresh)
             count = self.collection.count() if callable(self.collection.count) else self.collection.count
             if count == 0:
                 return []
@@ -178,12 +341,14 @@ class NetworkHealthStore:
             logger.error(traceback.format_exc())
             return []
     
-    def find_similar_conditions(self, latency: float, packet_loss: float, n_results: int = 5) -> List[Dict[str, Any]]:
+    def find_similar_conditions(self, latency: float, packet_loss: float, n_results: int = 5,
+                                fresh: Optional[bool] = None) -> List[Dict[str, Any]]:
         """Find devices with similar network conditions using vector similarity"""
         if not self.collection:
             return []
         
         try:
+            self._flush_for_read(fresh)
             # Create query embedding
             latency_norm = min(latency / 1000.0, 1.0)
             packet_loss_norm = min(packet_loss, 1.0)
@@ -221,37 +386,25 @@ class NetworkHealthStore:
     
     def _calculate_health_score(self, latency: float, packet_loss: float) -> float:
         """Calculate health score (0-100) based on latency and packet loss"""
-        # Perfect: 100, Critical: 0
-        latency_score = max(0, 100 - (latency / 10))  # 1000ms = 0 score
-        packet_loss_score = max(0, 100 - (packet_loss * 500))  # 20% loss = 0 score
-        
-        # Weighted average (latency 60%, packet loss 40%)
-        return (latency_score * 0.6 + packet_loss_score * 0.4)
+        return health_score(latency, packet_loss)
     
     def _get_health_color(self, health_score: float) -> str:
         """Convert health score to hex color (red → yellow → green)"""
-        if health_score >= 80:
-            return "#22c55e"  # Green
-        elif health_score >= 60:
-            return "#84cc16"  # Light green
-        elif health_score >= 40:
-            return "#eab308"  # Yellow
-        elif health_score >= 20:
-            return "#f97316"  # Orange
-        else:
-            return "#ef4444"  # Red
+        return health_color(health_score)
     
-    def get_stats(self) -> Dict[str, Any]:
+    def get_stats(self, fresh: Optional[bool] = None) -> Dict[str, Any]:
         """Get collection statistics"""
         if not self.collection:
             return {"status": "disabled", "count": 0}
         
         try:
+            self._flush_for_read(fresh)
             count = self.collection.count() if callable(self.collection.count) else self.collection.count
             return {
                 "status": "active",
                 "count": count,
-                "name": self.collection.name
+                "name": self.collection.name,
+                "writer": self.writer.stats(),
             }
         except Exception as e:
             logger.error(f"Failed to get Chroma stats: {e}")
@@ -259,5 +412,10 @@ class NetworkHealthStore:
 
 
 # Global instance - set use_cloud=True to use Chroma Cloud
-chroma_store = NetworkHealthStore(use_cloud=True)
+chroma_store = NetworkHealthStore(
+    use_cloud=True,
+    flush_size=int(os.getenv("CHROMA_FLUSH_SIZE", "500")),
+    flush_interval_ms=float(os.getenv("CHROMA_FLUSH_MS", "1000")),
+    flush_before_read=os.getenv("CHROMA_READ_YOUR_WRITES", "false").lower() in ("1", "true", "yes"),
+)
 
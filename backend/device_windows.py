@@ -0,0 +1,209 @@
+"""
+Per-device ring buffers of recent telemetry
+Fixed-capacity typed arrays keep windowed stats in memory with a bounded footprint
+"""
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+# Agents report 9999ms when a ping times out; those are counted, not averaged
+TIMEOUT_LATENCY_MS = 9000
+# Relative change between the older and newer half of a window that counts as a trend
+TREND_THRESHOLD = 0.15
+
+
+class DeviceRing:
+    __slots__ = ("capacity", "ts", "latency", "loss", "head", "size", "location", "ssid")
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.ts = array("q", [0]) * capacity         # epoch ns
+        self.latency = array("d", [0.0]) * capacity  # ms
+        self.loss = array("d", [0.0]) * capacity     # 0-1
+        self.head = 0
+        self.size = 0
+        self.location = None
+        self.ssid = None
+
+    def append(self, ts_ns: int, latency: float, loss: float):
+        if self.size:
+            # A late sample is filed at the newest time so the ring stays sorted for window()
+            ts_ns = max(ts_ns, self.ts[(self.head - 1) % self.capacity])
+        self.ts[self.head] = ts_ns
+        self.latency[self.head] = latency
+        self.loss[self.head] = loss
+        self.head = (self.head + 1) % self.capacity
+        if self.size < self.capacity:
+            self.size += 1
+
+    def window(self, since_ns: int = 0) -> List[tuple]:
+        """(ts_ns, latency, loss) samples at or after `since_ns`, oldest first"""
+        # Binary search for the first sample in the window, then copy the tail in one slice
+        start = (self.head - self.size) % self.capacity
+        lo, hi = 0, self.size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.ts[(start + mid) % self.capacity] < since_ns:
+                lo = mid + 1
+            else:
+                hi = mid
+        return list(zip(*self.tail(self.size - lo)))
+
+    def tail(self, n: int) -> Tuple[array, array, array]:
+        """Copies of the last `n` (ts, latency, loss) columns, oldest first"""
+        n = min(n, self.size)
+        start = (self.head - n) % self.capacity
+        if start + n <= self.capacity:
+            return tuple(a[start:start + n] for a in (self.ts, self.latency, self.loss))
+        wrap = start + n - self.capacity
+        return tuple(a[start:] + a[:wrap] for a in (self.ts, self.latency, self.loss))
+
+    def memory_bytes(self) -> int:
+        return sum(a.itemsize * len(a) for a in (self.ts, self.latency, self.loss))
+
+
+def classify_trend(older: Optional[float], newer: Optional[float]) -> str:
+    """rising/falling/flat from the mean latency of the older and newer half of a window"""
+    if older is None or newer is None:
+        return "flat"
+    if older <= 0:
+        return "rising" if newer > 0 else "flat"
+    change = (newer - older) / older
+    if change > TREND_THRESHOLD:
+        return "rising"
+    if change < -TREND_THRESHOLD:
+        return "falling"
+    return "flat"
+
+
+def trend_of(values: List[float]) -> str:
+    """Trend of a time-ordered series of latencies"""
+    if len(values) < 4:
+        return "flat"
+    half = len(values) // 2
+    return classify_trend(sum(values[:half]) / half, sum(values[half:]) / (len(values) - half))
+
+
+def summarize(samples: List[tuple]) -> Dict[str, Any]:
+    """Count, average/max latency (timeouts excluded) and average loss"""
+    if not samples:
+        return {"count": 0}
+    latencies = [s[1] for s in samples if s[1] < TIMEOUT_LATENCY_MS]
+    return {
+        "count": len(samples),
+        "timeouts": len(samples) - len(latencies),
+        "avg_latency_ms": round(sum(latencies) / len(latencies), 2) if latencies else None,
+        "max_latency_ms": round(max(latencies), 2) if latencies else None,
+        "avg_packet_loss": round(sum(s[2] for s in samples) / len(samples), 4),
+        "last_ts_ns": max(s[0] for s in samples),
+    }
+
+
+class DeviceWindowStore:
+    def __init__(self, capacity: int = 720, max_devices: int = 10000):
+        """`capacity` samples per device (720 = 1 hour at 5s), least recently seen devices evicted"""
+        self.capacity = capacity
+        self.max_devices = max_devices
+        self.devices: "OrderedDict[str, DeviceRing]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, device_id: str, ts_ns: int, latency: float, loss: float,
+            location: Optional[str] = None, ssid: Optional[str] = None):
+        with self._lock:
+            ring = self.devices.get(device_id)
+            if ring is None:
+                if len(self.devices) >= self.max_devices:
+                    self.devices.popitem(last=False)
+                ring = self.devices[device_id] = DeviceRing(self.capacity)
+            else:
+                self.devices.move_to_end(device_id)
+            ring.append(ts_ns, latency, loss)
+            if location is not None:
+                ring.location = location
+            if ssid is not None:
+                ring.ssid = ssid
+
+    def place(self, device_id: str) -> Tuple[Optional[str], Optional[str]]:
+        """Last reported (location, ssid) for a device; log records do not carry them"""
+        with self._lock:
+            ring = self.devices.get(device_id)
+            return (ring.location, ring.ssid) if ring is not None else (None, None)
+
+    def last(self, device_id: str) -> Optional[tuple]:
+        """Most recent (ts_ns, latency, loss) for a device, or None if unseen"""
+        with self._lock:
+            ring = self.devices.get(device_id)
+            if ring is None or ring.size == 0:
+                return None
+            i = (ring.head - 1) % ring.capacity
+            return ring.ts[i], ring.latency[i], ring.loss[i]
+
+    def tails(self, n: int) -> List[Tuple[str, Optional[str], array, array, array]]:
+        """(device_id, location, ts, latency, loss) with the last `n` samples of every device"""
+        with self._lock:
+            return [(device_id, ring.location, *ring.tail(n)) for device_id, ring in self.devices.items() if ring.size]
+
+    def device_stats(self, device_id: str, window_s: float = 300) -> Optional[Dict[str, Any]]:
+        since = time.time_ns() - int(window_s * 1e9)
+        with self._lock:
+            ring = self.devices.get(device_id)
+            if ring is None:
+                return None
+            stats = summarize(ring.window(since))
+            stats.update(device_id=device_id, location=ring.location, ssid=ring.ssid)
+        return stats
+
+    def all_device_stats(self, window_s: float = 300, location: Optional[str] = None) -> List[Dict[str, Any]]:
+        since = time.time_ns() - int(window_s * 1e9)
+        out = []
+        with self._lock:
+            for device_id, ring in self.devices.items():
+                if location is not None and ring.location != location:
+                    continue
+                stats = summarize(ring.window(since))
+                stats.update(device_id=device_id, location=ring.location, ssid=ring.ssid)
+                out.append(stats)
+        return out
+
+    def group_stats(self, key: str = "location", window_s: float = 300) -> Dict[str, Dict[str, Any]]:
+        """Aggregate the window across devices sharing a location (or ssid)"""
+        since = time.time_ns() - int(window_s * 1e9)
+        midpoint = since + int(window_s * 1e9 / 2)
+        groups: Dict[str, List[tuple]] = {}
+        devices: Dict[str, int] = {}
+        with self._lock:
+            for ring in self.devices.values():
+                name = getattr(ring, key)
+                if name is None:
+                    continue
+                samples = ring.window(since)
+                if samples:
+                    groups.setdefault(name, []).extend(samples)
+                    devices[name] = devices.get(name, 0) + 1
+        out = {}
+        for name, samples in groups.items():
+            out[name] = summarize(samples)
+            out[name]["devices"] = devices[name]
+            # Samples from several rings are not time-ordered, so split on the window midpoint
+            halves = ([], [])
+            for ts, latency, _ in samples:
+                if latency < TIMEOUT_LATENCY_MS:
+                    halves[ts >= midpoint].append(latency)
+            older, newer = (sum(h) / len(h) if h else None for h in halves)
+            out[name]["latency_trend"] = classify_trend(older, newer)
+        return out
+
+    def memory_report(self) -> Dict[str, Any]:
+        """Ring memory is fixed per device, so the total is bounded by max_devices"""
+        per_device = DeviceRing(1).memory_bytes() * self.capacity
+        with self._lock:
+            devices = len(self.devices)
+        return {
+            "devices": devices,
+            "capacity_per_device": self.capacity,
+            "bytes_per_device": per_device,
+            "bytes_total": per_device * devices,
+            "bytes_max": per_device * self.max_devices,
+        }
@@ -0,0 +1,173 @@
+"""
+Vectorised latency and connection-drop forecasts
+Damped Holt smoothing runs over every device's recent series at once (one
+NumPy step per time column across all devices) and projects latency and the
+chance of a drop N minutes ahead, without asking the LLM.
+"""
+import math
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from backend.device_windows import TIMEOUT_LATENCY_MS
+
+_erf = np.frompyfunc(math.erf, 1, 1)
+
+
+def build_matrix(tails: List[Tuple], history: int) -> Dict[str, Any]:
+    """Right-aligned [devices, history] arrays from DeviceWindowStore.tails(); `mask` marks real samples"""
+    count = len(tails)
+    ids = [row[0] for row in tails]
+    locations = [row[1] for row in tails]
+    lengths = np.fromiter((min(len(row[2]), history) for row in tails), dtype=np.int64, count=count)
+
+    # One join per column and a single scatter instead of a NumPy assignment per device
+    def flat(column, dtype):
+        return np.frombuffer(b"".join(row[column][-history:].tobytes() for row in tails), dtype=dtype)
+
+    ts = np.zeros((count, history), dtype=np.int64)
+    latency = np.zeros((count, history))
+    loss = np.zeros((count, history))
+    mask = np.zeros((count, history), dtype=bool)
+    if count and lengths.min() == history:
+        # Every ring is full: the joined buffers are already the matrix
+        dest = slice(None)
+    else:
+        # Offset of each device's first sample in the flattened, right-aligned matrix
+        offsets = np.arange(count) * history + history - lengths - (np.cumsum(lengths) - lengths)
+        dest = np.arange(lengths.sum()) + np.repeat(offsets, lengths)
+    ts.ravel()[dest] = flat(2, np.int64)
+    latency.ravel()[dest] = flat(3, np.float64)
+    loss.ravel()[dest] = flat(4, np.float64)
+    mask.ravel()[dest] = True
+    return {"ids": ids, "locations": locations, "ts": ts, "latency": latency, "loss": loss, "mask": mask}
+
+
+class HoltForecaster:
+    def __init__(self, alpha: float = 0.3, beta: float = 0.1, phi: float = 0.98, horizon_s: float = 300,
+                 drop_latency_ms: float = 500, min_samples: int = 5):
+        """`phi` damps the trend so long horizons level off instead of running away"""
+        self.alpha = alpha
+        self.beta = beta
+        self.phi = phi
+        self.horizon_s = horizon_s
+        self.drop_latency_ms = drop_latency_ms
+        self.min_samples = min_samples
+
+    def forecast(self, ts: np.ndarray, latency: np.ndarray, loss: np.ndarray, mask: np.ndarray) -> Dict[str, np.ndarray]:
+        """Per-device expected latency and drop probability `horizon_s` ahead"""
+        count, history = latency.shape
+        a, b, phi = self.alpha, self.beta, self.phi
+        rows = np.arange(count)
+        steps_idx = np.arange(history)[:, None]
+        answered = mask & (latency < TIMEOUT_LATENCY_MS)
+        started = answered.any(axis=1)
+        first_answer = answered.argmax(axis=1)
+        first_sample = mask.argmax(axis=1)
+        # A sample is a drop if the ping timed out or lost packets
+        dropped = np.where(latency >= TIMEOUT_LATENCY_MS, 1.0, np.clip(loss, 0.0, 1.0))
+
+        # Time-major 0/1 weights: blending with them is far cheaper than masked assignment.
+        # Each series is seeded with its first value and updated from the next one on.
+        update = (answered.T & (steps_idx > first_answer)).astype(float)
+        drop_update = (mask.T & (steps_idx > first_sample)).astype(float)
+        lat_t = np.ascontiguousarray(latency.T)
+        dropped_t = np.ascontiguousarray(dropped.T)
+
+        level = latency[rows, first_answer] * started
+        trend = np.zeros(count)
+        sq_err = np.zeros(count)
+        drop_rate = dropped[rows, first_sample] * mask.any(axis=1)
+        for t in range(history):
+            u = update[t]
+            predicted = level + phi * trend
+            err = (lat_t[t] - predicted) * u
+            sq_err += err * err
+            step = predicted + a * err - level
+            trend += u * (b * step + (1 - b) * phi * trend - trend)
+            level += u * step
+            drop_rate += a * drop_update[t] * (dropped_t[t] - drop_rate)
+        errors = update.sum(axis=0)
+
+        # Steps to the horizon from each device's mean sampling interval
+        samples = mask.sum(axis=1)
+        span_s = (ts[:, -1] - ts[rows, first_sample]) / 1e9
+        with np.errstate(all="ignore"):
+            step_s = span_s / (samples - 1)
+        step_s = np.where(np.isfinite(step_s) & (step_s > 0), step_s, 5.0)
+        # Never project further ahead than the history the model has seen
+        steps = np.clip(self.horizon_s / step_s, 1.0, history)
+
+        damped = phi * (1 - phi ** steps) / (1 - phi) if phi < 1 else steps
+        expected = np.maximum(level + damped * trend, 0.0)
+        sigma = np.sqrt(sq_err / np.maximum(errors, 1))
+        sigma = np.maximum(sigma * np.sqrt(1 + (steps - 1) * a * a), 1.0)
+        z = (self.drop_latency_ms - expected) / (sigma * math.sqrt(2))
+        p_slow = 0.5 * (1 - _erf(z).astype(float))
+        # Devices that never answered a ping have no latency to project
+        p_slow = np.where(started, p_slow, 1.0)
+        expected = np.where(started, expected, np.nan)
+
+        return {
+            "expected_latency_ms": expected,
+            "drop_probability": 1 - (1 - drop_rate) * (1 - p_slow),
+            "loss_rate": drop_rate,
+            "step_s": step_s,
+            "samples": samples,
+            "sufficient": samples >= self.min_samples,
+        }
+
+
+def device_entry(ids, locations, result, i) -> Dict[str, Any]:
+    expected = result["expected_latency_ms"][i]
+    return {
+        "device_id": ids[i],
+        "location": locations[i],
+        "expected_latency_ms": None if np.isnan(expected) else round(float(expected), 2),
+        "drop_probability": round(float(result["drop_probability"][i]), 4),
+        "samples": int(result["samples"][i]),
+    }
+
+
+def summarize(ids: List[str], locations: List[Optional[str]], result: Dict[str, np.ndarray],
+              at_risk: float = 0.5, top: int = 5) -> Dict[str, Any]:
+    """Fleet-wide and per-location view of a forecast, with the devices most likely to drop"""
+    usable = result["sufficient"]
+    count = int(usable.sum())
+    if count == 0:
+        return {"devices": 0}
+    p = result["drop_probability"]
+    expected = result["expected_latency_ms"]
+    risky = usable & (p >= at_risk)
+    order = np.argsort(-np.where(usable, p, -1.0))[:top]
+
+    by_location = {}
+    names = np.array([loc or "" for loc in locations])
+    keys, inverse = np.unique(names[usable], return_inverse=True)
+    p_usable, expected_usable = p[usable], expected[usable]
+    finite = np.isfinite(expected_usable)
+    lat_sum = np.bincount(inverse, weights=np.where(finite, expected_usable, 0.0), minlength=len(keys))
+    lat_n = np.bincount(inverse, weights=finite, minlength=len(keys))
+    p_max = np.full(len(keys), 0.0)
+    np.maximum.at(p_max, inverse, p_usable)
+    risky_n = np.bincount(inverse, weights=p_usable >= at_risk, minlength=len(keys))
+    for k, name in enumerate(keys):
+        if not name:
+            continue
+        by_location[name] = {
+            "expected_latency_ms": round(float(lat_sum[k] / lat_n[k]), 2) if lat_n[k] else None,
+            "max_drop_probability": round(float(p_max[k]), 4),
+            "devices_at_risk": int(risky_n[k]),
+        }
+
+    finite_all = expected[usable & np.isfinite(expected)]
+    return {
+        "devices": count,
+        "expected_latency_ms": round(float(np.median(finite_all)), 2) if finite_all.size else None,
+        "drop_probability": round(float(p[usable].mean()), 4),
+        "devices_at_risk": int(risky.sum()),
+        "at_risk_fraction": round(float(risky.sum() / count), 4),
+        "at_risk_threshold": at_risk,
+        "worst": [device_entry(ids, locations, result, i) for i in order if usable[i]],
+        "locations": by_location,
+    }
@@ -0,0 +1,171 @@
+"""
+Incident grouping for alert storms
+Alerts that fire close together and share an SSID, a BSSID or a topology node
+(uplink, building, ...) are folded into one parent incident. The first alert
+opens it and notifies everyone; later ones become child updates on it, so a
+venue-wide outage is one ticket with N comments rather than N tickets.
+"""
+import json
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+OPEN = "open"
+RESOLVED = "resolved"
+
+
+def load_topology(path: Optional[str] = None) -> Dict[str, List[str]]:
+    """location -> upstream nodes, from JSON like {"Library": ["uplink-1", "building-A"]}"""
+    if not path:
+        return {}
+    with open(path) as f:
+        raw = json.load(f)
+    return {location: [nodes] if isinstance(nodes, str) else list(nodes) for location, nodes in raw.items()}
+
+
+class IncidentAggregator:
+    def __init__(self, window_s: float = 300, close_after_s: float = 1800,
+                 topology: Optional[Dict[str, List[str]]] = None, max_locations: int = 10000,
+                 max_links: int = 16, history: int = 100):
+        """`window_s`: an alert joins an open incident updated within this long;
+        `close_after_s`: an incident with no updates for this long is closed even if children never resolved
+        """
+        self.window_s = window_s
+        self.close_after_s = close_after_s
+        self.topology = topology or {}
+        self.max_locations = max_locations
+        self.max_links = max_links
+        # location -> SSIDs and BSSIDs recently seen there
+        self.links: "OrderedDict[str, Tuple[Set[str], Set[str]]]" = OrderedDict()
+        self.open: Dict[str, Dict[str, Any]] = {}
+        # correlation key -> id of the open incident that carries it
+        self.by_key: Dict[str, str] = {}
+        # alert fingerprint -> id of the incident it is a child of
+        self.by_alert: Dict[str, str] = {}
+        self.closed = deque(maxlen=history)
+        self.counters = {"alerts": 0, "opened": 0, "grouped": 0, "closed": 0}
+        self._lock = threading.Lock()
+
+    def link(self, location: Optional[str], ssid: Optional[str] = None, bssid: Optional[str] = None):
+        """Record that `location` is served by this SSID/BSSID (called per sample)"""
+        if not location or not (ssid or bssid):
+            return
+        with self._lock:
+            entry = self.links.get(location)
+            if entry is None:
+                if len(self.links) >= self.max_locations:
+                    self.links.popitem(last=False)
+                entry = self.links[location] = (set(), set())
+            for seen, value in zip(entry, (ssid, bssid)):
+                if value and value not in seen and len(seen) < self.max_links:
+                    seen.add(value)
+
+    def correlation_keys(self, kind: str, name: str) -> Set[str]:
+        """What an alert on one zone may share with alerts elsewhere"""
+        keys = {f"{kind}:{name}"}
+        if kind == "location":
+            ssids, bssids = self.links.get(name, ((), ()))
+            keys.update(f"ssid:{s}" for s in ssids)
+            keys.update(f"bssid:{b}" for b in bssids)
+            keys.update(f"topology:{node}" for node in self.topology.get(name, ()))
+        return keys
+
+    def add(self, alert: Dict[str, Any], now: Optional[float] = None) -> Tuple[Dict[str, Any], bool]:
+        """File an alert ({"fingerprint", "kind", "name", "reason", ...}); returns (incident, opened)"""
+        now = time.time() if now is None else now
+        with self._lock:
+            self._expire(now)
+            self.counters["alerts"] += 1
+            keys = self.correlation_keys(alert["kind"], alert["name"])
+            incident = self._match(alert["kind"], keys, now)
+            opened = incident is None
+            if opened:
+                incident = {
+                    "id": f"grp-{alert['fingerprint']}-{int(now)}",
+                    "status": OPEN,
+                    "reason": alert["reason"],
+                    "opened_at": now,
+                    "updated_at": now,
+                    "keys": set(),
+                    "children": [],
+                }
+                self.open[incident["id"]] = incident
+                self.counters["opened"] += 1
+            else:
+                self.counters["grouped"] += 1
+            incident["updated_at"] = now
+            incident["keys"] |= keys
+            for key in keys:
+                self.by_key[key] = incident["id"]
+            incident["children"].append({**alert, "status": OPEN, "grouped_at": now})
+            self.by_alert[alert["fingerprint"]] = incident["id"]
+            return self._view(incident), opened
+
+    def _match(self, kind: str, keys: Set[str], now: float) -> Optional[Dict[str, Any]]:
+        candidates = [self.open.get(self.by_key.get(key)) for key in keys]
+        if kind == "global":
+            # A fleet-wide alert belongs with whatever is already going on
+            candidates = list(self.open.values())
+        live = [c for c in candidates if c is not None and now - c["updated_at"] <= self.window_s]
+        return max(live, key=lambda c: c["updated_at"]) if live else None
+
+    def resolve(self, fingerprint: str, now: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Mark an alert resolved; returns its incident if that closed it"""
+        now = time.time() if now is None else now
+        with self._lock:
+            incident = self.open.get(self.by_alert.pop(fingerprint, None))
+            if incident is None:
+                return None
+            for child in incident["children"]:
+                if child["fingerprint"] == fingerprint and child["status"] == OPEN:
+                    child["status"] = RESOLVED
+                    child["resolved_at"] = now
+            if any(child["status"] == OPEN for child in incident["children"]):
+                return None
+            self._close(incident, now)
+            return self._view(incident)
+
+    def _expire(self, now: float):
+        for incident in [i for i in self.open.values() if now - i["updated_at"] > self.close_after_s]:
+            self._close(incident, now)
+
+    def _close(self, incident: Dict[str, Any], now: float):
+        incident["status"] = RESOLVED
+        incident["closed_at"] = now
+        del self.open[incident["id"]]
+        for key in incident["keys"]:
+            if self.by_key.get(key) == incident["id"]:
+                del self.by_key[key]
+        for child in incident["children"]:
+            if self.by_alert.get(child["fingerprint"]) == incident["id"]:
+                del self.by_alert[child["fingerprint"]]
+        self.closed.append(incident)
+        self.counters["closed"] += 1
+
+    @staticmethod
+    def _view(incident: Dict[str, Any]) -> Dict[str, Any]:
+        view = dict(incident, keys=sorted(incident["keys"]), children=[dict(c) for c in incident["children"]])
+        view["zones"] = len({(c["kind"], c["name"]) for c in incident["children"]})
+        return view
+
+    def incidents(self, include_closed: bool = True) -> List[Dict[str, Any]]:
+        """Open incidents first (newest first), then recently closed ones"""
+        with self._lock:
+            self._expire(time.time())
+            out = sorted((self._view(i) for i in self.open.values()), key=lambda i: -i["opened_at"])
+            if include_closed:
+                out += [self._view(i) for i in reversed(self.closed)]
+            return out
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            alerts = self.counters["alerts"]
+            return {
+                "window_s": self.window_s,
+                "open": len(self.open),
+                "linked_locations": len(self.links),
+                **self.counters,
+                # Share of alerts that did not open an incident of their own
+                "grouping_ratio": round(self.counters["grouped"] / alerts, 3) if alerts else None,
+            }
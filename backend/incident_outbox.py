@@ -0,0 +1,364 @@
+"""
+Durable outbox for incident actions
+Alert actions (email, Jira, Slack, ...) are written to SQLite from the request
+path and delivered by async workers with exponential backoff. Every action has
+an idempotency key, so enqueueing the same one twice is a no-op; actions that
+keep failing end up dead-lettered for inspection and manual retry.
+Delivery is at-least-once: an action in flight when the process dies is
+retried on the next start. A call that overruns its timeout is never retried
+while its thread is still running; whatever it returns is recorded late.
+"""
+import asyncio
+import concurrent.futures
+import json
+import logging
+import random
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from backend.sketches import LatencySketch
+
+logger = logging.getLogger("NetAgent")
+
+PENDING = "pending"
+IN_FLIGHT = "in_flight"
+DELIVERED = "delivered"
+DEAD = "dead"
+STATUSES = (PENDING, IN_FLIGHT, DELIVERED, DEAD)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS incident_outbox (
+    key TEXT PRIMARY KEY,
+    incident TEXT NOT NULL,
+    action TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    created_at REAL NOT NULL,
+    delivered_at REAL,
+    last_error TEXT,
+    attempt_ms REAL,
+    result TEXT
+);
+CREATE INDEX IF NOT EXISTS incident_outbox_due ON incident_outbox (status, next_attempt_at);
+CREATE INDEX IF NOT EXISTS incident_outbox_incident ON incident_outbox (incident);
+"""
+
+COLUMNS = ("key", "incident", "action", "payload", "status", "attempts", "next_attempt_at",
+           "created_at", "delivered_at", "last_error", "attempt_ms", "result")
+
+
+class RetryLater(Exception):
+    """Raised by a delivery handler when the action is not ready yet (does not count as a failure)"""
+
+
+def row_to_entry(row) -> Dict[str, Any]:
+    entry = dict(zip(COLUMNS, row))
+    entry["payload"] = json.loads(entry["payload"])
+    entry["result"] = json.loads(entry["result"]) if entry["result"] else None
+    if entry["delivered_at"]:
+        entry["delivery_ms"] = round((entry["delivered_at"] - entry["created_at"]) * 1000, 1)
+    return entry
+
+
+class IncidentOutbox:
+    def __init__(self, path: Optional[str], deliver: Callable[[Dict[str, Any]], Any], workers: int = 2,
+                 max_attempts: int = 6, backoff_base: float = 2.0, backoff_max: float = 300.0,
+                 attempt_timeout: float = 15.0, poll_interval: float = 1.0):
+        """`deliver(entry)` runs on the outbox's own threads and returns a JSON-serialisable result or raises
+
+        `path` empty or None keeps the outbox in memory only.
+        """
+        self.path = path or ":memory:"
+        self.deliver = deliver
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.attempt_timeout = attempt_timeout
+        self.poll_interval = poll_interval
+        self.counters = {"enqueued": 0, "duplicates": 0, "delivered": 0, "failures": 0, "dead": 0, "deferred": 0,
+                         "late": 0}
+        # Durations, not pings: no timeout sentinel (deliveries include backoff and routinely pass 9s)
+        self.attempt_latency = LatencySketch(timeout_ms=None)
+        self.delivery_latency = LatencySketch(timeout_ms=None)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        # Anything in flight when the last process stopped is delivered again
+        with self._conn:
+            recovered = self._conn.execute(
+                "UPDATE incident_outbox SET status = ? WHERE status = ?", (PENDING, IN_FLIGHT)
+            ).rowcount
+        if recovered:
+            logger.warning(f"Incident outbox re-queued {recovered} actions left in flight")
+        self._wakeup: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._tasks: List[asyncio.Task] = []
+        # Slow SDK calls hold these threads, not the shared anyio pool the sync routes use
+        self._executor = concurrent.futures.ThreadPoolExecutor(workers, thread_name_prefix="incident-outbox")
+        # One slot per executor thread, released only when the call returns
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    def enqueue(self, key: str, incident: str, action: str, payload: Dict[str, Any], delay: float = 0.0) -> bool:
+        """Queue one action; False if `key` was already queued (whatever its state)"""
+        now = time.time()
+        with self._lock, self._conn:
+            added = self._conn.execute(
+                "INSERT OR IGNORE INTO incident_outbox (key, incident, action, payload, status, next_attempt_at, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, incident, action, json.dumps(payload), PENDING, now + delay, now),
+            ).rowcount == 1
+        self.counters["enqueued" if added else "duplicates"] += 1
+        if added:
+            self._wake()
+        return added
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(COLUMNS)} FROM incident_outbox WHERE key = ?", (key,)
+            ).fetchone()
+        return row_to_entry(row) if row else None
+
+    async def wait_attempted(self, keys: List[str], timeout: float) -> List[Optional[Dict[str, Any]]]:
+        """Entries for `keys` once each has had its first attempt, or as they stand after `timeout` seconds"""
+        deadline = time.monotonic() + timeout
+        while True:
+            entries = [self.get(key) for key in keys]
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or all(
+                e is None or e["attempt_ms"] is not None or e["status"] in (DELIVERED, DEAD) for e in entries
+            ):
+                return entries
+            await asyncio.sleep(min(0.05, remaining))
+
+    def entries(self, status: Optional[str] = None, incident: Optional[str] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        """Newest first, optionally filtered by status and incident"""
+        clauses, params = [], []
+        if status:
+            clauses.append("status = ?")
+            params.append(status)
+        if incident:
+            clauses.append("incident = ?")
+            params.append(incident)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(COLUMNS)} FROM incident_outbox {where} ORDER BY created_at DESC LIMIT ?",
+                (*params, limit),
+            ).fetchall()
+        return [row_to_entry(row) for row in rows]
+
+    def retry(self, key: str) -> bool:
+        """Put a dead-lettered action back in the queue with a fresh attempt budget"""
+        with self._lock, self._conn:
+            revived = self._conn.execute(
+                "UPDATE incident_outbox SET status = ?, attempts = 0, next_attempt_at = ? WHERE key = ? AND status = ?",
+                (PENDING, time.time(), key, DEAD),
+            ).rowcount == 1
+        if revived:
+            self._wake()
+        return revived
+
+    def _wake(self):
+        """Nudge idle workers; safe from delivery handlers running in the threadpool"""
+        if self._loop is None:
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            self._wakeup.set()
+        else:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def backoff(self, attempts: int) -> float:
+        """Seconds before retry number `attempts`, with full jitter"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** (attempts - 1)))
+
+    def _claim(self) -> Optional[Dict[str, Any]]:
+        """Oldest due action, marked in flight; None if nothing is due"""
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                f"SELECT {', '.join(COLUMNS)} FROM incident_outbox WHERE status = ? AND next_attempt_at <= ? "
+                "ORDER BY next_attempt_at LIMIT 1",
+                (PENDING, time.time()),
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE incident_outbox SET status = ? WHERE key = ?", (IN_FLIGHT, row[0]))
+        return row_to_entry(row)
+
+    def _next_due_in(self) -> float:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT MIN(next_attempt_at) FROM incident_outbox WHERE status = ?", (PENDING,)
+            ).fetchone()
+        if row[0] is None:
+            return self.poll_interval
+        return min(self.poll_interval, max(0.0, row[0] - time.time()))
+
+    def _finish(self, entry: Dict[str, Any], result: Any, attempt_ms: float):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE incident_outbox SET status = ?, attempts = attempts + 1, delivered_at = ?, attempt_ms = ?, "
+                "last_error = NULL, result = ? WHERE key = ?",
+                (DELIVERED, now, attempt_ms, json.dumps(result, default=str), entry["key"]),
+            )
+        self.counters["delivered"] += 1
+        self.delivery_latency.add((now - entry["created_at"]) * 1000)
+        logger.info(f"Incident action {entry['key']} delivered after {entry['attempts'] + 1} attempt(s)")
+
+    def _fail(self, entry: Dict[str, Any], error: str, attempt_ms: Optional[float], counted: bool = True):
+        attempts = entry["attempts"] + (1 if counted else 0)
+        dead = attempts >= self.max_attempts
+        delay = self.backoff(max(attempts, 1))
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE incident_outbox SET status = ?, attempts = ?, next_attempt_at = ?, last_error = ?, attempt_ms = ? "
+                "WHERE key = ?",
+                (DEAD if dead else PENDING, attempts, time.time() + delay, error, attempt_ms, entry["key"]),
+            )
+        if not counted:
+            self.counters["deferred"] += 1
+        elif dead:
+            self.counters["dead"] += 1
+            logger.error(f"Incident action {entry['key']} dead-lettered after {attempts} attempts: {error}")
+        else:
+            self.counters["failures"] += 1
+            logger.warning(f"Incident action {entry['key']} failed (attempt {attempts}), retrying in {delay:.1f}s: {error}")
+
+    async def _attempt(self, entry: Dict[str, Any], slots: asyncio.Semaphore):
+        start = time.perf_counter()
+        loop = self._loop
+
+        def release():
+            loop.call_soon_threadsafe(slots.release)
+
+        try:
+            future = self._executor.submit(self.deliver, entry)
+        except RuntimeError:
+            slots.release()  # executor shut down
+            raise
+        future.add_done_callback(lambda f: self._settle(entry, f, start, release))
+        waiter = asyncio.wrap_future(future)
+        # Errors are handled in _settle; mark them retrieved on the asyncio side
+        waiter.add_done_callback(lambda f: f.cancelled() or f.exception())
+        done, _ = await asyncio.wait([waiter], timeout=self.attempt_timeout)
+        if done:
+            return
+        # Still running: the entry stays in flight and the call's own outcome is recorded when it returns
+        self.counters["late"] += 1
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE incident_outbox SET last_error = ? WHERE key = ?",
+                (f"still running after {self.attempt_timeout}s", entry["key"]),
+            )
+        logger.warning(f"Incident action {entry['key']} still running after {self.attempt_timeout}s")
+
+    def _settle(self, entry: Dict[str, Any], future: concurrent.futures.Future, start: float,
+                release: Callable[[], Any]):
+        """Record the outcome of one call, on the thread that made it"""
+        attempt_ms = round((time.perf_counter() - start) * 1000, 1)
+        try:
+            if self._conn is None:
+                logger.warning(f"Incident action {entry['key']} returned after shutdown; it is retried on the next start")
+                return
+            try:
+                result = future.result()
+            except RetryLater as e:
+                self._fail(entry, str(e) or "not ready", None, counted=False)
+            except Exception as e:
+                self.attempt_latency.add(attempt_ms)
+                self._fail(entry, str(e) or type(e).__name__, attempt_ms)
+            else:
+                self.attempt_latency.add(attempt_ms)
+                self._finish(entry, result, attempt_ms)
+            self._wake()
+        except Exception as e:
+            logger.error(f"Incident action {entry['key']} finished but could not be recorded: {e}")
+        finally:
+            try:
+                release()
+            except RuntimeError:
+                pass  # the loop has closed
+
+    async def _worker(self):
+        slots = self._slots
+        while True:
+            try:
+                await slots.acquire()
+                try:
+                    entry = self._claim()
+                except Exception:
+                    slots.release()
+                    raise
+                if entry is not None:
+                    # The slot is handed to the call and freed when its thread returns
+                    await self._attempt(entry, slots)
+                    continue
+                slots.release()
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self._next_due_in())
+                except asyncio.TimeoutError:
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Incident outbox worker error: {e}")
+                await asyncio.sleep(self.poll_interval)
+
+    def start(self):
+        if not self._tasks:
+            self._wakeup = asyncio.Event()
+            self._slots = asyncio.Semaphore(self.workers)
+            self._loop = asyncio.get_running_loop()
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+            logger.info(f"Incident outbox started ({self.workers} workers, {self.path})")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+        self._loop = None
+        # Whatever was cut off mid-delivery goes back to the queue for the next start
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE incident_outbox SET status = ? WHERE status = ?", (PENDING, IN_FLIGHT))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = dict(self._conn.execute("SELECT status, COUNT(*) FROM incident_outbox GROUP BY status").fetchall())
+            oldest = self._conn.execute(
+                "SELECT MIN(created_at) FROM incident_outbox WHERE status IN (?, ?)", (PENDING, IN_FLIGHT)
+            ).fetchone()[0]
+        return {
+            "path": self.path,
+            "workers": len(self._tasks),
+            "max_attempts": self.max_attempts,
+            "queue": {status: counts.get(status, 0) for status in STATUSES},
+            "oldest_pending_s": round(time.time() - oldest, 1) if oldest else None,
+            **self.counters,
+            "attempt_ms": self.attempt_latency.summary(),
+            "delivery_ms": self.delivery_latency.summary(),
+        }
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,124 @@
+"""
+Write-behind ingest pipeline for telemetry
+Samples are acknowledged as soon as they are queued; a background thread
+flushes them to the configured sinks (log file, Chroma) in batches
+"""
+import threading
+import time
+import logging
+from collections import deque
+from typing import Any, Callable, Dict, List
+
+logger = logging.getLogger("NetAgent")
+
+
+class IngestPipeline:
+    def __init__(self, sinks: List[Callable[[List[Dict[str, Any]]], Any]],
+                 batch_size: int = 200, flush_interval: float = 1.0, max_pending: int = 10000):
+        """Bounded queue flushed every `batch_size` items or `flush_interval` seconds"""
+        self.sinks = list(sinks)
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+
+        self._pending = deque()
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._thread = None
+        self._running = False
+
+        self.counters = {
+            "enqueued": 0,
+            "flushed": 0,
+            "rejected": 0,
+            "flushes": 0,
+            "sink_errors": 0,
+        }
+        self.last_flush_ms = 0.0
+
+    def start(self):
+        """Start the background flusher (idempotent)"""
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._run, name="telemetry-flusher", daemon=True)
+        self._thread.start()
+        logger.info(f"Ingest pipeline started (batch_size={self.batch_size}, "
+                    f"flush_interval={self.flush_interval}s, max_pending={self.max_pending})")
+
+    def stop(self, timeout: float = 10.0):
+        """Stop accepting work and flush everything still queued"""
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+        # Anything submitted while the flusher was not running
+        self.flush()
+        logger.info("Ingest pipeline stopped")
+
+    def submit(self, items: List[Dict[str, Any]]) -> bool:
+        """Queue items for the next flush; returns False when the queue is full"""
+        with self._cond:
+            if len(self._pending) + len(items) > self.max_pending:
+                self.counters["rejected"] += len(items)
+                return False
+            self._pending.extend(items)
+            self.counters["enqueued"] += len(items)
+            if len(self._pending) >= self.batch_size:
+                self._cond.notify()
+        return True
+
+    def flush(self):
+        """Synchronously drain the queue"""
+        while True:
+            with self._cond:
+                batch = self._take(self.max_pending)
+            if not batch:
+                return
+            self.write_batch(batch)
+
+    def write_batch(self, batch: List[Dict[str, Any]]):
+        """Hand one batch to every sink; a failing sink does not block the others"""
+        start = time.perf_counter()
+        with self._write_lock:
+            for sink in self.sinks:
+                try:
+                    sink(batch)
+                except Exception as e:
+                    self.counters["sink_errors"] += 1
+                    logger.error(f"Ingest sink {getattr(sink, '__name__', sink)} failed: {e}")
+        self.last_flush_ms = (time.perf_counter() - start) * 1000
+        self.counters["flushed"] += len(batch)
+        self.counters["flushes"] += 1
+        logger.debug(f"Flushed {len(batch)} telemetry samples in {self.last_flush_ms:.1f}ms")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queue_depth": len(self._pending),
+            "max_pending": self.max_pending,
+            "batch_size": self.batch_size,
+            "flush_interval_s": self.flush_interval,
+            "running": self._running,
+            "last_flush_ms": round(self.last_flush_ms, 2),
+            **self.counters,
+        }
+
+    def _take(self, limit: int) -> List[Dict[str, Any]]:
+        batch = []
+        while self._pending and len(batch) < limit:
+            batch.append(self._pending.popleft())
+        return batch
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if self._running and len(self._pending) < self.batch_size:
+                    self._cond.wait(self.flush_interval)
+                batch = self._take(self.batch_size)
+                if not batch and not self._running:
+                    return
+            if batch:
+                self.write_batch(batch)
@@ -0,0 +1,232 @@
+"""
+Async LLM access for NetAgent
+Per-call deadlines, a concurrency cap and a circuit breaker in front of a
+pluggable backend (Anthropic, or a local stand-in for offline runs and
+benchmarks). Any failure falls back to a locally computed answer.
+"""
+import asyncio
+import logging
+import os
+import random
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from backend.sketches import LatencySketch
+
+logger = logging.getLogger("NetAgent")
+
+DEFAULT_MODEL = "claude-sonnet-4-20250514"
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class AnthropicBackend:
+    name = "anthropic"
+
+    def __init__(self, api_key: Optional[str], model: str = DEFAULT_MODEL, timeout: float = 10.0):
+        self.api_key = api_key
+        self.model = model
+        self.timeout = timeout
+        self._client = None
+        self._loop = None
+
+    def _get_client(self):
+        # The async HTTP pool belongs to one event loop; rebuild it if the loop changed
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            from anthropic import AsyncAnthropic
+            self._client = AsyncAnthropic(api_key=self.api_key, timeout=self.timeout, max_retries=0)
+            self._loop = loop
+        return self._client
+
+    async def complete(self, prompt: str, max_tokens: int = 300) -> str:
+        msg = await self._get_client().messages.create(
+            model=self.model,
+            max_tokens=max_tokens,
+            messages=[{"role": "user", "content": prompt}],
+        )
+        return msg.content[0].text.strip()
+
+    async def stream(self, prompt: str, max_tokens: int, on_text: Callable[[str], None]) -> str:
+        chunks = []
+        async with self._get_client().messages.stream(
+            model=self.model,
+            max_tokens=max_tokens,
+            messages=[{"role": "user", "content": prompt}],
+        ) as stream:
+            async for text in stream.text_stream:
+                chunks.append(text)
+                on_text(text)
+        return "".join(chunks).strip()
+
+
+class LocalBackend:
+    """Offline stand-in with configurable latency and failure rate"""
+
+    name = "local"
+
+    def __init__(self, latency_ms: float = 0.0, jitter_ms: float = 0.0, failure_rate: float = 0.0,
+                 responder: Optional[Callable[[str], str]] = None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.failure_rate = failure_rate
+        self.responder = responder or (lambda prompt: "Local stand-in: no LLM configured for this analysis.")
+
+    async def complete(self, prompt: str, max_tokens: int = 300) -> str:
+        delay = max(0.0, self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)) / 1000
+        if delay:
+            await asyncio.sleep(delay)
+        if self.failure_rate and random.random() < self.failure_rate:
+            raise RuntimeError("local backend injected failure")
+        return self.responder(prompt)
+
+    async def stream(self, prompt: str, max_tokens: int, on_text: Callable[[str], None]) -> str:
+        """Same total latency as complete(): first word after a third of it, the rest spread out"""
+        delay = max(0.0, self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)) / 1000
+        if self.failure_rate and random.random() < self.failure_rate:
+            raise RuntimeError("local backend injected failure")
+        words = self.responder(prompt).split(" ")
+        if delay:
+            await asyncio.sleep(delay / 3)
+        for i, word in enumerate(words):
+            if i and delay:
+                await asyncio.sleep(2 * delay / 3 / len(words))
+            on_text(word if i == 0 else " " + word)
+        return " ".join(words)
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+
+    def allow(self) -> bool:
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = HALF_OPEN
+            self.probing = False
+        # Half-open lets exactly one probe call through
+        if self.state == HALF_OPEN and not self.probing:
+            self.probing = True
+            return True
+        return False
+
+    def release(self):
+        """A call was abandoned without an outcome; let the next one probe"""
+        self.probing = False
+
+    def record_success(self):
+        self.state = CLOSED
+        self.failures = 0
+        self.probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        self.probing = False
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != OPEN:
+                logger.warning(f"LLM circuit opened after {self.failures} failures")
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+
+
+class LLMClient:
+    def __init__(self, backend, timeout: float = 10.0, max_concurrency: int = 4,
+                 breaker: Optional[CircuitBreaker] = None):
+        self.backend = backend
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self.breaker = breaker or CircuitBreaker()
+        self.counters = {"calls": 0, "succeeded": 0, "timeouts": 0, "errors": 0, "short_circuited": 0, "fallbacks": 0}
+        # Call durations, not pings: a 9-10s success must count as latency, not a timeout
+        self.latency = LatencySketch(timeout_ms=None)
+        self.in_flight = 0
+        self._semaphore = None
+        self._loop = None
+
+    @classmethod
+    def from_env(cls, getenv=os.getenv) -> "LLMClient":
+        """LLM_BACKEND=anthropic|local (default: anthropic when ANTHROPIC_API_KEY is set)"""
+        api_key = getenv("ANTHROPIC_API_KEY")
+        timeout = float(getenv("LLM_TIMEOUT", "10"))
+        kind = getenv("LLM_BACKEND") or ("anthropic" if api_key else "local")
+        if kind == "local":
+            backend = LocalBackend(latency_ms=float(getenv("LLM_LOCAL_LATENCY_MS", "0")))
+        else:
+            backend = AnthropicBackend(api_key, model=getenv("LLM_MODEL", DEFAULT_MODEL), timeout=timeout)
+        breaker = CircuitBreaker(
+            failure_threshold=int(getenv("LLM_BREAKER_FAILURES", "3")),
+            reset_timeout=float(getenv("LLM_BREAKER_RESET", "30")),
+        )
+        return cls(backend, timeout=timeout, max_concurrency=int(getenv("LLM_MAX_CONCURRENCY", "4")), breaker=breaker)
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._loop = loop
+        return self._semaphore
+
+    async def _call(self, prompt: str, max_tokens: int, on_text: Optional[Callable[[str], None]]) -> str:
+        async with self._get_semaphore():
+            self.in_flight += 1
+            try:
+                if on_text is not None:
+                    return await self.backend.stream(prompt, max_tokens, on_text)
+                return await self.backend.complete(prompt, max_tokens)
+            finally:
+                self.in_flight -= 1
+
+    async def complete(self, prompt: str, fallback: Callable[[], str], max_tokens: int = 300,
+                       on_text: Optional[Callable[[str], None]] = None) -> Tuple[str, str]:
+        """(text, source); source is the backend name or "fallback"
+
+        With `on_text` the reply is streamed to it chunk by chunk. A call that fails
+        part-way has still streamed those chunks; the returned text is authoritative.
+        """
+        self.counters["calls"] += 1
+        if not self.breaker.allow():
+            self.counters["short_circuited"] += 1
+        else:
+            start = time.perf_counter()
+            try:
+                # The deadline covers waiting for a concurrency slot as well as the call
+                text = await asyncio.wait_for(self._call(prompt, max_tokens, on_text), self.timeout)
+            except asyncio.CancelledError:
+                # A cancelled call (client gone, caller's deadline) says nothing about the backend,
+                # but must not keep the half-open probe slot forever
+                self.breaker.release()
+                raise
+            except asyncio.TimeoutError:
+                self.counters["timeouts"] += 1
+                self.breaker.record_failure()
+                logger.warning(f"LLM call timed out after {self.timeout}s")
+            except Exception as e:
+                self.counters["errors"] += 1
+                self.breaker.record_failure()
+                logger.error(f"LLM call failed: {e}")
+            else:
+                self.counters["succeeded"] += 1
+                self.breaker.record_success()
+                self.latency.add((time.perf_counter() - start) * 1000)
+                return text, self.backend.name
+        self.counters["fallbacks"] += 1
+        return fallback(), "fallback"
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.backend.name,
+            "timeout_s": self.timeout,
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "circuit": self.breaker.state,
+            **self.counters,
+            "latency_ms": self.latency.summary(),
+        }
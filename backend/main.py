@@ -2,9 +2,35 @@ import os
 import datetime as dt
 import asyncio
 import logging
-from fastapi import FastAPI, WebSocket, Query
-from backend.telemetry import collect_metrics
-from backend.ai_agent import analyze_logs
+import math
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, WebSocket, Query, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from pydantic import ValidationError
+from starlette.concurrency import run_in_threadpool
+from backend.telemetry import (
+    write_records, parse_timestamp, tail_records, read_since, to_epoch_ns,
+    sample_adapter, sample_list_adapter,
+)
+from backend.ingest import IngestPipeline
+from backend.admission import AdmissionController, PRIORITY_LOW, PRIORITY_NORMAL, PRIORITY_HIGH
+from backend.device_windows import DeviceWindowStore
+from backend.rollups import RollupStore, tiers_from_env
+from backend.sketches import SketchStore
+from backend.anomaly import DetectorStore, STABLE
+from backend.alert_rules import AlertRuleEngine, load_rules
+from backend import forecast as forecasting
+from backend.zone_clusters import ZoneClusterer
+from backend.segment_log import SegmentLog, record_to_dict as segment_record
+from backend.telemetry_db import TelemetryDB, row_to_dict, parse_cursor
+from backend.ai_agent import (
+    summarize_logs, recommend, recommend_batch, llm, prompt_cache,
+    enqueue_incident, enqueue_incident_update, deliver_incident_action,
+)
+from backend.incident_outbox import IncidentOutbox, STATUSES as OUTBOX_STATUSES
+from backend.incident_groups import IncidentAggregator, load_topology
+from backend.prediction_cache import PredictionCache
+from backend.scheduler import PredictionScheduler
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 import subprocess
@@ -41,6 +67,13 @@ except Exception as e:
     Composio = None
     logger.warning(f"Composio SDK import failed: {e}")
 
+# Optional msgpack import (compact binary telemetry bodies)
+try:
+    import msgpack
+except Exception as e:
+    msgpack = None
+    logger.warning(f"msgpack import failed, application/msgpack bodies disabled: {e}")
+
 # Optional Chroma import (vector store for heatmap)
 try:
     from backend.chroma_service import chroma_store
@@ -60,30 +93,296 @@ COMPOSIO_ENTITY_ID = os.getenv("COMPOSIO_ENTITY_ID", "netagent-default")
 ALERT_EMAIL_TO = os.getenv("ALERT_EMAIL_TO")
 
 # === Caching & Rate Limiting ===
-prediction_cache = {
-    "data": None,
-    "timestamp": 0,
-    "ttl": 30  # Cache Claude predictions for 30 seconds
+# Claude predictions are fresh for 30 seconds, then served stale while one refresh runs
+prediction_cache = PredictionCache(
+    ttl=float(os.getenv("PREDICTION_TTL", "30")),
+    max_stale=float(os.getenv("PREDICTION_MAX_STALE", "300")),
+)
+
+# Claude is only re-asked when the anomaly detectors change state (or the cooldown lapses)
+llm_gate = {
+    "version": -1,  # anomaly_detectors.version the last recommendation was made at
+    "last_call": 0,
+    "recommendation": None,
+    "cooldown": float(os.getenv("LLM_COOLDOWN", "300")),  # seconds
+    "calls": 0,
+    "skipped": 0,
 }
 
+# === Telemetry Ingest (write-behind) ===
+TELEMETRY_BATCH_SIZE = int(os.getenv("TELEMETRY_BATCH_SIZE", "200"))
+TELEMETRY_FLUSH_INTERVAL = float(os.getenv("TELEMETRY_FLUSH_INTERVAL", "1.0"))  # seconds
+TELEMETRY_QUEUE_MAX = int(os.getenv("TELEMETRY_QUEUE_MAX", "10000"))
+TELEMETRY_BATCH_MAX = int(os.getenv("TELEMETRY_BATCH_MAX", "50000"))  # samples per /telemetry/batch upload
+TELEMETRY_BACKFILL_AGE = float(os.getenv("TELEMETRY_BACKFILL_AGE", "60"))  # seconds; older uploads skip live views
+
+TELEMETRY_WINDOW_CAPACITY = int(os.getenv("TELEMETRY_WINDOW_CAPACITY", "720"))  # samples kept per device
+TELEMETRY_MAX_DEVICES = int(os.getenv("TELEMETRY_MAX_DEVICES", "10000"))
+
+def _log_sink(items):
+    write_records([item["sample"].to_record(item["received_at"]) for item in items])
+
+def _chroma_sink(items):
+    if not chroma_store:
+        return
+    entries = []
+    for item in items:
+        sample = item["sample"]
+        # Extract metadata for location and network info
+        metadata = {key: getattr(sample, key) for key in ('location', 'ssid', 'bssid') if getattr(sample, key) is not None}
+        entries.append((sample.device_id, sample.latency, sample.packet_loss, metadata, item["received_at"]))
+    chroma_store.add_telemetry_batch(entries)
+
+# Heatmap zones: mini-batch k-means updated on every ingest flush, re-fit in the background
+zone_model = ZoneClusterer(
+    k=int(os.getenv("ZONE_CLUSTERS", "8")),
+    window=int(os.getenv("ZONE_WINDOW", "20000")),                     # recent samples kept for re-fits
+    refit_interval=float(os.getenv("ZONE_REFIT_INTERVAL", "300")),     # seconds, 0 disables
+)
+
+def _zone_sink(items):
+    zone_model.add_batch([
+        (item["sample"].latency, item["sample"].packet_loss, item["received_at"],
+         item["sample"].location, item["sample"].ssid, item["sample"].bssid)
+        for item in items
+    ])
+
+device_windows = DeviceWindowStore(capacity=TELEMETRY_WINDOW_CAPACITY, max_devices=TELEMETRY_MAX_DEVICES)
+rollups = RollupStore(tiers_from_env(os.getenv), max_keys=2 * TELEMETRY_MAX_DEVICES)
+latency_sketches = SketchStore(
+    window_s=float(os.getenv("TELEMETRY_PERCENTILE_WINDOW", "300")), max_keys=TELEMETRY_MAX_DEVICES
+)
+anomaly_detectors = DetectorStore(max_keys=4 * TELEMETRY_MAX_DEVICES)
+# Per-location/SSID alert rules, evaluated on every accepted sample (defaults unless ALERT_RULES_PATH is set)
+alert_engine = AlertRuleEngine(load_rules(os.getenv("ALERT_RULES_PATH")), max_keys=4 * TELEMETRY_MAX_DEVICES)
+
+def _observe(items):
+    """Update in-memory views as samples are accepted (before the write-behind flush)"""
+    for item in items:
+        sample = item["sample"]
+        ts_ns = to_epoch_ns(item["received_at"])
+        rollups.add(ts_ns, sample.latency, sample.packet_loss, device_id=sample.device_id, location=sample.location)
+        incident_groups.link(sample.location, sample.ssid, sample.bssid)
+        if item.get("backfill"):
+            # Rollups bucket by the sample's own time; the views below describe the live stream
+            continue
+        device_windows.add(
+            sample.device_id, ts_ns, sample.latency, sample.packet_loss,
+            location=sample.location, ssid=sample.ssid,
+        )
+        latency_sketches.add(sample.latency, device_id=sample.device_id, location=sample.location)
+        for change in anomaly_detectors.update(
+            sample.latency, sample.packet_loss,
+            device_id=sample.device_id, location=sample.location, ssid=sample.ssid,
+        ):
+            if change["kind"] != "device":
+                logger.info(f"Network state: {change['kind']} {change['name']} -> {change['state']}")
+        for event in alert_engine.observe(
+            ts_ns / 1e9, sample.latency, sample.packet_loss, location=sample.location, ssid=sample.ssid,
+        ):
+            _on_alert_event(event, sample, item["received_at"])
+
+def _observe_and_write(items):
+    """Both halves of a bulk upload, run off the event loop"""
+    _observe(items)
+    ingest_pipeline.write_batch(items)
+
+# Optional binary segmented log alongside telemetry_log.json
+TELEMETRY_SEGMENT_DIR = os.getenv("TELEMETRY_SEGMENT_DIR")
+segment_log = SegmentLog(
+    TELEMETRY_SEGMENT_DIR,
+    max_segment_bytes=int(os.getenv("TELEMETRY_SEGMENT_MAX_BYTES", str(64 * 1024 * 1024))),
+    max_segment_age_s=float(os.getenv("TELEMETRY_SEGMENT_MAX_AGE", "3600")),
+    max_segments=int(os.getenv("TELEMETRY_SEGMENT_MAX_COUNT", "0")),
+) if TELEMETRY_SEGMENT_DIR else None
+
+def _tail_records(n):
+    """Newest `n` log records, read from the binary segments when they are enabled"""
+    if segment_log:
+        return [segment_record(r) for r in segment_log.tail(n)]
+    return tail_records(n)
+
+def _segment_sink(items):
+    records = []
+    for item in items:
+        sample = item["sample"]
+        records.append((to_epoch_ns(item["received_at"]), sample.device_id, sample.latency, sample.packet_loss))
+    segment_log.append(records)
+
+# Queryable SQLite store; set TELEMETRY_DB_PATH= (empty) to disable
+TELEMETRY_DB_PATH = os.getenv("TELEMETRY_DB_PATH", os.path.join(os.path.dirname(__file__), "telemetry.db"))
+telemetry_db = TelemetryDB(TELEMETRY_DB_PATH) if TELEMETRY_DB_PATH else None
+
+def _db_sink(items):
+    rows = []
+    for item in items:
+        sample = item["sample"]
+        rows.append((
+            to_epoch_ns(item["received_at"]) // 1_000_000, sample.device_id, sample.agent,
+            sample.location, sample.ssid, sample.bssid, sample.latency, sample.packet_loss,
+        ))
+    telemetry_db.insert_many(rows)
+
+_sinks = [_log_sink, _chroma_sink, _zone_sink]
+if segment_log:
+    _sinks.append(_segment_sink)
+if telemetry_db:
+    _sinks.append(_db_sink)
+
+ingest_pipeline = IngestPipeline(
+    sinks=_sinks,
+    batch_size=TELEMETRY_BATCH_SIZE,
+    flush_interval=TELEMETRY_FLUSH_INTERVAL,
+    max_pending=TELEMETRY_QUEUE_MAX,
+)
+
+# === Ingest admission (rate limiting & load shedding) ===
+INGEST_ALERT_LATENCY = float(os.getenv("INGEST_ALERT_LATENCY", "200"))  # ms; higher samples are never shed first
+admission = AdmissionController(
+    device_rate=float(os.getenv("INGEST_DEVICE_RATE", "1.0")),    # samples/s per device
+    device_burst=float(os.getenv("INGEST_DEVICE_BURST", "10")),
+    global_rate=float(os.getenv("INGEST_GLOBAL_RATE", "2000")),   # samples/s across all devices
+    global_burst=float(os.getenv("INGEST_GLOBAL_BURST", "4000")),
+    max_devices=TELEMETRY_MAX_DEVICES,
+)
+
+def _sample_priority(sample):
+    """Alerts and first-seen devices are kept longest; repeats of the last reading go first"""
+    last = device_windows.last(sample.device_id)
+    if last is None or sample.latency >= INGEST_ALERT_LATENCY or sample.packet_loss > 0:
+        return PRIORITY_HIGH
+    _, last_latency, last_loss = last
+    if abs(sample.latency - last_latency) <= max(1.0, 0.05 * last_latency) and sample.packet_loss == last_loss:
+        return PRIORITY_LOW
+    return PRIORITY_NORMAL
+
+def _queue_pressure():
+    return ingest_pipeline.stats()["queue_depth"] / max(1, ingest_pipeline.max_pending)
+
+def _admit_batch(items):
+    """Admission for a bulk upload; backfilled samples are charged at the lowest priority"""
+    return admission.admit_batch(
+        [(item["sample"].device_id, PRIORITY_LOW if item["backfill"] else _sample_priority(item["sample"]))
+         for item in items],
+        queue_pressure=_queue_pressure(),
+    )
+
+def _admit(sample):
+    """(admitted, retry_after, reason) for one sample given current queue pressure"""
+    return admission.admit(sample.device_id, _sample_priority(sample), queue_pressure=_queue_pressure())
+
 alert_state = {
     "last_alert_time": 0,
     "cooldown": 300,  # 5 minutes between alerts
     "is_alerting": False  # Track if we're in alert state
 }
 
-# Log configuration status on startup
-logger.info("=" * 60)
-logger.info("NetAgent Backend Starting")
-logger.info("=" * 60)
-logger.info(f"LiveKit URL: {LIVEKIT_URL if LIVEKIT_URL else 'NOT SET'}")
-logger.info(f"LiveKit API Key: {'SET' if LIVEKIT_API_KEY else 'NOT SET'}")
-logger.info(f"LiveKit API Secret: {'SET' if LIVEKIT_API_SECRET else 'NOT SET'}")
-logger.info(f"Anthropic API Key: {'SET' if ANTHROPIC_API_KEY else 'NOT SET'}")
-logger.info(f"Composio API Key: {'SET' if COMPOSIO_API_KEY else 'NOT SET'}")
-logger.info("=" * 60)
+# Alert actions are queued here and delivered by background workers with retries;
+# set INCIDENT_OUTBOX_PATH= (empty) to keep the queue in memory
+incident_outbox = IncidentOutbox(
+    os.getenv("INCIDENT_OUTBOX_PATH", os.path.join(os.path.dirname(__file__), "incident_outbox.db")),
+    deliver=lambda entry: deliver_incident_action(incident_outbox, entry),
+    workers=int(os.getenv("INCIDENT_OUTBOX_WORKERS", "2")),
+    max_attempts=int(os.getenv("INCIDENT_MAX_ATTEMPTS", "6")),
+    backoff_base=float(os.getenv("INCIDENT_BACKOFF_BASE", "2")),      # seconds, doubled per attempt
+    backoff_max=float(os.getenv("INCIDENT_BACKOFF_MAX", "300")),
+    attempt_timeout=float(os.getenv("INCIDENT_STEP_TIMEOUT", "8")),
+)
+# Seconds /predict and /actions/send-alert wait for each queued action's first attempt before replying
+INCIDENT_RESPONSE_WAIT = float(os.getenv("INCIDENT_RESPONSE_WAIT", "10"))
+
+# Alerts that fire together on a shared SSID/BSSID/uplink become one parent incident
+incident_groups = IncidentAggregator(
+    window_s=float(os.getenv("INCIDENT_GROUP_WINDOW", "300")),       # seconds
+    close_after_s=float(os.getenv("INCIDENT_GROUP_CLOSE", "1800")),
+    topology=load_topology(os.getenv("TOPOLOGY_PATH")),
+    max_locations=TELEMETRY_MAX_DEVICES,
+)
+
+def _incidents_configured():
+    return bool(ALERT_EMAIL_TO and Composio and COMPOSIO_API_KEY)
+
+def _file_alert(alert, telemetry_data):
+    """Open a parent incident for an alert, or add it as a child update to the one it correlates with"""
+    incident, opened = incident_groups.add(alert)
+    status = "opened" if opened else "grouped"
+    actions = []
+    if opened:
+        logger.warning(f"Incident {incident['id']} opened: {alert['reason']}")
+        if _incidents_configured():
+            actions = enqueue_incident(incident_outbox, incident["id"], alert["reason"], telemetry_data)
+    else:
+        logger.info(f"Alert grouped into {incident['id']} ({incident['zones']} zones): {alert['reason']}")
+        if _incidents_configured():
+            text = f"Also affected: {alert['reason']} ({incident['zones']} zones in this incident so far)"
+            actions = [enqueue_incident_update(incident_outbox, incident["id"], str(len(incident["children"])), text)]
+    return {"incident": incident["id"], "status": status, "actions": actions}
+
+async def _with_action_status(response):
+    """Replace the queued action keys with each action's status and attempt_ms once first tried"""
+    entries = await incident_outbox.wait_attempted(response["actions"], INCIDENT_RESPONSE_WAIT)
+    response["actions"] = [
+        {"key": key, **({k: e[k] for k in ("action", "status", "attempts", "attempt_ms", "last_error")} if e else {})}
+        for key, e in zip(response["actions"], entries)
+    ]
+    response["timings_ms"] = {a["action"]: a["attempt_ms"] for a in response["actions"] if a.get("action")}
+    return response
+
+def _resolve_alert(fingerprint):
+    incident = incident_groups.resolve(fingerprint)
+    if incident is None:
+        return
+    logger.info(f"Incident {incident['id']} resolved: all {incident['zones']} zones recovered")
+    if _incidents_configured():
+        enqueue_incident_update(
+            incident_outbox, incident["id"], "resolved",
+            f"Resolved: all {incident['zones']} affected zones have recovered.",
+        )
+
+def _on_alert_event(event, sample, received_at):
+    """Group a rule that starts firing (outside its cooldown) into an incident"""
+    if event["status"] != "firing":
+        logger.info(f"Alert resolved: {event['rule']} in {event['kind']} {event['name']}")
+        _resolve_alert(event["fingerprint"])
+        return
+    if not event["notify"]:
+        logger.info(f"Alert re-fired within cooldown: {event['reason']}")
+        return
+    latency = event["value"] if event["metric"] == "latency" else sample.latency
+    loss = event["value"] if event["metric"] == "loss" else sample.packet_loss
+    telemetry_data = {
+        "avg_latency_ms": round(latency, 1),
+        "avg_packet_loss": round(loss * 100, 2),
+        "deviceId": sample.device_id,
+        "location": sample.location or sample.ssid or "N/A",
+        "timestamp": received_at.isoformat() + 'Z' if isinstance(received_at, dt.datetime) else str(received_at),
+    }
+    _file_alert(event, telemetry_data)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    ingest_pipeline.start()
+    if chroma_store:
+        chroma_store.start()
+    incident_outbox.start()
+    zone_model.start()
+    if PREDICTION_SCHEDULE_INTERVAL > 0:
+        prediction_scheduler.start()
+    yield
+    await prediction_scheduler.stop()
+    await zone_model.stop()
+    await incident_outbox.stop()
+    incident_outbox.close()
+    # Flush queued telemetry before the process exits, then Chroma's write buffer
+    ingest_pipeline.stop()
+    if chroma_store:
+        chroma_store.close()
+    if segment_log:
+        segment_log.close()
+    if telemetry_db:
+        telemetry_db.close()
 
-app = FastAPI(title="NetAgent API")
+app = FastAPI(title="NetAgent API", lifespan=lifespan)
 
 @app.get("/")
 def home():
@@ -139,6 +438,9 @@ def health_check():
         "api_key_configured": bool(ANTHROPIC_API_KEY),
         "status": "healthy" if ANTHROPIC_API_KEY else "not_configured"
     }
+    anthropic_status["llm"] = llm.stats()
+    anthropic_status["prompt_cache"] = prompt_cache.stats()
+    anthropic_status["prediction_cache"] = prediction_cache.stats()
     health["services"]["anthropic"] = anthropic_status
     
     # Check telemetry
@@ -149,6 +451,7 @@ def health_check():
     }
     if os.path.exists(telemetry_log):
         telemetry_status["log_size_bytes"] = os.path.getsize(telemetry_log)
+    telemetry_status["ingest"] = ingest_pipeline.stats()
     health["services"]["telemetry"] = telemetry_status
     
     # Composio status
@@ -159,140 +462,779 @@ def health_check():
             "not_configured" if not COMPOSIO_API_KEY else "sdk_missing"
         ),
     }
+    composio_status["incident_outbox"] = incident_outbox.stats()
     health["services"]["composio"] = composio_status
 
     logger.info(f"Health check complete: {health['status']}")
     return health
 
+MSGPACK_CONTENT_TYPES = ("application/msgpack", "application/x-msgpack")
+# Pre-encoded acknowledgement; the payload is no longer echoed back
+_TELEMETRY_ACK = b'{"status":"ok"}'
+
+def _validation_message(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in err['loc']) or 'body'}: {err['msg']}" for err in error.errors()
+    )
+
+def _unsupported_msgpack():
+    return JSONResponse(status_code=415, content={"status": "error", "error": "msgpack support not installed"})
+
+def _ingest_sample(sample):
+    """Admit, enqueue and observe one live sample; returns (refusal_reason, retry_after)"""
+    admitted, retry_after, reason = _admit(sample)
+    if not admitted:
+        logger.debug(f"Telemetry shed ({reason}): {sample.device_id}")
+        return reason, retry_after
+    
+    # Log file and Chroma writes happen in the background flusher
+    items = [{"sample": sample, "received_at": dt.datetime.utcnow()}]
+    if not ingest_pipeline.submit(items):
+        logger.warning("Telemetry rejected: ingest queue full")
+        return "queue_full", TELEMETRY_FLUSH_INTERVAL
+    _observe(items)
+    return None, 0.0
+
 @app.post("/telemetry")
-def post_telemetry(data: dict):
+async def post_telemetry(request: Request):
     try:
-        collect_metrics(data)
-        
-        # Also store in Chroma for heatmap visualization
-        if chroma_store:
-            device_id = data.get('deviceId', data.get('agent', 'unknown'))
-            latency = data.get('latency', 0)
-            packet_loss = data.get('packetLoss', data.get('packet_loss', 0))
-            
-            # Extract metadata for location and network info
-            metadata = {}
-            if 'location' in data:
-                metadata['location'] = data['location']
-            if 'ssid' in data:
-                metadata['ssid'] = data['ssid']
-            if 'bssid' in data:
-                metadata['bssid'] = data['bssid']
-            
-            chroma_store.add_telemetry(device_id, latency, packet_loss, metadata)
+        body = await request.body()
+        if request.headers.get("content-type", "").startswith(MSGPACK_CONTENT_TYPES):
+            if msgpack is None:
+                return _unsupported_msgpack()
+            sample = sample_adapter.validate_python(msgpack.unpackb(body))
+        else:
+            sample = sample_adapter.validate_json(body)
+    except ValidationError as e:
+        return JSONResponse(status_code=422, content={"status": "error", "error": _validation_message(e)})
+    except Exception as e:
+        return JSONResponse(status_code=400, content={"status": "error", "error": f"Undecodable body: {e}"})
+    
+    try:
+        reason, retry_after = _ingest_sample(sample)
+        if reason == "queue_full":
+            return JSONResponse(
+                status_code=503,
+                content={"status": "error", "error": "Ingest queue full"},
+                headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+            )
+        if reason:
+            return JSONResponse(
+                status_code=429,
+                content={"status": "shed", "reason": reason},
+                headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+            )
         
-        logger.debug(f"Telemetry received: {data.get('agent', 'unknown')} - {data.get('latency')}ms")
-        return {"status": "Telemetry received", "data": data}
+        logger.debug(f"Telemetry received: {sample.device_id} - {sample.latency}ms")
+        return Response(content=_TELEMETRY_ACK, media_type="application/json")
     except Exception as e:
         logger.error(f"Error collecting telemetry: {e}")
         return {"status": "error", "error": str(e)}
 
-@app.get("/predict")
-def predict():
+def _validate_each(raw_samples, errors):
+    """Per-item validation so one bad sample does not reject its neighbours"""
+    samples = []
+    for index, raw in raw_samples:
+        try:
+            samples.append((index, sample_adapter.validate_python(raw)))
+        except ValidationError as e:
+            errors.append({"index": index, "error": _validation_message(e)})
+    return samples
+
+async def _read_ndjson(request: Request):
+    """Decode an NDJSON body line by line as chunks arrive; bad lines become errors"""
+    samples, errors = [], []
+    buffer = b""
+    index = 0
+
+    def parse(line):
+        nonlocal index
+        line = line.strip()
+        if not line:
+            return
+        try:
+            samples.append((index, sample_adapter.validate_json(line)))
+        except ValidationError as e:
+            errors.append({"index": index, "error": _validation_message(e)})
+        index += 1
+
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            parse(line)
+        if index > TELEMETRY_BATCH_MAX:
+            break
+    parse(buffer)
+    return samples, errors
+
+@app.post("/telemetry/batch")
+async def post_telemetry_batch(request: Request):
+    """Bulk upload of many samples as a JSON array, a msgpack array or an NDJSON body"""
     try:
-        current_time = time.time()
-        
-        # Check cache: return cached data if still valid
-        if (prediction_cache["data"] is not None and 
-            current_time - prediction_cache["timestamp"] < prediction_cache["ttl"]):
-            logger.info(f"Returning cached prediction (age: {int(current_time - prediction_cache['timestamp'])}s)")
-            return {"insight": prediction_cache["data"]}
-        
-        # Cache expired, generate new prediction
-        logger.info("AI prediction requested (cache miss)")
-        insight = analyze_logs()
-        logger.info(f"AI prediction generated: avg_latency={insight.get('avg_latency_ms')}ms")
+        content_type = request.headers.get("content-type", "")
+        errors = []
+        if "ndjson" in content_type or "jsonl" in content_type:
+            samples, errors = await _read_ndjson(request)
+        elif content_type.startswith(MSGPACK_CONTENT_TYPES):
+            if msgpack is None:
+                return _unsupported_msgpack()
+            raw = msgpack.unpackb(await request.body())
+            if not isinstance(raw, list):
+                return JSONResponse(status_code=400, content={"status": "error", "error": "Expected an array of samples"})
+            samples = _validate_each(enumerate(raw), errors)
+        else:
+            body = await request.body()
+            try:
+                # Fast path: the whole array decodes and validates in one call
+                samples = list(enumerate(sample_list_adapter.validate_json(body)))
+            except ValidationError:
+                raw = json.loads(body)
+                if not isinstance(raw, list):
+                    return JSONResponse(status_code=400, content={"status": "error", "error": "Expected a JSON array of samples"})
+                samples = _validate_each(enumerate(raw), errors)
         
-        # Auto-alert: Check if network conditions are bad
-        alert_triggered = False
-        alert_reason = None
+        if len(samples) + len(errors) > TELEMETRY_BATCH_MAX:
+            return JSONResponse(
+                status_code=413,
+                content={"status": "error", "error": f"Batch exceeds {TELEMETRY_BATCH_MAX} samples"},
+            )
         
-        avg_latency = insight.get('avg_latency_ms', 0)
-        avg_loss = insight.get('avg_packet_loss', 0)
+        # Backfilled samples keep their own timestamp and stay out of the real-time detectors and alerts
+        now = dt.datetime.utcnow()
+        backfill_before = now - dt.timedelta(seconds=TELEMETRY_BACKFILL_AGE)
+        items = [
+            {"sample": sample, "received_at": sample.timestamp or now,
+             "backfill": sample.timestamp is not None and sample.timestamp < backfill_before}
+            for _, sample in samples
+        ]
         
-        # Define thresholds
-        CRITICAL_LATENCY = 200  # ms
-        CRITICAL_LOSS = 0.1     # 10%
+        # Every sample is charged to its device and the global budget, so reconnect storms are shed too
+        admitted, retry_after, reason = await run_in_threadpool(_admit_batch, items)
+        shed = [index for (index, _), ok in zip(samples, admitted) if not ok]
+        items = [item for item, ok in zip(items, admitted) if ok]
+        if shed and not items:
+            logger.debug(f"Telemetry batch of {len(shed)} shed ({reason})")
+            return JSONResponse(
+                status_code=429,
+                content={"status": "shed", "reason": reason, "shed": len(shed)},
+                headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+            )
         
-        # Check if alert should be triggered
-        if avg_latency > CRITICAL_LATENCY:
-            alert_reason = f"High latency detected: {avg_latency:.1f}ms (threshold: {CRITICAL_LATENCY}ms)"
-            alert_triggered = True
-        elif avg_loss > CRITICAL_LOSS:
-            alert_reason = f"High packet loss detected: {avg_loss*100:.1f}% (threshold: {CRITICAL_LOSS*100}%)"
-            alert_triggered = True
+        # Write the whole upload as a single batch to the log file and Chroma
+        if items:
+            await run_in_threadpool(_observe_and_write, items)
         
-        # Rate-limited alert logic
-        if alert_triggered and ALERT_EMAIL_TO and Composio and COMPOSIO_API_KEY:
-            # Check cooldown: only send if enough time has passed since last alert
-            time_since_last_alert = current_time - alert_state["last_alert_time"]
+        errors.sort(key=lambda e: e["index"])
+        logger.info(f"Telemetry batch received: {len(items)} accepted, {len(shed)} shed, {len(errors)} rejected")
+        return {
+            "status": "Batch received",
+            "accepted": len(items),
+            "rejected": len(errors),
+            "errors": errors[:100],
+            # Indices refused by admission; retry them no sooner than retry_after seconds
+            "shed": shed,
+            "retry_after": round(retry_after, 2),
+        }
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"status": "error", "error": f"Invalid body: {e}"})
+    except Exception as e:
+        logger.error(f"Error collecting telemetry batch: {e}")
+        return {"status": "error", "error": str(e)}
+
+# === WebSocket ingest ===
+WS_ACK_EVERY = int(os.getenv("WS_ACK_EVERY", "20"))          # messages per ack
+WS_ACK_INTERVAL = float(os.getenv("WS_ACK_INTERVAL", "1.0"))  # max seconds before an ack
+# Pushed to every agent on connect and whenever /agents/config changes it
+agent_config = {"interval_s": 5}
+ws_connections = {}  # WebSocket -> {"devices": set(), "connected_at": iso}
+
+async def _ws_send(websocket: WebSocket, message: dict, binary: bool):
+    if binary and msgpack is not None:
+        await websocket.send_bytes(msgpack.packb(message))
+    else:
+        await websocket.send_text(json.dumps(message))
+
+@app.websocket("/ws/telemetry")
+async def ws_telemetry(websocket: WebSocket):
+    """
+    Long-lived agent channel. Agents send {"seq": n, "sample": {...}} or
+    {"seq": n, "samples": [...]} as JSON text or msgpack binary frames. The
+    server acks in batches with the highest processed seq plus any shed or
+    rejected seqs, and pushes {"type": "config", ...} on the same socket.
+    """
+    await websocket.accept()
+    state = {"devices": set(), "connected_at": dt.datetime.utcnow().isoformat()}
+    ws_connections[websocket] = state
+    binary = False
+    pending = {"seq": None, "accepted": 0, "shed": [], "rejected": [], "retry_after": 0.0, "messages": 0}
+    last_ack = time.monotonic()
+
+    async def flush_ack():
+        nonlocal last_ack
+        if pending["messages"]:
+            await _ws_send(websocket, {"type": "ack", **{k: v for k, v in pending.items() if k != "messages"}}, binary)
+            pending.update(accepted=0, shed=[], rejected=[], retry_after=0.0, messages=0)
+        last_ack = time.monotonic()
+
+    try:
+        await _ws_send(websocket, {"type": "config", **agent_config}, binary)
+        while True:
+            timeout = max(0.0, WS_ACK_INTERVAL - (time.monotonic() - last_ack))
+            try:
+                message = await asyncio.wait_for(websocket.receive(), timeout=timeout)
+            except asyncio.TimeoutError:
+                await flush_ack()
+                continue
+            if message["type"] == "websocket.disconnect":
+                break
             
-            if time_since_last_alert >= alert_state["cooldown"]:
-                # Trigger full incident response workflow (Email → Jira → Slack)
-                try:
-                    logger.warning(f"Auto-alert triggered: {alert_reason} (last alert: {int(time_since_last_alert)}s ago)")
-                    
-                    # Import the incident response function
-                    from backend.ai_agent import trigger_incident_response
-                    
-                    # Prepare telemetry data for incident response
-                    telemetry_data = {
-                        "avg_latency_ms": avg_latency,
-                        "avg_packet_loss": avg_loss * 100,
-                        "deviceId": data.get('deviceId', 'unknown'),
-                        "location": data.get('location', 'N/A'),
-                        "timestamp": data.get('timestamp', dt.datetime.utcnow().isoformat() + 'Z'),
-                        "claude_recommendation": insight.get('claude_recommendation', 'N/A')
-                    }
-                    
-                    # Execute multi-step incident response
-                    response_result = trigger_incident_response(alert_reason, telemetry_data)
-                    
-                    logger.info(f"Incident response completed: {response_result.get('summary', {}).get('message', 'N/A')}")
-                    alert_state["last_alert_time"] = current_time
-                    alert_state["is_alerting"] = True
-                    insight['alert_sent'] = True
-                    insight['alert_reason'] = alert_reason
-                    insight['incident_response'] = response_result
-                    
-                except Exception as e:
-                    logger.error(f"Incident response workflow failed: {e}")
-                    insight['alert_sent'] = False
-                    insight['alert_error'] = str(e)
-            else:
-                # Cooldown active, skip sending
-                cooldown_remaining = int(alert_state["cooldown"] - time_since_last_alert)
-                logger.info(f"Alert suppressed (cooldown: {cooldown_remaining}s remaining)")
-                insight['alert_sent'] = False
-                insight['alert_reason'] = alert_reason
-                insight['alert_suppressed'] = True
-                insight['cooldown_remaining'] = cooldown_remaining
-        else:
-            insight['alert_sent'] = False
-            if alert_triggered:
-                insight['alert_reason'] = alert_reason + " (email not configured)"
+            seq = None
+            try:
+                if message.get("bytes") is not None:
+                    if msgpack is None:
+                        raise ValueError("msgpack support not installed")
+                    binary = True
+                    payload = msgpack.unpackb(message["bytes"])
+                else:
+                    payload = json.loads(message["text"])
+                seq = payload.get("seq")
+                raw_samples = payload["samples"] if "samples" in payload else [payload["sample"]]
+                samples = [sample_adapter.validate_python(raw) for raw in raw_samples]
+            except Exception as e:
+                error = _validation_message(e) if isinstance(e, ValidationError) else str(e)
+                pending["rejected"].append({"seq": seq, "error": error})
+                samples = []
             
-            # Reset alert state if conditions are good
-            if not alert_triggered and alert_state["is_alerting"]:
-                logger.info("Network conditions recovered")
-                alert_state["is_alerting"] = False
-        
-        # Update cache
-        prediction_cache["data"] = insight
-        prediction_cache["timestamp"] = current_time
-        
-        return {"insight": insight}
+            shed = False
+            for sample in samples:
+                state["devices"].add(sample.device_id)
+                reason, retry_after = _ingest_sample(sample)
+                if reason:
+                    shed = True
+                    pending["retry_after"] = max(pending["retry_after"], round(retry_after, 2))
+                else:
+                    pending["accepted"] += 1
+            if shed:
+                pending["shed"].append(seq)
+            if seq is not None:
+                pending["seq"] = seq if pending["seq"] is None else max(pending["seq"], seq)
+            pending["messages"] += 1
+            
+            if pending["messages"] >= WS_ACK_EVERY or time.monotonic() - last_ack >= WS_ACK_INTERVAL:
+                await flush_ack()
+        await flush_ack()
+    except Exception as e:
+        logger.debug(f"Telemetry WebSocket closed: {e}")
+    finally:
+        ws_connections.pop(websocket, None)
+
+@app.post("/agents/config")
+async def push_agent_config(config: dict, device: str = None):
+    """Update agent settings and push them to connected agents (or one device's socket)"""
+    if device is None:
+        agent_config.update(config)
+    sent = 0
+    for websocket, state in list(ws_connections.items()):
+        if device is not None and device not in state["devices"]:
+            continue
+        try:
+            await _ws_send(websocket, {"type": "config", **(agent_config if device is None else config)}, False)
+            sent += 1
+        except Exception as e:
+            logger.debug(f"Config push failed: {e}")
+    return {"status": "ok", "config": agent_config, "pushed_to": sent}
+
+@app.get("/agents/connections")
+def get_agent_connections():
+    return {
+        "connections": len(ws_connections),
+        "agents": [
+            {"devices": sorted(state["devices"]), "connected_at": state["connected_at"]}
+            for state in ws_connections.values()
+        ],
+    }
+
+@app.get("/telemetry/log")
+def get_telemetry_log(tail: int = 100, offset: int = None, limit: int = 1000):
+    """Last `tail` log records, or records after byte `offset` for incremental readers"""
+    try:
+        if offset is None:
+            return {"records": _tail_records(min(tail, 10000))}
+        records, next_offset = read_since(offset, limit=min(limit, 10000))
+        return {"records": records, "next_offset": next_offset}
+    except Exception as e:
+        logger.error(f"Telemetry log read failed: {e}")
+        return {"error": str(e), "records": []}
+
+@app.get("/telemetry/windows")
+def get_device_windows(window: float = 300, location: str = None):
+    """Per-device stats over the last `window` seconds, served from the ring buffers"""
+    return {
+        "window_s": window,
+        "devices": device_windows.all_device_stats(window_s=window, location=location),
+        "memory": device_windows.memory_report(),
+    }
+
+@app.get("/telemetry/windows/{device_id}")
+def get_device_window(device_id: str, window: float = 300):
+    stats = device_windows.device_stats(device_id, window_s=window)
+    if stats is None:
+        return JSONResponse(status_code=404, content={"error": f"Unknown device {device_id}"})
+    return {"window_s": window, "device": stats}
+
+@app.get("/telemetry/locations")
+def get_location_windows(window: float = 300, group_by: str = "location"):
+    """Stats aggregated per location (or per ssid) over the last `window` seconds"""
+    if group_by not in ("location", "ssid"):
+        return JSONResponse(status_code=400, content={"error": "group_by must be 'location' or 'ssid'"})
+    return {"window_s": window, group_by: device_windows.group_stats(key=group_by, window_s=window)}
+
+@app.get("/telemetry/rollups")
+def get_telemetry_rollups(device: str = None, location: str = None, since: str = None, until: str = None,
+                          max_points: int = 1500, resolution: str = None):
+    """Pre-aggregated history for a device or location; the tier is picked from the range"""
+    if (device is None) == (location is None):
+        return JSONResponse(status_code=400, content={"error": "Pass exactly one of device or location"})
+    try:
+        until_s = to_epoch_ns(parse_timestamp(until)) // 1_000_000_000 if until else int(time.time())
+        since_s = to_epoch_ns(parse_timestamp(since)) // 1_000_000_000 if since else until_s - 3600
+        kind, name = ("device", device) if device is not None else ("location", location)
+        result = rollups.query(kind, name, since_s, until_s, max_points=max(1, max_points), resolution=resolution)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    result.update({kind: name, "since": since_s, "until": until_s})
+    return result
+
+@app.get("/telemetry/percentiles")
+def get_latency_percentiles(device: str = None, location: str = None):
+    """p50/p90/p95/p99 latency from streaming sketches (global, per device or per location)"""
+    window = {"window_s": latency_sketches.window_s}
+    if device is not None or location is not None:
+        summary = latency_sketches.summary(device_id=device, location=location)
+        if summary is None:
+            return JSONResponse(status_code=404, content={"error": "No samples for that device/location"})
+        return {**window, "device": device, "location": location, "latency": summary}
+    return {
+        **window,
+        "global": latency_sketches.summary(),
+        "locations": latency_sketches.location_summaries(),
+    }
+
+@app.get("/telemetry/segments")
+def get_telemetry_segments():
+    """Segment headers (time range, record count, size) of the binary log"""
+    if not segment_log:
+        return {"error": "TELEMETRY_SEGMENT_DIR not set", "segments": []}
+    return segment_log.stats()
+
+@app.get("/telemetry/query")
+def query_telemetry(device: str = None, location: str = None, ssid: str = None,
+                    since: str = None, until: str = None, limit: int = 1000,
+                    cursor: str = None, format: str = "json"):
+    """Time-range query by device/location/ssid; keyset-paginated JSON or streamed NDJSON"""
+    if not telemetry_db:
+        return JSONResponse(status_code=503, content={"error": "Telemetry DB disabled", "records": []})
+    try:
+        filters = {
+            "device_id": device,
+            "location": location,
+            "ssid": ssid,
+            "since_ms": to_epoch_ns(parse_timestamp(since)) // 1_000_000 if since else None,
+            "until_ms": to_epoch_ns(parse_timestamp(until)) // 1_000_000 if until else None,
+            "after": parse_cursor(cursor) if cursor else None,
+        }
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": f"Invalid query parameter: {e}"})
+    
+    if format == "ndjson":
+        def stream():
+            for row in telemetry_db.iter_query(**filters):
+                yield json.dumps(row_to_dict(row)) + "\n"
+        return StreamingResponse(stream(), media_type="application/x-ndjson")
+    
+    try:
+        return telemetry_db.query(limit=max(1, min(limit, 10000)), **filters)
+    except Exception as e:
+        logger.error(f"Telemetry query failed: {e}")
+        return {"error": str(e), "records": []}
+
+@app.get("/telemetry/admission")
+def get_admission_stats(per_device: bool = True):
+    """Admitted and shed sample counts, globally, per priority and per device"""
+    return admission.stats(per_device=per_device)
+
+@app.get("/telemetry/stats")
+def telemetry_stats():
+    """Ingest queue depth, flush settings and counters"""
+    return {
+        "ingest": ingest_pipeline.stats(),
+        "admission": admission.stats(per_device=False),
+        "windows": device_windows.memory_report(),
+        "rollups": rollups.stats(),
+        "db": telemetry_db.stats() if telemetry_db else None,
+    }
+
+# === Local drop forecasts (no LLM) ===
+FORECAST_HISTORY = int(os.getenv("FORECAST_HISTORY", "120"))  # samples per device
+FORECAST_HORIZON_MIN = float(os.getenv("FORECAST_HORIZON_MIN", "5"))
+FORECAST_DROP_ALERT = float(os.getenv("FORECAST_DROP_ALERT", "0.5"))  # device drop probability that counts as at risk
+FORECAST_ALERT_FRACTION = float(os.getenv("FORECAST_ALERT_FRACTION", "0.2"))  # share of devices at risk that alerts
+forecaster = forecasting.HoltForecaster(
+    horizon_s=FORECAST_HORIZON_MIN * 60,
+    drop_latency_ms=float(os.getenv("FORECAST_DROP_LATENCY", "500")),
+)
+
+def _forecast():
+    """(matrix, per-device result) over every device in the in-memory windows"""
+    matrix = forecasting.build_matrix(device_windows.tails(FORECAST_HISTORY), FORECAST_HISTORY)
+    return matrix, forecaster.forecast(matrix["ts"], matrix["latency"], matrix["loss"], matrix["mask"])
+
+def _forecast_summary():
+    matrix, result = _forecast()
+    summary = forecasting.summarize(matrix["ids"], matrix["locations"], result, at_risk=FORECAST_DROP_ALERT)
+    summary["horizon_min"] = FORECAST_HORIZON_MIN
+    return summary
+
+@app.get("/forecast")
+async def get_forecast(device: str = None, location: str = None):
+    """Expected latency and drop probability FORECAST_HORIZON_MIN ahead, per device, location or fleet"""
+    if device is None:
+        summary = await run_in_threadpool(_forecast_summary)
+        if location is None:
+            return summary
+        if location not in summary.get("locations", {}):
+            return JSONResponse(status_code=404, content={"error": f"No forecast for location {location}"})
+        return {"location": location, "horizon_min": FORECAST_HORIZON_MIN, **summary["locations"][location]}
+    matrix, result = await run_in_threadpool(_forecast)
+    if device not in matrix["ids"]:
+        return JSONResponse(status_code=404, content={"error": f"No samples for device {device}"})
+    entry = forecasting.device_entry(matrix["ids"], matrix["locations"], result, matrix["ids"].index(device))
+    return {**entry, "horizon_min": FORECAST_HORIZON_MIN}
+
+def _network_state():
+    """Global detector state plus every location that is not stable"""
+    locations = anomaly_detectors.states("location")
+    return {
+        "state": anomaly_detectors.state(),
+        "version": anomaly_detectors.version,
+        "locations": {
+            key.split(":", 1)[1]: d["state"] for key, d in locations.items() if d["state"] != STABLE
+        },
+    }
+
+async def _gated_recommendation(insight, current_time, on_text=None):
+    """Ask Claude only when the network state changed since the last answer"""
+    network_state = insight["network_state"]
+    changed = network_state["version"] != llm_gate["version"]
+    expired = current_time - llm_gate["last_call"] >= llm_gate["cooldown"]
+    if llm_gate["recommendation"] is not None and not changed and not expired:
+        llm_gate["skipped"] += 1
+        insight["claude_recommendation"] = llm_gate["recommendation"]
+        insight["recommendation_cached"] = True
+        insight["recommendation_age_s"] = int(current_time - llm_gate["last_call"])
+        if on_text:
+            on_text(llm_gate["recommendation"])
+        return
+    text, source = await recommend(
+        insight["avg_latency_ms"], insight["avg_packet_loss"], insight["latency_trend"], on_text=on_text
+    )
+    insight["claude_recommendation"] = text
+    insight["recommendation_source"] = source
+    insight["recommendation_cached"] = False
+    llm_gate["calls"] += 1
+    # A local fallback is not remembered, so the next refresh tries Claude again
+    if source != "fallback":
+        llm_gate["recommendation"] = text
+        llm_gate["version"] = network_state["version"]
+        llm_gate["last_call"] = current_time
+
+@app.get("/anomaly/states")
+def get_anomaly_states(kind: str = None):
+    """Detector state (stable/degrading/recovering) per global/location/device stream"""
+    if kind not in (None, "global", "location", "ssid", "device"):
+        return JSONResponse(status_code=400, content={"error": "kind must be global, location, ssid or device"})
+    return {
+        "network": _network_state(),
+        "llm": {key: llm_gate[key] for key in ("calls", "skipped", "last_call", "cooldown")},
+        "transitions": anomaly_detectors.transitions[-20:],
+        "states": anomaly_detectors.states(kind),
+    }
+
+@app.get("/alerts")
+def get_alerts(events: int = Query(50, ge=0, le=200)):
+    """Alert rules, what is firing per location/SSID, and the latest firing/resolved events"""
+    return {
+        "stats": alert_engine.stats(),
+        "rules": [rule.to_dict() for rule in alert_engine.rules],
+        "firing": alert_engine.firing(),
+        "events": alert_engine.events[-events:] if events else [],
+    }
+
+@app.get("/predict")
+async def predict():
+    try:
+        insight, status, age = await prediction_cache.get("global", _compute_prediction)
+        if status != "miss":
+            logger.info(f"Returning cached prediction ({status}, age: {int(age)}s)")
+        return {"insight": insight, "cache": {"status": status, "age_s": round(age, 1)}}
     except Exception as e:
         import traceback
         tb = traceback.format_exc()
         logger.error(f"AI prediction failed: {e}\n{tb}")
         return {"error": str(e), "traceback": tb}
 
+@app.get("/predict/cache")
+def get_prediction_cache():
+    """Hit/miss/stale/coalesced counters of the /predict cache"""
+    return prediction_cache.stats()
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+async def _prediction_events():
+    """metrics → token* → done; the streamed refresh is the cache's single-flight refresh"""
+    cached = prediction_cache.fresh("global")
+    if cached is not None:
+        insight, age = cached
+        yield _sse("metrics", insight)
+        yield _sse("done", {"insight": insight, "cache": {"status": "hit", "age_s": round(age, 1)}})
+        return
+
+    queue = asyncio.Queue()
+    task, status = prediction_cache.join(
+        "global", lambda: _compute_prediction(on_event=lambda name, data: queue.put_nowait((name, data)))
+    )
+    if status == "miss":
+        task.add_done_callback(lambda _: queue.put_nowait(None))
+        while (event := await queue.get()) is not None:
+            yield _sse(*event)
+    # A refresh started by another caller has no stream attached; wait for its result
+    try:
+        insight = await asyncio.shield(task)
+    except Exception as e:
+        logger.error(f"Streamed prediction failed: {e}")
+        yield _sse("error", {"error": str(e)})
+        return
+    if status != "miss":
+        yield _sse("metrics", insight)
+    yield _sse("done", {"insight": insight, "cache": {"status": status, "age_s": 0.0}})
+
+@app.get("/predict/stream")
+async def predict_stream():
+    """Server-Sent Events: metrics and the alert decision first, then recommendation tokens"""
+    return StreamingResponse(
+        _prediction_events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# === Per-zone predictions, precomputed in the background ===
+PREDICTION_SCHEDULE_INTERVAL = float(os.getenv("PREDICTION_SCHEDULE_INTERVAL", "15"))  # seconds, 0 disables
+PREDICTION_ZONE_WINDOW = float(os.getenv("PREDICTION_ZONE_WINDOW", "300"))  # seconds of telemetry per zone
+# Zones per batched Claude call; 0 analyses each zone with its own call
+LLM_BATCH_MAX_ZONES = int(os.getenv("LLM_BATCH_MAX_ZONES", "25"))
+
+def _collect_zones():
+    """Every location and SSID with samples in the window, with its detector state"""
+    targets = []
+    for kind in ("location", "ssid"):
+        for name, stats in device_windows.group_stats(key=kind, window_s=PREDICTION_ZONE_WINDOW).items():
+            detector = anomaly_detectors.detail(kind, name) or {}
+            targets.append({
+                "kind": kind,
+                "name": name,
+                "stats": stats,
+                "state": detector.get("state", STABLE),
+                "changed_at": detector.get("since", 0),
+            })
+    return targets
+
+def _zone_insight(target):
+    """Insight for one zone from its window stats, without a recommendation yet"""
+    stats = target["stats"]
+    avg_latency = stats["avg_latency_ms"] if stats["avg_latency_ms"] is not None else 9999
+    insight = {
+        target["kind"]: target["name"],
+        "avg_latency_ms": avg_latency,
+        "max_latency_ms": stats["max_latency_ms"],
+        "avg_packet_loss": stats["avg_packet_loss"],
+        "latency_trend": stats["latency_trend"],
+        "devices": stats["devices"],
+        "samples": stats["count"],
+        "timeouts": stats["timeouts"],
+        "network_state": target["state"],
+        "computed_at": time.time(),
+    }
+    if target["kind"] == "location":
+        insight["latency_percentiles"] = latency_sketches.summary(location=target["name"])
+    return insight
+
+async def _analyze_zone(target, use_llm):
+    insight = _zone_insight(target)
+    text, source = await recommend(
+        insight["avg_latency_ms"], insight["avg_packet_loss"], insight["latency_trend"],
+        location=target["name"], use_llm=use_llm,
+    )
+    insight["claude_recommendation"] = text
+    insight["recommendation_source"] = source
+    return insight
+
+async def _analyze_zones(targets):
+    """Insights for several zones from a single batched Claude call"""
+    insights = [_zone_insight(target) for target in targets]
+    zones = [
+        {
+            "name": target["name"],
+            "avg_latency_ms": insight["avg_latency_ms"],
+            "avg_packet_loss": insight["avg_packet_loss"],
+            "trend": insight["latency_trend"],
+        }
+        for target, insight in zip(targets, insights)
+    ]
+    answers = await recommend_batch(zones, max_zones=len(zones))
+    for insight, (text, source) in zip(insights, answers):
+        insight["claude_recommendation"] = text
+        insight["recommendation_source"] = source
+        insight["batched_with"] = len(zones)
+    return insights
+
+prediction_scheduler = PredictionScheduler(
+    _collect_zones,
+    _analyze_zone,
+    interval=PREDICTION_SCHEDULE_INTERVAL or 15,
+    llm_per_minute=float(os.getenv("LLM_BUDGET_PER_MINUTE", "6")),
+    llm_refresh_s=llm_gate["cooldown"],
+    analyze_batch=_analyze_zones if LLM_BATCH_MAX_ZONES > 0 else None,
+    batch_size=max(1, LLM_BATCH_MAX_ZONES),
+)
+
+@app.get("/predict/zones")
+def get_zone_predictions():
+    """Scheduler status and the state of every precomputed zone"""
+    return prediction_scheduler.stats()
+
+async def _compute_prediction(on_event=None):
+    """Analyze recent telemetry, ask Claude if needed and run the alert workflow
+
+    `on_event(name, data)` gets a "metrics" event as soon as the numbers and alert
+    decision are known, then "token" events while the recommendation streams.
+    """
+    current_time = time.time()
+    logger.info("AI prediction refresh started")
+    insight = await run_in_threadpool(summarize_logs, _tail_records)
+    insight["network_state"] = _network_state()
+    forecast = await run_in_threadpool(_forecast_summary)
+    insight["forecast"] = forecast
+    
+    # Auto-alert: Check if network conditions are bad
+    alert_triggered = False
+    alert_reason = None
+    
+    avg_latency = insight.get('avg_latency_ms', 0)
+    avg_loss = insight.get('avg_packet_loss', 0)
+    percentiles = latency_sketches.summary()
+    insight['latency_percentiles'] = percentiles
+    insight['alerts_firing'] = alert_engine.firing()
+    p95_latency = percentiles.get('p95')
+    
+    # Define thresholds
+    # Fleet-wide thresholds; per-location/SSID alerting is done by alert_engine at ingest
+    CRITICAL_LATENCY = float(os.getenv("CRITICAL_LATENCY", "200"))  # ms
+    CRITICAL_P95_LATENCY = float(os.getenv("CRITICAL_P95_LATENCY", "500"))  # ms
+    CRITICAL_LOSS = float(os.getenv("CRITICAL_LOSS", "0.1"))     # 10%
+    
+    # Check if alert should be triggered
+    if avg_latency > CRITICAL_LATENCY:
+        alert_reason = f"High latency detected: {avg_latency:.1f}ms (threshold: {CRITICAL_LATENCY:g}ms)"
+        alert_triggered = True
+    elif p95_latency is not None and p95_latency > CRITICAL_P95_LATENCY:
+        alert_reason = f"High tail latency detected: p95 {p95_latency:.1f}ms (threshold: {CRITICAL_P95_LATENCY:.0f}ms)"
+        alert_triggered = True
+    elif avg_loss > CRITICAL_LOSS:
+        alert_reason = f"High packet loss detected: {avg_loss*100:.1f}% (threshold: {CRITICAL_LOSS*100:g}%)"
+        alert_triggered = True
+    elif forecast.get("devices") and forecast["at_risk_fraction"] >= FORECAST_ALERT_FRACTION:
+        alert_reason = (
+            f"Connection drops forecast: {forecast['devices_at_risk']}/{forecast['devices']} devices "
+            f"at >= {FORECAST_DROP_ALERT:.0%} drop probability within {FORECAST_HORIZON_MIN:g} min"
+        )
+        alert_triggered = True
+    
+    # Nothing above needs Claude, so streaming clients get it before the recommendation
+    if on_event:
+        on_event("metrics", {**insight, "alert_triggered": alert_triggered, "alert_reason": alert_reason})
+    if "error" not in insight:
+        on_text = (lambda chunk: on_event("token", chunk)) if on_event else None
+        await _gated_recommendation(insight, current_time, on_text=on_text)
+    logger.info(f"AI prediction generated: avg_latency={avg_latency}ms")
+    
+    # Rate-limited alert logic
+    if alert_triggered and ALERT_EMAIL_TO and Composio and COMPOSIO_API_KEY:
+        # Check cooldown: only send if enough time has passed since last alert
+        time_since_last_alert = current_time - alert_state["last_alert_time"]
+        
+        if time_since_last_alert >= alert_state["cooldown"]:
+            # Queue the incident actions (Email, Jira, Slack); the outbox workers deliver them
+            try:
+                logger.warning(f"Auto-alert triggered: {alert_reason} (last alert: {int(time_since_last_alert)}s ago)")
+                
+                # Prepare telemetry data for incident response (device details from the newest record)
+                data = (await run_in_threadpool(_tail_records, 1) or [{}])[-1]
+                location, ssid = device_windows.place(data.get('deviceId'))
+                telemetry_data = {
+                    "avg_latency_ms": avg_latency,
+                    "avg_packet_loss": avg_loss * 100,
+                    "deviceId": data.get('deviceId', 'unknown'),
+                    "location": location or ssid or 'N/A',
+                    "timestamp": data.get('timestamp', dt.datetime.utcnow().isoformat() + 'Z'),
+                    "claude_recommendation": insight.get('claude_recommendation', 'N/A')
+                }
+                
+                # Joins an incident already open for the affected zones instead of opening another
+                alert = {"fingerprint": "predict-fleet", "rule": "predict", "kind": "global", "name": "all",
+                         "reason": alert_reason, "at": current_time}
+                insight['incident_response'] = await _with_action_status(_file_alert(alert, telemetry_data))
+                
+                alert_state["last_alert_time"] = current_time
+                alert_state["is_alerting"] = True
+                insight['alert_sent'] = True
+                insight['alert_reason'] = alert_reason
+                
+            except Exception as e:
+                logger.error(f"Incident response workflow failed: {e}")
+                insight['alert_sent'] = False
+                insight['alert_error'] = str(e)
+        else:
+            # Cooldown active, skip sending
+            cooldown_remaining = int(alert_state["cooldown"] - time_since_last_alert)
+            logger.info(f"Alert suppressed (cooldown: {cooldown_remaining}s remaining)")
+            insight['alert_sent'] = False
+            insight['alert_reason'] = alert_reason
+            insight['alert_suppressed'] = True
+            insight['cooldown_remaining'] = cooldown_remaining
+    else:
+        insight['alert_sent'] = False
+        if alert_triggered:
+            insight['alert_reason'] = alert_reason + " (email not configured)"
+        
+        # Reset alert state if conditions are good
+        if not alert_triggered and alert_state["is_alerting"]:
+            logger.info("Network conditions recovered")
+            alert_state["is_alerting"] = False
+            _resolve_alert("predict-fleet")
+    
+    return insight
+
+# Registered after the fixed /predict/* routes so it does not shadow them
+@app.get("/predict/{location}")
+def predict_location(location: str, kind: str = "location"):
+    """Precomputed insight for one location (or SSID with kind=ssid)"""
+    insight = prediction_scheduler.get(kind, location)
+    if insight is None:
+        return JSONResponse(status_code=404, content={"error": f"No recent telemetry for {kind} {location}"})
+    return {"insight": insight, "age_s": round(time.time() - insight["computed_at"], 1)}
+
 
 # ---- LiveKit Token (mirrors backend/app.py) ----
 @app.get("/token")
@@ -375,10 +1317,11 @@ def save_logs():
         return {"error": str(e)}
 
 @app.post("/actions/send-alert")
-def send_alert(message: str = Query("Network degradation detected")):
+async def send_alert(message: str = Query("Network degradation detected")):
     """
     Trigger full incident response workflow: Email → Jira → Slack
-    This will send an email, create a Jira ticket, and post to Slack.
+    The actions go through the incident outbox like automatic alerts; the reply
+    carries each one's status and attempt_ms once it has been tried.
     """
     if Composio is None or not COMPOSIO_API_KEY:
         return {"error": "Composio not configured"}
@@ -387,9 +1330,6 @@ def send_alert(message: str = Query("Network degradation detected")):
         return {"error": "ALERT_EMAIL_TO not set in .env"}
     
     try:
-        # Import the incident response function
-        from backend.ai_agent import trigger_incident_response
-        
         # Prepare telemetry data for incident response
         telemetry_data = {
             "avg_latency_ms": 250,
@@ -400,14 +1340,16 @@ def send_alert(message: str = Query("Network degradation detected")):
             "claude_recommendation": "Manual alert triggered for testing"
         }
         
-        # Execute multi-step incident response
-        response_result = trigger_incident_response(message, telemetry_data)
+        # A fresh incident every time: a manual test is never grouped into a live one
+        incident_id = f"manual-{int(time.time() * 1000)}"
+        actions = enqueue_incident(incident_outbox, incident_id, message, telemetry_data)
+        response_result = await _with_action_status({"incident": incident_id, "status": "opened", "actions": actions})
         
-        logger.info(f"Manual incident response completed: {response_result.get('summary', {}).get('message', 'N/A')}")
+        logger.info(f"Manual incident {incident_id} queued: {response_result['timings_ms']}")
         
         return {
             "action": "send_alert",
-            "status": "success",
+            "status": "queued",
             "workflow": "Email → Jira → Slack",
             "result": response_result
         }
@@ -417,16 +1359,44 @@ def send_alert(message: str = Query("Network degradation detected")):
         return {"error": str(e), "traceback": traceback.format_exc()}
 
 
+@app.get("/incidents")
+def list_incidents(status: str = Query(None), incident: str = Query(None), limit: int = Query(100, ge=1, le=1000)):
+    """Queued incident actions with attempts, last error and latencies, plus outbox stats"""
+    if status and status not in OUTBOX_STATUSES:
+        return JSONResponse({"error": f"status must be one of {', '.join(OUTBOX_STATUSES)}"}, status_code=400)
+    return {
+        "stats": incident_outbox.stats(),
+        "actions": incident_outbox.entries(status=status, incident=incident, limit=limit),
+    }
+
+@app.get("/incidents/groups")
+def list_incident_groups(include_closed: bool = True):
+    """Parent incidents with their child alerts and correlation keys"""
+    return {"stats": incident_groups.stats(), "incidents": incident_groups.incidents(include_closed)}
+
+@app.get("/incidents/{key}")
+def get_incident_action(key: str):
+    entry = incident_outbox.get(key)
+    if entry is None:
+        return JSONResponse({"error": f"no incident action {key}"}, status_code=404)
+    return entry
+
+@app.post("/incidents/{key}/retry")
+def retry_incident_action(key: str):
+    """Re-queue a dead-lettered action"""
+    if not incident_outbox.retry(key):
+        return JSONResponse({"error": f"{key} is not dead-lettered"}, status_code=409)
+    return incident_outbox.get(key)
+
+
 # ---- Chroma Heatmap Endpoints ----
 @app.get("/heatmap/zones")
 def get_heatmap_zones(limit: int = 20):
-    """Get network health zones for heatmap visualization"""
-    if not chroma_store:
-        return {"error": "Chroma not configured", "zones": []}
-    
+    """Network health zones (cluster centroids, members, health) for heatmap visualization"""
     try:
-        zones = chroma_store.get_health_zones(num_zones=limit)
-        stats = chroma_store.get_stats()
+        # Served from the in-memory clustering, O(k); no Chroma round-trip
+        zones = zone_model.zones(limit)
+        stats = zone_model.stats()
         
         logger.debug(f"Heatmap zones requested: {len(zones)} zones returned")
         return {
@@ -441,13 +1411,13 @@ def get_heatmap_zones(limit: int = 20):
         return {"error": str(e), "traceback": tb, "zones": []}
 
 @app.get("/heatmap/similar")
-def find_similar_zones(latency: float = 100, packet_loss: float = 0.01, limit: int = 5):
+def find_similar_zones(latency: float = 100, packet_loss: float = 0.01, limit: int = 5, fresh: bool = None):
     """Find zones with similar network conditions"""
     if not chroma_store:
         return {"error": "Chroma not configured", "similar": []}
     
     try:
-        similar = chroma_store.find_similar_conditions(latency, packet_loss, n_results=limit)
+        similar = chroma_store.find_similar_conditions(latency, packet_loss, n_results=limit, fresh=fresh)
         
         logger.debug(f"Similar zones query: latency={latency}ms, loss={packet_loss*100}%")
         return {
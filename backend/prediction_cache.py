@@ -0,0 +1,100 @@
+"""
+Single-flight, stale-while-revalidate cache for predictions
+One refresh per key runs at a time and concurrent callers await it; once the
+TTL passes callers get the stale value at once while a background refresh runs
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+logger = logging.getLogger("NetAgent")
+
+HIT = "hit"
+MISS = "miss"
+STALE = "stale"
+COALESCED = "coalesced"
+
+
+class PredictionCache:
+    def __init__(self, ttl: float = 30, max_stale: float = 300):
+        """Values older than ttl + max_stale are not served; the caller waits for a refresh"""
+        self.ttl = ttl
+        self.max_stale = max_stale
+        # key -> (value, computed_at)
+        self.entries: Dict[Hashable, Tuple[Any, float]] = {}
+        self.inflight: Dict[Hashable, asyncio.Task] = {}
+        self.counters = {HIT: 0, MISS: 0, STALE: 0, COALESCED: 0, "refreshes": 0, "refresh_errors": 0}
+
+    async def get(self, key: Hashable, compute: Callable[[], Awaitable[Any]]) -> Tuple[Any, str, float]:
+        """(value, cache status, age in seconds) for `key`, computing it at most once at a time"""
+        now = time.time()
+        entry = self.entries.get(key)
+        if entry is not None:
+            value, computed_at = entry
+            age = now - computed_at
+            if age < self.ttl:
+                self.counters[HIT] += 1
+                return value, HIT, age
+            if age < self.ttl + self.max_stale:
+                self.counters[STALE] += 1
+                self.refresh(key, compute)
+                return value, STALE, age
+
+        task, status = self.join(key, compute)
+        # shield: a caller that disconnects must not cancel the refresh others wait on
+        value = await asyncio.shield(task)
+        return value, status, 0.0
+
+    def fresh(self, key: Hashable) -> Optional[Tuple[Any, float]]:
+        """(value, age) if `key` is within its TTL, counted as a hit"""
+        entry = self.entries.get(key)
+        if entry is None or time.time() - entry[1] >= self.ttl:
+            return None
+        self.counters[HIT] += 1
+        return entry[0], time.time() - entry[1]
+
+    def join(self, key: Hashable, compute: Callable[[], Awaitable[Any]]) -> Tuple[asyncio.Task, str]:
+        """The refresh task for `key` and whether this call started it (miss) or joined one (coalesced)"""
+        status = COALESCED if key in self.inflight else MISS
+        self.counters[status] += 1
+        return self.refresh(key, compute), status
+
+    def refresh(self, key: Hashable, compute: Callable[[], Awaitable[Any]]) -> asyncio.Task:
+        """Start a refresh for `key` unless one is already running; returns its task"""
+        task = self.inflight.get(key)
+        if task is None:
+            task = self.inflight[key] = asyncio.create_task(self._run(key, compute))
+            # Background refreshes may have no awaiter; the error is already logged
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        return task
+
+    def put(self, key: Hashable, value: Any):
+        self.entries[key] = (value, time.time())
+
+    def peek(self, key: Hashable) -> Optional[Any]:
+        entry = self.entries.get(key)
+        return entry[0] if entry else None
+
+    async def _run(self, key: Hashable, compute: Callable[[], Awaitable[Any]]) -> Any:
+        self.counters["refreshes"] += 1
+        try:
+            value = await compute()
+            self.put(key, value)
+            return value
+        except Exception as e:
+            self.counters["refresh_errors"] += 1
+            logger.error(f"Prediction refresh failed for {key}: {e}")
+            raise
+        finally:
+            self.inflight.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.time()
+        return {
+            "ttl": self.ttl,
+            "max_stale": self.max_stale,
+            **self.counters,
+            "inflight": len(self.inflight),
+            "entries": {str(k): round(now - t, 1) for k, (_, t) in self.entries.items()},
+        }
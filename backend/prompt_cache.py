@@ -0,0 +1,117 @@
+"""
+Semantic cache for LLM recommendations
+Metrics are quantized into a signature (latency band, loss band, trend,
+location) so near-identical conditions reuse one answer. LRU + TTL in memory,
+written through to SQLite so answers survive restarts.
+"""
+import math
+import sqlite3
+import threading
+import time
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from backend.device_windows import TIMEOUT_LATENCY_MS
+
+logger = logging.getLogger("NetAgent")
+
+# Latency bands grow geometrically (~25% wide), loss bands are 5 points wide
+LATENCY_STEP = 1.25
+LOSS_STEP = 0.05
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS prompt_cache (
+    signature TEXT PRIMARY KEY,
+    response TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+"""
+
+
+def signature(avg_latency: float, avg_loss: float, trend: str = "flat", location: Optional[str] = None) -> str:
+    if avg_latency >= TIMEOUT_LATENCY_MS:
+        latency_band = "timeout"
+    else:
+        latency_band = str(int(math.log(max(avg_latency, 1.0)) / math.log(LATENCY_STEP)))
+    loss_band = int(round(avg_loss / LOSS_STEP))
+    return f"{location or '*'}|l{latency_band}|p{loss_band}|{trend}"
+
+
+class PromptCache:
+    def __init__(self, path: Optional[str] = None, ttl: float = 3600, max_entries: int = 1024):
+        """`path` empty or None keeps the cache in memory only"""
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # signature -> (response, created_at), least recently used first
+        self.entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self.counters = {"hits": 0, "misses": 0, "expired": 0, "evictions": 0, "stores": 0}
+        self._lock = threading.Lock()
+        self._conn = None
+        if path:
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(SCHEMA)
+            self._load()
+
+    def _load(self):
+        cutoff = time.time() - self.ttl
+        with self._conn:
+            self._conn.execute("DELETE FROM prompt_cache WHERE created_at < ?", (cutoff,))
+        rows = self._conn.execute(
+            "SELECT signature, response, created_at FROM prompt_cache ORDER BY created_at DESC LIMIT ?",
+            (self.max_entries,),
+        ).fetchall()
+        for sig, response, created_at in reversed(rows):
+            self.entries[sig] = (response, created_at)
+        logger.info(f"Prompt cache loaded {len(self.entries)} entries from {self.path}")
+
+    def get(self, sig: str) -> Optional[str]:
+        with self._lock:
+            entry = self.entries.get(sig)
+            if entry is None:
+                self.counters["misses"] += 1
+                return None
+            response, created_at = entry
+            if time.time() - created_at >= self.ttl:
+                del self.entries[sig]
+                self.counters["expired"] += 1
+                self.counters["misses"] += 1
+                return None
+            self.entries.move_to_end(sig)
+            self.counters["hits"] += 1
+            return response
+
+    def put(self, sig: str, response: str):
+        now = time.time()
+        with self._lock:
+            self.entries[sig] = (response, now)
+            self.entries.move_to_end(sig)
+            self.counters["stores"] += 1
+            evicted = []
+            while len(self.entries) > self.max_entries:
+                evicted.append(self.entries.popitem(last=False)[0])
+                self.counters["evictions"] += 1
+            if self._conn is not None:
+                with self._conn:
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO prompt_cache (signature, response, created_at) VALUES (?, ?, ?)",
+                        (sig, response, now),
+                    )
+                    self._conn.executemany("DELETE FROM prompt_cache WHERE signature = ?", [(s,) for s in evicted])
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "path": self.path,
+                "ttl": self.ttl,
+                "max_entries": self.max_entries,
+                "entries": len(self.entries),
+                **self.counters,
+            }
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
@@ -0,0 +1,177 @@
+"""
+Incremental multi-resolution telemetry rollups
+Each sample updates 1s/1m/1h buckets per device and per location; every tier
+has its own retention, so long-range charts read pre-aggregated rows
+"""
+import threading
+import time
+from array import array
+from bisect import bisect_right
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from backend.device_windows import TIMEOUT_LATENCY_MS
+
+# Upper bounds (ms) of the latency histogram buckets; the last bucket is open-ended
+LATENCY_BUCKETS_MS = (10, 25, 50, 100, 200, 500, 1000, 2500)
+
+# (name, bucket width in seconds, default retention in seconds)
+DEFAULT_TIERS = (
+    ("1s", 1, 15 * 60),
+    ("1m", 60, 24 * 3600),
+    ("1h", 3600, 30 * 24 * 3600),
+)
+
+
+class Bucket:
+    __slots__ = ("count", "timeouts", "sum", "min", "max", "loss_count", "hist")
+
+    def __init__(self):
+        self.count = 0
+        self.timeouts = 0
+        self.sum = 0.0
+        self.min = float("inf")
+        self.max = 0.0
+        self.loss_count = 0
+        self.hist = array("I", [0]) * (len(LATENCY_BUCKETS_MS) + 1)
+
+    def add(self, latency: float, loss: float):
+        self.count += 1
+        if loss > 0:
+            self.loss_count += 1
+        if latency >= TIMEOUT_LATENCY_MS:
+            self.timeouts += 1
+            return
+        self.sum += latency
+        self.min = min(self.min, latency)
+        self.max = max(self.max, latency)
+        self.hist[bisect_right(LATENCY_BUCKETS_MS, latency)] += 1
+
+    def to_dict(self, start_s: int) -> Dict[str, Any]:
+        valid = self.count - self.timeouts
+        return {
+            "ts": start_s,
+            "count": self.count,
+            "timeouts": self.timeouts,
+            "avg_latency_ms": round(self.sum / valid, 2) if valid else None,
+            "min_latency_ms": round(self.min, 2) if valid else None,
+            "max_latency_ms": round(self.max, 2) if valid else None,
+            "loss_count": self.loss_count,
+            "loss_rate": round(self.loss_count / self.count, 4) if self.count else None,
+            "histogram": list(self.hist),
+        }
+
+
+class RollupStore:
+    def __init__(self, tiers: Tuple[Tuple[str, int, int], ...] = DEFAULT_TIERS, max_keys: int = 20000,
+                 sweep_interval: float = 60):
+        """`tiers` are (name, width_s, retention_s), finest first; least recently updated series
+        are evicted past `max_keys`, and idle ones are expired every `sweep_interval` seconds
+        """
+        self.tiers = tiers
+        self.max_keys = max_keys
+        self.sweep_interval = sweep_interval
+        # (kind, name) -> tier name -> bucket start -> Bucket
+        self.series: "OrderedDict[Tuple[str, str], Dict[str, OrderedDict[int, Bucket]]]" = OrderedDict()
+        self.last_sweep = time.time()
+        self._lock = threading.Lock()
+
+    def add(self, ts_ns: int, latency: float, loss: float,
+            device_id: Optional[str] = None, location: Optional[str] = None):
+        """O(tiers) update of every rollup the sample belongs to"""
+        ts_s = ts_ns // 1_000_000_000
+        now_s = int(time.time())
+        keys = []
+        if device_id is not None:
+            keys.append(("device", device_id))
+        if location is not None:
+            keys.append(("location", location))
+        with self._lock:
+            if now_s - self.last_sweep >= self.sweep_interval:
+                self._sweep(now_s)
+            for key in keys:
+                tiers = self.series.get(key)
+                if tiers is None:
+                    if len(self.series) >= self.max_keys:
+                        self.series.popitem(last=False)
+                    tiers = self.series[key] = {name: OrderedDict() for name, _, _ in self.tiers}
+                else:
+                    self.series.move_to_end(key)
+                for name, width, retention in self.tiers:
+                    if ts_s < now_s - retention:
+                        continue  # backfilled sample older than this tier keeps
+                    buckets = tiers[name]
+                    start = ts_s - ts_s % width
+                    bucket = buckets.get(start)
+                    if bucket is None:
+                        bucket = buckets[start] = Bucket()
+                        self._expire(buckets, now_s - retention)
+                    bucket.add(latency, loss)
+
+    def pick_tier(self, since_s: int, until_s: int, max_points: int) -> Tuple[str, int, int]:
+        """Finest tier whose retention reaches `since_s` and whose row count fits `max_points`"""
+        now_s = int(time.time())
+        covering = [t for t in self.tiers if now_s - t[2] <= since_s] or [self.tiers[-1]]
+        for tier in covering:
+            if (until_s - since_s) / tier[1] <= max_points:
+                return tier
+        return covering[-1]
+
+    def query(self, kind: str, name: str, since_s: int, until_s: int,
+              max_points: int = 1500, resolution: Optional[str] = None) -> Dict[str, Any]:
+        if resolution is not None:
+            tier = next((t for t in self.tiers if t[0] == resolution), None)
+            if tier is None:
+                raise ValueError(f"Unknown resolution {resolution}")
+        else:
+            tier = self.pick_tier(since_s, until_s, max_points)
+        with self._lock:
+            buckets = self.series.get((kind, name), {}).get(tier[0], {})
+            rows = [b.to_dict(start) for start, b in buckets.items() if since_s <= start <= until_s]
+        rows.sort(key=lambda r: r["ts"])
+        return {
+            "resolution": tier[0],
+            "bucket_seconds": tier[1],
+            "latency_buckets_ms": list(LATENCY_BUCKETS_MS),
+            "rows": rows,
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = {name: 0 for name, _, _ in self.tiers}
+            for tiers in self.series.values():
+                for name, buckets in tiers.items():
+                    counts[name] += len(buckets)
+            return {
+                "series": len(self.series),
+                "max_series": self.max_keys,
+                "buckets": counts,
+                "tiers": [{"name": n, "bucket_seconds": w, "retention_seconds": r} for n, w, r in self.tiers],
+            }
+
+    def _sweep(self, now_s: int):
+        """Expire old buckets in every series; series left with none are dropped"""
+        for key in list(self.series):
+            tiers = self.series[key]
+            for name, _, retention in self.tiers:
+                self._expire(tiers[name], now_s - retention)
+            if not any(tiers.values()):
+                del self.series[key]
+        self.last_sweep = now_s
+
+    @staticmethod
+    def _expire(buckets: "OrderedDict[int, Bucket]", cutoff_s: int):
+        # Buckets arrive in time order apart from backfills, so expiry pops from the front
+        while buckets:
+            start = next(iter(buckets))
+            if start >= cutoff_s:
+                break
+            buckets.popitem(last=False)
+
+
+def tiers_from_env(getenv) -> Tuple[Tuple[str, int, int], ...]:
+    """Default tiers with retention overridable via ROLLUP_RETENTION_<TIER> (seconds)"""
+    return tuple(
+        (name, width, int(getenv(f"ROLLUP_RETENTION_{name.upper()}", str(retention))))
+        for name, width, retention in DEFAULT_TIERS
+    )
@@ -0,0 +1,164 @@
+"""
+Background prediction scheduler
+Periodically recomputes an insight for every location/SSID in the telemetry
+window, degraded zones first, and keeps them in memory for O(1) reads.
+Claude calls are held to a per-minute budget; zones that miss out are
+answered from the prompt cache or local rules and retried next cycle. With a
+batch analyzer, every zone that wants the LLM shares one call per chunk.
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+from backend.admission import TokenBucket
+from backend.anomaly import DEGRADING, RECOVERING
+
+logger = logging.getLogger("NetAgent")
+
+# Zones in these states are analysed first
+STATE_PRIORITY = {DEGRADING: 2, RECOVERING: 1}
+# Recommendation sources that did not spend an LLM call
+FREE_SOURCES = ("cache", "rules")
+
+Key = Tuple[str, str]
+
+
+class PredictionScheduler:
+    def __init__(self, collect: Callable[[], List[Dict[str, Any]]],
+                 analyze: Callable[[Dict[str, Any], bool], Awaitable[Dict[str, Any]]],
+                 interval: float = 15.0, llm_per_minute: float = 6, llm_refresh_s: float = 300,
+                 analyze_batch: Optional[Callable[[List[Dict[str, Any]]], Awaitable[List[Dict[str, Any]]]]] = None,
+                 batch_size: int = 25):
+        """`collect()` lists targets ({"kind", "name", "state", "changed_at", ...});
+        `analyze(target, use_llm)` turns one into an insight with a "recommendation_source";
+        `analyze_batch(targets)` does the same for up to `batch_size` targets in one LLM call
+        """
+        self.collect = collect
+        self.analyze = analyze
+        self.analyze_batch = analyze_batch
+        self.batch_size = batch_size
+        self.interval = interval
+        self.llm_refresh_s = llm_refresh_s
+        self.budget = TokenBucket(llm_per_minute / 60, llm_per_minute, time.monotonic())
+        self.insights: Dict[Key, Dict[str, Any]] = {}
+        # key -> (state, time) of the last insight backed by an LLM answer
+        self.llm_marks: Dict[Key, Tuple[str, float]] = {}
+        self.counters = {"runs": 0, "analyses": 0, "llm_calls": 0, "llm_deferred": 0, "batched_zones": 0, "errors": 0}
+        self.last_run_ms = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    def get(self, kind: str, name: str) -> Optional[Dict[str, Any]]:
+        return self.insights.get((kind, name))
+
+    def needs_llm(self, target: Dict[str, Any], now: float) -> bool:
+        mark = self.llm_marks.get((target["kind"], target["name"]))
+        return mark is None or mark[0] != target["state"] or now - mark[1] >= self.llm_refresh_s
+
+    def prioritize(self, targets: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Degraded, then recovering, then stable; most recent state change first within each"""
+        return sorted(targets, key=lambda t: (STATE_PRIORITY.get(t["state"], 0), t.get("changed_at", 0)), reverse=True)
+
+    async def run_once(self):
+        start = time.perf_counter()
+        now = time.time()
+        targets = self.prioritize(await run_in_threadpool(self.collect))
+        batched = await self._run_batches(targets, now) if self.analyze_batch else {}
+        for target in targets:
+            key = (target["kind"], target["name"])
+            if key in batched:
+                self._store(key, target, batched[key], now)
+                continue
+            # In batch mode, zones left over after the budget ran out stay off the LLM
+            want_llm = self.needs_llm(target, now) and self.analyze_batch is None
+            self.budget.refill(time.monotonic())
+            use_llm = want_llm and self.budget.tokens >= 1
+            if want_llm and not use_llm:
+                self.counters["llm_deferred"] += 1
+            try:
+                insight = await self.analyze(target, use_llm)
+            except Exception as e:
+                self.counters["errors"] += 1
+                logger.error(f"Scheduled prediction failed for {key[0]} {key[1]}: {e}")
+                continue
+            if use_llm and insight.get("recommendation_source") not in FREE_SOURCES:
+                self._spend()
+            self._store(key, target, insight, now)
+
+        # Zones that left the telemetry window are dropped
+        live = {(t["kind"], t["name"]) for t in targets}
+        for key in [k for k in self.insights if k not in live]:
+            del self.insights[key]
+            self.llm_marks.pop(key, None)
+        self.counters["runs"] += 1
+        self.last_run_ms = round((time.perf_counter() - start) * 1000, 2)
+
+    async def _run_batches(self, targets: List[Dict[str, Any]], now: float) -> Dict[Key, Dict[str, Any]]:
+        """Analyse every zone that wants the LLM, `batch_size` zones per budgeted call"""
+        wanted = [t for t in targets if self.needs_llm(t, now)]
+        out: Dict[Key, Dict[str, Any]] = {}
+        for i in range(0, len(wanted), self.batch_size):
+            self.budget.refill(time.monotonic())
+            if self.budget.tokens < 1:
+                self.counters["llm_deferred"] += len(wanted) - i
+                break
+            chunk = wanted[i:i + self.batch_size]
+            try:
+                insights = await self.analyze_batch(chunk)
+            except Exception as e:
+                self.counters["errors"] += 1
+                logger.error(f"Batched prediction failed for {len(chunk)} zones: {e}")
+                break
+            if any(insight.get("recommendation_source") not in FREE_SOURCES for insight in insights):
+                self._spend()
+            self.counters["batched_zones"] += len(chunk)
+            out.update(((t["kind"], t["name"]), insight) for t, insight in zip(chunk, insights))
+        return out
+
+    def _spend(self):
+        self.budget.tokens -= 1
+        self.counters["llm_calls"] += 1
+
+    def _store(self, key: Key, target: Dict[str, Any], insight: Dict[str, Any], now: float):
+        self.counters["analyses"] += 1
+        # A cached answer came from the LLM too; rules and fallbacks are retried next cycle
+        if insight.get("recommendation_source") not in ("rules", "fallback"):
+            self.llm_marks[key] = (target["state"], now)
+        self.insights[key] = insight
+
+    async def _run(self):
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                self.counters["errors"] += 1
+                logger.error(f"Prediction scheduler run failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+            logger.info(f"Prediction scheduler started (every {self.interval}s)")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        self.budget.refill(time.monotonic())
+        return {
+            "interval_s": self.interval,
+            "llm_per_minute": self.budget.burst,
+            "batch_size": self.batch_size if self.analyze_batch else None,
+            "llm_budget_left": round(self.budget.tokens, 2),
+            "last_run_ms": self.last_run_ms,
+            **self.counters,
+            "zones": {f"{k}:{n}": i.get("network_state") for (k, n), i in self.insights.items()},
+        }
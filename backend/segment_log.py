@@ -0,0 +1,333 @@
+"""
+Segmented binary telemetry log
+Fixed-width records in size/time-rotated segment files. Each segment header
+carries min/max timestamps so range scans skip whole segments, and segments
+are read through mmap instead of parsing text.
+
+    python -m backend.segment_log convert backend/telemetry_log.json ./telemetry_segments
+    python -m backend.segment_log export ./telemetry_segments > telemetry_log.jsonl
+"""
+import argparse
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from backend.telemetry import parse_timestamp, to_epoch_ns
+
+logger = logging.getLogger("NetAgent")
+
+MAGIC = b"NTSG"
+VERSION = 1
+# magic, version, record size, reserved, min_ts_ns, max_ts_ns, record count
+HEADER = struct.Struct("<4sHHIqqQ")
+HEADER_SIZE = 64
+# epoch ns, device index, latency ms, packet loss
+RECORD = struct.Struct("<qIff")
+
+Record = Tuple[int, str, float, float]
+
+
+def _epoch_ns_to_iso(ts_ns: int) -> str:
+    return (datetime(1970, 1, 1) + timedelta(microseconds=ts_ns // 1000)).isoformat()
+
+
+class Segment:
+    def __init__(self, path: str):
+        self.path = path
+        self.min_ts = 0
+        self.max_ts = 0
+        self.count = 0
+        self.created_ns = int(os.path.basename(path)[4:-4])
+
+    @classmethod
+    def create(cls, directory: str, created_ns: int) -> "Segment":
+        path = os.path.join(directory, f"seg-{created_ns:020d}.bin")
+        with open(path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, RECORD.size, 0, 0, 0, 0).ljust(HEADER_SIZE, b"\0"))
+        return cls(path)
+
+    def load_header(self) -> "Segment":
+        with open(self.path, "rb") as f:
+            magic, version, record_size, _, self.min_ts, self.max_ts, self.count = HEADER.unpack(
+                f.read(HEADER.size)
+            )
+        if magic != MAGIC or record_size != RECORD.size:
+            raise ValueError(f"{self.path} is not a v{VERSION} telemetry segment")
+        return self
+
+    def header_bytes(self) -> bytes:
+        return HEADER.pack(MAGIC, VERSION, RECORD.size, 0, self.min_ts, self.max_ts, self.count)
+
+    @property
+    def size_bytes(self) -> int:
+        return HEADER_SIZE + self.count * RECORD.size
+
+    def overlaps(self, since_ns: Optional[int], until_ns: Optional[int]) -> bool:
+        if self.count == 0:
+            return False
+        if since_ns is not None and self.max_ts < since_ns:
+            return False
+        if until_ns is not None and self.min_ts > until_ns:
+            return False
+        return True
+
+    def iter_raw(self, start: int = 0, end: Optional[int] = None) -> Iterator[Tuple[int, int, float, float]]:
+        """(ts_ns, device_index, latency, loss) for records [start, end), via mmap"""
+        end = self.count if end is None else end
+        if end <= start:
+            return
+        with open(self.path, "rb") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                body = memoryview(mm)[HEADER_SIZE + start * RECORD.size:HEADER_SIZE + end * RECORD.size]
+                try:
+                    yield from RECORD.iter_unpack(body)
+                finally:
+                    body.release()
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "path": self.path,
+            "records": self.count,
+            "bytes": self.size_bytes,
+            "min_ts": _epoch_ns_to_iso(self.min_ts) if self.count else None,
+            "max_ts": _epoch_ns_to_iso(self.max_ts) if self.count else None,
+        }
+
+
+class SegmentLog:
+    def __init__(self, directory: str, max_segment_bytes: int = 64 * 1024 * 1024,
+                 max_segment_age_s: float = 3600, max_segments: int = 0):
+        """Rotate on `max_segment_bytes` or `max_segment_age_s`; keep `max_segments` (0 = all)"""
+        self.directory = directory
+        self.max_segment_bytes = max_segment_bytes
+        self.max_segment_age_s = max_segment_age_s
+        self.max_segments = max_segments
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+        self._devices_path = os.path.join(directory, "devices.jsonl")
+        self.devices: List[str] = []
+        self.device_index: Dict[str, int] = {}
+        if os.path.exists(self._devices_path):
+            with open(self._devices_path) as f:
+                for line in f:
+                    if line.strip():
+                        self._register_device(json.loads(line))
+
+        self.segments: List[Segment] = []
+        for name in sorted(os.listdir(directory)):
+            if name.startswith("seg-") and name.endswith(".bin"):
+                self.segments.append(Segment(os.path.join(directory, name)).load_header())
+        self._active = None
+        if self.segments:
+            self._open(self.segments[-1])
+
+    def append(self, records: List[Record]):
+        """Append (ts_ns, device_id, latency, loss) records"""
+        if not records:
+            return
+        with self._lock:
+            new_devices = []
+            indexed = []
+            for ts_ns, device_id, latency, loss in records:
+                index = self.device_index.get(device_id)
+                if index is None:
+                    index = self._register_device(device_id)
+                    new_devices.append(device_id)
+                indexed.append((ts_ns, index, latency, loss))
+            if new_devices:
+                with open(self._devices_path, "a") as f:
+                    f.write("".join(json.dumps(d) + "\n" for d in new_devices))
+
+            while indexed:
+                segment = self._writable_segment()
+                room = max(1, (self.max_segment_bytes - segment.size_bytes) // RECORD.size)
+                chunk, indexed = indexed[:room], indexed[room:]
+                self._write(segment, chunk)
+
+    def _write(self, segment: Segment, chunk: List[Tuple[int, int, float, float]]):
+        f = self._active
+        f.seek(segment.size_bytes)
+        f.write(b"".join(RECORD.pack(*r) for r in chunk))
+        f.flush()
+        timestamps = [r[0] for r in chunk]
+        segment.min_ts = min(timestamps) if segment.count == 0 else min(segment.min_ts, *timestamps)
+        segment.max_ts = max(segment.max_ts, *timestamps)
+        segment.count += len(chunk)
+        # Header is rewritten after the records so a crash never claims unwritten data
+        f.seek(0)
+        f.write(segment.header_bytes())
+        f.flush()
+
+    def scan(self, since_ns: Optional[int] = None, until_ns: Optional[int] = None,
+             device_id: Optional[str] = None) -> Iterator[Record]:
+        """Records in [since_ns, until_ns], skipping segments outside the range by header"""
+        with self._lock:
+            # Snapshot counts so concurrent appends are not half-read
+            segments = [(s, s.count) for s in self.segments if s.overlaps(since_ns, until_ns)]
+            devices = list(self.devices)
+            wanted = self.device_index.get(device_id) if device_id is not None else None
+        if device_id is not None and wanted is None:
+            return
+        for segment, count in segments:
+            try:
+                for ts_ns, index, latency, loss in segment.iter_raw(0, count):
+                    if since_ns is not None and ts_ns < since_ns:
+                        continue
+                    if until_ns is not None and ts_ns > until_ns:
+                        continue
+                    if wanted is not None and index != wanted:
+                        continue
+                    yield ts_ns, devices[index], latency, loss
+            except FileNotFoundError:
+                continue  # expired by retention after the snapshot; an open mmap keeps reading
+
+    def tail(self, n: int) -> List[Record]:
+        """Last `n` records; fixed-width records make this O(n)"""
+        with self._lock:
+            segments = [(s, s.count) for s in self.segments]
+            devices = list(self.devices)
+        out: List[Record] = []
+        for segment, count in reversed(segments):
+            if len(out) >= n:
+                break
+            need = n - len(out)
+            try:
+                chunk = [(ts, devices[i], lat, loss)
+                         for ts, i, lat, loss in segment.iter_raw(max(0, count - need), count)]
+            except FileNotFoundError:
+                break  # older segments were expired too
+            out = chunk + out
+        return out[-n:] if n > 0 else []
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "directory": self.directory,
+                "devices": len(self.devices),
+                "records": sum(s.count for s in self.segments),
+                "bytes": sum(s.size_bytes for s in self.segments),
+                "segments": [s.info() for s in self.segments],
+            }
+
+    def close(self):
+        with self._lock:
+            if self._active:
+                self._active.close()
+                self._active = None
+
+    def _register_device(self, device_id: str) -> int:
+        self.device_index[device_id] = len(self.devices)
+        self.devices.append(device_id)
+        return self.device_index[device_id]
+
+    def _open(self, segment: Segment):
+        if self._active:
+            self._active.close()
+        self._active = open(segment.path, "r+b")
+        # Drop a partially written tail left by a crash
+        self._active.truncate(segment.size_bytes)
+
+    def _writable_segment(self) -> Segment:
+        now = time.time_ns()
+        segment = self.segments[-1] if self.segments else None
+        if (segment is None
+                or segment.size_bytes >= self.max_segment_bytes
+                or (now - segment.created_ns) / 1e9 >= self.max_segment_age_s):
+            # Keep names unique and ordered even when rotating twice within a clock tick
+            created = max(now, segment.created_ns + 1) if segment else now
+            segment = Segment.create(self.directory, created)
+            self.segments.append(segment)
+            self._open(segment)
+            self._enforce_retention()
+            logger.info(f"Telemetry segment rotated: {segment.path}")
+        return segment
+
+    def _enforce_retention(self):
+        while self.max_segments and len(self.segments) > self.max_segments:
+            oldest = self.segments.pop(0)
+            os.remove(oldest.path)
+            logger.info(f"Telemetry segment expired: {oldest.path}")
+
+
+def convert_jsonl(jsonl_path: str, log: SegmentLog, chunk: int = 10000) -> int:
+    """Import an existing JSONL telemetry log; returns the number of records written"""
+    written = 0
+    buffer: List[Record] = []
+    with open(jsonl_path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if record.get("latency") is None or not record.get("timestamp"):
+                continue
+            buffer.append((
+                to_epoch_ns(parse_timestamp(record["timestamp"])),
+                record.get("deviceId") or "unknown",
+                float(record["latency"]),
+                float(record.get("packetLoss") or 0),
+            ))
+            if len(buffer) >= chunk:
+                log.append(buffer)
+                written += len(buffer)
+                buffer = []
+    log.append(buffer)
+    return written + len(buffer)
+
+
+def record_to_dict(record: Record) -> Dict[str, Any]:
+    """Segment record → dict in the telemetry_log.json record format"""
+    ts_ns, device_id, latency, loss = record
+    return {
+        "deviceId": device_id,
+        "latency": round(latency, 3),
+        "packetLoss": round(loss, 4),
+        "timestamp": _epoch_ns_to_iso(ts_ns),
+    }
+
+
+def export_jsonl(log: SegmentLog, out, since_ns: Optional[int] = None, until_ns: Optional[int] = None) -> int:
+    """Write records as JSONL in the telemetry_log.json record format"""
+    count = 0
+    for record in log.scan(since_ns, until_ns):
+        out.write(json.dumps(record_to_dict(record)) + "\n")
+        count += 1
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Segmented telemetry log tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+    convert = sub.add_parser("convert", help="import a JSONL telemetry log into segments")
+    convert.add_argument("jsonl")
+    convert.add_argument("directory")
+    export = sub.add_parser("export", help="write segments out as JSONL")
+    export.add_argument("directory")
+    export.add_argument("--since", help="ISO-8601 start time")
+    export.add_argument("--until", help="ISO-8601 end time")
+    sub.add_parser("info", help="show segment headers").add_argument("directory")
+    args = parser.parse_args(argv)
+
+    log = SegmentLog(args.directory)
+    try:
+        if args.command == "convert":
+            print(f"Converted {convert_jsonl(args.jsonl, log)} records into {args.directory}", file=sys.stderr)
+        elif args.command == "export":
+            since = to_epoch_ns(parse_timestamp(args.since)) if args.since else None
+            until = to_epoch_ns(parse_timestamp(args.until)) if args.until else None
+            export_jsonl(log, sys.stdout, since, until)
+        else:
+            print(json.dumps(log.stats(), indent=2))
+    finally:
+        log.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+Streaming latency percentiles
+Log-bucket histograms (relative-error quantiles, mergeable, O(1) insert) kept
+per device, per location and globally over a rotating time window
+"""
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional
+
+from backend.device_windows import TIMEOUT_LATENCY_MS
+
+QUANTILES = (0.5, 0.9, 0.95, 0.99)
+
+
+class LatencySketch:
+    """Bucket i covers (gamma^(i-1), gamma^i]; any quantile is within `relative_accuracy`
+
+    `timeout_ms` is the ping-timeout sentinel; pass None for durations that are not pings.
+    """
+
+    __slots__ = ("gamma", "log_gamma", "min_value", "timeout_ms", "buckets", "zero_count", "count", "timeouts", "max")
+
+    def __init__(self, relative_accuracy: float = 0.01, min_value: float = 0.01,
+                 timeout_ms: Optional[float] = TIMEOUT_LATENCY_MS):
+        self.timeout_ms = timeout_ms
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.min_value = min_value
+        self.buckets: Dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+        self.timeouts = 0
+        self.max = 0.0
+
+    def add(self, latency: float):
+        # Timeout sentinels (9999ms) are tracked as a rate, not as a latency
+        if self.timeout_ms is not None and latency >= self.timeout_ms:
+            self.timeouts += 1
+            return
+        self.count += 1
+        self.max = max(self.max, latency)
+        if latency <= self.min_value:
+            self.zero_count += 1
+            return
+        index = math.ceil(math.log(latency) / self.log_gamma)
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+
+    def merge(self, other: "LatencySketch"):
+        for index, n in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + n
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.timeouts += other.timeouts
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if rank < seen:
+                # Midpoint of the bucket in relative terms
+                return min(2 * self.gamma ** index / (self.gamma + 1), self.max)
+        return self.max
+
+    def summary(self) -> Dict[str, Any]:
+        total = self.count + self.timeouts
+        out = {f"p{int(q * 100)}": _round(self.quantile(q)) for q in QUANTILES}
+        out.update(count=self.count, max=_round(self.max) if self.count else None)
+        if self.timeout_ms is not None:
+            out.update(timeouts=self.timeouts, timeout_rate=round(self.timeouts / total, 4) if total else None)
+        return out
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return round(value, 2) if value is not None else None
+
+
+class WindowedSketch:
+    """Two sketches rotated every `window_s`; reads merge both (covers the last window_s..2*window_s)"""
+
+    __slots__ = ("window_s", "epoch", "current", "previous")
+
+    def __init__(self, window_s: float):
+        self.window_s = window_s
+        self.epoch = int(time.time() // window_s)
+        self.current = LatencySketch()
+        self.previous = LatencySketch()
+
+    def _rotate(self, now: float):
+        epoch = int(now // self.window_s)
+        if epoch == self.epoch:
+            return
+        self.previous = self.current if epoch == self.epoch + 1 else LatencySketch()
+        self.current = LatencySketch()
+        self.epoch = epoch
+
+    def add(self, latency: float, now: float):
+        self._rotate(now)
+        self.current.add(latency)
+
+    def snapshot(self, now: float) -> LatencySketch:
+        self._rotate(now)
+        merged = LatencySketch(timeout_ms=self.current.timeout_ms)
+        merged.merge(self.previous)
+        merged.merge(self.current)
+        return merged
+
+
+class SketchStore:
+    def __init__(self, window_s: float = 300, max_keys: int = 10000):
+        self.window_s = window_s
+        self.max_keys = max_keys
+        self.global_sketch = WindowedSketch(window_s)
+        self.devices: "OrderedDict[str, WindowedSketch]" = OrderedDict()
+        self.locations: "OrderedDict[str, WindowedSketch]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, latency: float, device_id: Optional[str] = None, location: Optional[str] = None):
+        now = time.time()
+        with self._lock:
+            self.global_sketch.add(latency, now)
+            if device_id is not None:
+                self._get(self.devices, device_id).add(latency, now)
+            if location is not None:
+                self._get(self.locations, location).add(latency, now)
+
+    def summary(self, device_id: Optional[str] = None, location: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            if device_id is not None:
+                sketch = self.devices.get(device_id)
+            elif location is not None:
+                sketch = self.locations.get(location)
+            else:
+                sketch = self.global_sketch
+            return sketch.snapshot(now).summary() if sketch else None
+
+    def location_summaries(self, names: Optional[Iterable[str]] = None) -> Dict[str, Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            names = list(self.locations) if names is None else [n for n in names if n in self.locations]
+            return {name: self.locations[name].snapshot(now).summary() for name in names}
+
+    def _get(self, table: "OrderedDict[str, WindowedSketch]", key: str) -> WindowedSketch:
+        sketch = table.get(key)
+        if sketch is None:
+            if len(table) >= self.max_keys:
+                table.popitem(last=False)  # least recently updated key first
+            sketch = table[key] = WindowedSketch(self.window_s)
+        else:
+            table.move_to_end(key)
+        return sketch
@@ -1,15 +1,117 @@
 import json
 import os
-from datetime import datetime
-
-def collect_metrics(data):
-    record = {
-        "deviceId": data.get("deviceId"),
-        "latency": data.get("latency"),
-        "packetLoss": data.get("packetLoss"),
-        "timestamp": datetime.utcnow().isoformat()
-    }
-    # Persist logs inside the backend folder so readers use a consistent path
-    log_path = os.path.join(os.path.dirname(__file__), "telemetry_log.json")
-    with open(log_path, "a") as f:
-        f.write(json.dumps(record) + "\n")
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+from pydantic import AliasChoices, BaseModel, ConfigDict, Field, TypeAdapter, field_validator
+
+# Persist logs inside the backend folder so readers use a consistent path
+LOG_PATH = os.path.join(os.path.dirname(__file__), "telemetry_log.json")
+
+class TelemetrySample(BaseModel):
+    """Fixed telemetry schema; accepts the field spellings agents have used"""
+    model_config = ConfigDict(extra="ignore", populate_by_name=True)
+
+    device_id: str = Field(validation_alias=AliasChoices("deviceId", "agent"))
+    agent: Optional[str] = None
+    latency: float
+    packet_loss: float = Field(0.0, validation_alias=AliasChoices("packetLoss", "packet_loss"))
+    location: Optional[str] = None
+    ssid: Optional[str] = None
+    bssid: Optional[str] = None
+    timestamp: Optional[datetime] = None
+
+    @field_validator("timestamp")
+    @classmethod
+    def _naive_utc(cls, value):
+        if value is not None and value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value
+
+    def to_record(self, timestamp):
+        return {
+            "deviceId": self.device_id,
+            "latency": self.latency,
+            "packetLoss": self.packet_loss,
+            "timestamp": timestamp.isoformat()
+        }
+
+sample_adapter = TypeAdapter(TelemetrySample)
+sample_list_adapter = TypeAdapter(List[TelemetrySample])
+
+def parse_timestamp(value):
+    """Parse an ISO-8601 sample timestamp into a naive UTC datetime"""
+    ts = datetime.fromisoformat(value)
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts
+
+def write_records(records):
+    """Append a batch of records to the log with a single open/write"""
+    if not records:
+        return
+    with open(LOG_PATH, "a") as f:
+        f.write("".join(json.dumps(record) + "\n" for record in records))
+
+def tail_records(n, path=None, block_size=8192):
+    """Return the last `n` records by seeking backwards from the end of the log"""
+    path = path or LOG_PATH
+    if n <= 0 or not os.path.exists(path):
+        return []
+
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        pos = f.tell()
+        data = b""
+        # One extra newline covers a partial first line, another a partial last one
+        while pos > 0 and data.count(b"\n") <= n + 1:
+            read = min(block_size, pos)
+            pos -= read
+            f.seek(pos)
+            data = f.read(read) + data
+
+    lines = data.split(b"\n")
+    if pos > 0:
+        lines = lines[1:]  # starts mid-line
+    lines = lines[:-1]  # after the final newline: empty, or a line still being written
+    lines = [line for line in lines if line.strip()]
+    return [json.loads(line) for line in lines[-n:]]
+
+def read_since(offset, limit=1000, path=None):
+    """Read up to `limit` complete records starting at byte `offset`
+
+    Returns (records, next_offset); pass next_offset back in to continue.
+    An offset past the end of the file (log truncated) restarts from 0, and
+    one that lands mid-line skips to the next line.
+    """
+    path = path or LOG_PATH
+    if not os.path.exists(path):
+        return [], 0
+
+    records = []
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        if offset > f.tell():
+            offset = 0
+        if offset > 0:
+            f.seek(offset - 1)
+            if f.read(1) != b"\n":
+                # Offset lands mid-line: resume at the next complete record
+                partial = f.readline()
+                if not partial.endswith(b"\n"):
+                    return [], offset
+                offset += len(partial)
+        f.seek(offset)
+        while len(records) < limit:
+            line = f.readline()
+            if not line.endswith(b"\n"):
+                break  # EOF or a line still being written
+            offset += len(line)
+            if line.strip():
+                records.append(json.loads(line))
+    return records, offset
+
+def to_epoch_ns(timestamp):
+    """Naive UTC datetime → integer nanoseconds since the epoch"""
+    return (timestamp - _EPOCH) // timedelta(microseconds=1) * 1000
+
+_EPOCH = datetime(1970, 1, 1)
@@ -0,0 +1,158 @@
+"""
+SQLite telemetry store (WAL mode)
+Indexed by (device_id, ts) and (location, ts) for time-range queries per device or zone
+"""
+import sqlite3
+import threading
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger("NetAgent")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS telemetry (
+    id INTEGER PRIMARY KEY,
+    ts INTEGER NOT NULL,            -- epoch milliseconds (UTC)
+    device_id TEXT NOT NULL,
+    agent TEXT,
+    location TEXT,
+    ssid TEXT,
+    bssid TEXT,
+    latency REAL,
+    packet_loss REAL
+);
+CREATE INDEX IF NOT EXISTS idx_telemetry_device_ts ON telemetry (device_id, ts);
+CREATE INDEX IF NOT EXISTS idx_telemetry_location_ts ON telemetry (location, ts);
+CREATE INDEX IF NOT EXISTS idx_telemetry_ts ON telemetry (ts);
+"""
+
+COLUMNS = ("id", "ts", "device_id", "agent", "location", "ssid", "bssid", "latency", "packet_loss")
+
+
+def _ms_to_iso(ts_ms: int) -> str:
+    return (datetime(1970, 1, 1) + timedelta(milliseconds=ts_ms)).isoformat()
+
+
+def row_to_dict(row: Tuple) -> Dict[str, Any]:
+    """Row → dict in the telemetry_log.json field naming"""
+    r = dict(zip(COLUMNS, row))
+    return {
+        "id": r["id"],
+        "deviceId": r["device_id"],
+        "agent": r["agent"],
+        "latency": r["latency"],
+        "packetLoss": r["packet_loss"],
+        "location": r["location"],
+        "ssid": r["ssid"],
+        "bssid": r["bssid"],
+        "timestamp": _ms_to_iso(r["ts"]),
+    }
+
+
+class TelemetryDB:
+    def __init__(self, path: str):
+        self.path = path
+        self._write_lock = threading.Lock()
+        self._writer = self._connect()
+        self._writer.executescript(SCHEMA)
+        # (count, first_ms, last_ms): scanned once on the first stats() call, then kept up to date on insert
+        self._totals: Optional[List[Any]] = None
+        logger.info(f"Telemetry DB ready at {path}")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def insert_many(self, rows: List[Tuple]):
+        """Insert (ts_ms, device_id, agent, location, ssid, bssid, latency, packet_loss) rows in one transaction"""
+        if not rows:
+            return
+        with self._write_lock, self._writer:
+            self._writer.executemany(
+                "INSERT INTO telemetry (ts, device_id, agent, location, ssid, bssid, latency, packet_loss) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            if self._totals is not None:
+                count, first, last = self._totals
+                stamps = [row[0] for row in rows]
+                self._totals = [
+                    count + len(rows),
+                    min(stamps) if first is None else min(first, min(stamps)),
+                    max(stamps) if last is None else max(last, max(stamps)),
+                ]
+
+    def iter_query(self, device_id: Optional[str] = None, location: Optional[str] = None,
+                   ssid: Optional[str] = None, since_ms: Optional[int] = None, until_ms: Optional[int] = None,
+                   after: Optional[Tuple[int, int]] = None, limit: Optional[int] = None,
+                   chunk: int = 1000) -> Iterator[Tuple]:
+        """Rows ordered by (ts, id); `after` is the (ts, id) keyset cursor of the previous page"""
+        clauses, params = [], []
+        for column, value in (("device_id", device_id), ("location", location), ("ssid", ssid)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if since_ms is not None:
+            clauses.append("ts >= ?")
+            params.append(since_ms)
+        if until_ms is not None:
+            clauses.append("ts <= ?")
+            params.append(until_ms)
+        if after is not None:
+            clauses.append("(ts > ? OR (ts = ? AND id > ?))")
+            params.extend([after[0], after[0], after[1]])
+        sql = f"SELECT {', '.join(COLUMNS)} FROM telemetry"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY ts, id"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+
+        # Readers get their own connection; WAL lets them run alongside the writer
+        conn = self._connect()
+        try:
+            cursor = conn.execute(sql, params)
+            while True:
+                rows = cursor.fetchmany(chunk)
+                if not rows:
+                    break
+                yield from rows
+        finally:
+            conn.close()
+
+    def query(self, limit: int = 1000, **filters) -> Dict[str, Any]:
+        """One page of results plus the cursor for the next page"""
+        rows = list(self.iter_query(limit=limit + 1, **filters))
+        page = rows[:limit]
+        next_cursor = None
+        if len(rows) > limit:
+            next_cursor = f"{page[-1][1]}:{page[-1][0]}"
+        return {"records": [row_to_dict(r) for r in page], "next_cursor": next_cursor}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._write_lock:
+            if self._totals is None:
+                self._totals = list(
+                    self._writer.execute("SELECT COUNT(*), MIN(ts), MAX(ts) FROM telemetry").fetchone()
+                )
+            count, first, last = self._totals
+        return {
+            "path": self.path,
+            "records": count,
+            "first": _ms_to_iso(first) if first is not None else None,
+            "last": _ms_to_iso(last) if last is not None else None,
+        }
+
+    def close(self):
+        with self._write_lock:
+            self._writer.close()
+
+
+def parse_cursor(cursor: str) -> Tuple[int, int]:
+    """'ts:id' → (ts, id)"""
+    ts, row_id = cursor.split(":")
+    return int(ts), int(row_id)
@@ -0,0 +1,268 @@
+"""
+Online zone clustering for the heatmap
+Mini-batch k-means over the same [latency, loss, time-of-day] embedding that
+Chroma stores, updated from every ingest flush. Centroids, member counts and
+health per zone are served from memory in O(k); a periodic background re-fit
+over a window of recent samples keeps centroids from drifting into stale shapes.
+"""
+import asyncio
+import datetime as dt
+import logging
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from starlette.concurrency import run_in_threadpool
+
+logger = logging.getLogger("NetAgent")
+
+DIMENSIONS = 3
+LABELS = ("location", "ssid", "bssid")
+MAX_LABEL_VALUES = 256
+
+
+def embed(latency: float, packet_loss: float, timestamp: Optional[dt.datetime] = None) -> List[float]:
+    """[latency_norm, packet_loss_norm, time_of_day], each 0-1"""
+    now = timestamp or dt.datetime.utcnow()
+    return [
+        min(latency / 1000.0, 1.0),               # 0-1000ms → 0-1
+        min(packet_loss, 1.0),
+        (now.hour * 60 + now.minute) / 1440.0,
+    ]
+
+
+def health_score(latency: float, packet_loss: float) -> float:
+    """0-100; latency weighted 60%, packet loss 40%"""
+    latency_score = max(0, 100 - (latency / 10))  # 1000ms = 0 score
+    packet_loss_score = max(0, 100 - (packet_loss * 500))  # 20% loss = 0 score
+    return latency_score * 0.6 + packet_loss_score * 0.4
+
+
+def health_color(score: float) -> str:
+    """Hex color, red → yellow → green"""
+    if score >= 80:
+        return "#22c55e"
+    elif score >= 60:
+        return "#84cc16"
+    elif score >= 40:
+        return "#eab308"
+    elif score >= 20:
+        return "#f97316"
+    return "#ef4444"
+
+
+def kmeans(points: np.ndarray, k: int, iters: int = 20, rng: Optional[np.random.Generator] = None) -> np.ndarray:
+    """Lloyd's algorithm with k-means++ seeding; returns k centroids"""
+    rng = rng or np.random.default_rng()
+    centroids = np.empty((k, points.shape[1]))
+    centroids[0] = points[rng.integers(len(points))]
+    closest = ((points - centroids[0]) ** 2).sum(axis=1)
+    for i in range(1, k):
+        total = closest.sum()
+        pick = rng.choice(len(points), p=closest / total) if total > 0 else rng.integers(len(points))
+        centroids[i] = points[pick]
+        closest = np.minimum(closest, ((points - centroids[i]) ** 2).sum(axis=1))
+    for _ in range(iters):
+        assign, dist = nearest(points, centroids)
+        counts = np.bincount(assign, minlength=k)
+        sums = cluster_sums(points, assign, k)
+        moved = np.where(counts[:, None] > 0, sums / np.maximum(counts, 1)[:, None], centroids)
+        # An empty cluster restarts on the point worst served by the others
+        for i in np.flatnonzero(counts == 0):
+            far = int(dist.argmax())
+            moved[i] = points[far]
+            dist[far] = 0.0
+        if np.allclose(moved, centroids):
+            break
+        centroids = moved
+    return centroids
+
+
+def cluster_sums(points: np.ndarray, assign: np.ndarray, k: int) -> np.ndarray:
+    """Per-cluster sum of member points (bincount per dimension beats np.add.at by far)"""
+    return np.stack([np.bincount(assign, weights=points[:, d], minlength=k) for d in range(points.shape[1])], axis=1)
+
+
+def nearest(points: np.ndarray, centroids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """(index of the closest centroid, squared distance to it) per point"""
+    d = ((points[:, None, :] - centroids[None, :, :]) ** 2).sum(axis=2)
+    assign = d.argmin(axis=1)
+    return assign, d[np.arange(len(points)), assign]
+
+
+class ZoneClusterer:
+    def __init__(self, k: int = 8, window: int = 20000, refit_interval: float = 300, refit_iters: int = 20,
+                 seed: int = 0):
+        """`window` recent samples are kept for re-fits; `refit_interval` seconds between them (0 disables)"""
+        self.k = k
+        self.window = window
+        self.refit_interval = refit_interval
+        self.refit_iters = refit_iters
+        self.rng = np.random.default_rng(seed)
+        # Ring of recent samples: embedding, raw metrics and labels
+        self.points = np.zeros((window, DIMENSIONS))
+        self.latency = np.zeros(window)
+        self.loss = np.zeros(window)
+        self.labels: List[Optional[Tuple[Optional[str], ...]]] = [None] * window
+        self.pos = 0
+        self.filled = 0
+        self.centroids: Optional[np.ndarray] = None
+        self._reset_stats()
+        self.counters = {"samples": 0, "batches": 0, "refits": 0}
+        self.last_refit_ms = 0.0
+        self.last_refit_at = None
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def _reset_stats(self):
+        self.counts = np.zeros(self.k)
+        self.lat_sum = np.zeros(self.k)
+        self.loss_sum = np.zeros(self.k)
+        self.last_seen = np.zeros(self.k)
+        self.label_counts: List[Dict[str, Dict[str, int]]] = [{name: {} for name in LABELS} for _ in range(self.k)]
+
+    def add_batch(self, rows: List[Tuple]):
+        """Feed (latency, packet_loss, timestamp, location, ssid, bssid) rows from one ingest flush"""
+        if not rows:
+            return
+        points = np.array([embed(r[0], r[1], r[2]) for r in rows])
+        latency = np.array([r[0] for r in rows], dtype=float)
+        loss = np.array([r[1] for r in rows], dtype=float)
+        labels = [tuple(r[3:6]) for r in rows]
+        now = time.time()
+        with self._lock:
+            self._remember(points, latency, loss, labels)
+            self.counters["samples"] += len(rows)
+            self.counters["batches"] += 1
+            if self.centroids is None:
+                if self.filled >= self.k:
+                    self._fit_locked()
+                return
+            assign, _ = nearest(points, self.centroids)
+            n = np.bincount(assign, minlength=self.k)
+            sums = cluster_sums(points, assign, self.k)
+            # Mini-batch k-means step: each centroid moves by its members' pull over its lifetime count
+            self.counts += n
+            moved = n > 0
+            self.centroids[moved] += (sums[moved] - n[moved, None] * self.centroids[moved]) / self.counts[moved, None]
+            self._accumulate(assign, latency, loss, labels, now)
+
+    def _remember(self, points, latency, loss, labels):
+        for start in range(0, len(points), self.window):
+            chunk = slice(start, start + self.window)
+            count = len(points[chunk])
+            idx = (self.pos + np.arange(count)) % self.window
+            self.points[idx] = points[chunk]
+            self.latency[idx] = latency[chunk]
+            self.loss[idx] = loss[chunk]
+            for i, label in zip(idx, labels[chunk]):
+                self.labels[i] = label
+            self.pos = (self.pos + count) % self.window
+            self.filled = min(self.window, self.filled + count)
+
+    def _accumulate(self, assign, latency, loss, labels, now):
+        self.lat_sum += np.bincount(assign, weights=latency, minlength=self.k)
+        self.loss_sum += np.bincount(assign, weights=loss, minlength=self.k)
+        self.last_seen[np.unique(assign)] = now
+        for cluster, label in zip(assign.tolist(), labels):
+            counters = self.label_counts[cluster]
+            for name, value in zip(LABELS, label):
+                # Bounded between re-fits; a label first seen once the table is full is not counted
+                if value and (value in counters[name] or len(counters[name]) < MAX_LABEL_VALUES):
+                    counters[name][value] = counters[name].get(value, 0) + 1
+
+    def _fit_locked(self, centroids: Optional[np.ndarray] = None):
+        """Adopt `centroids` (or fit them here) and rebuild per-zone stats from the window"""
+        points = self.points[:self.filled]
+        if centroids is None:
+            centroids = kmeans(points, self.k, self.refit_iters, self.rng)
+        self.centroids = centroids
+        self._reset_stats()
+        assign, _ = nearest(points, centroids)
+        self.counts = np.bincount(assign, minlength=self.k).astype(float)
+        self._accumulate(assign, self.latency[:self.filled], self.loss[:self.filled], self.labels[:self.filled], time.time())
+
+    def refit(self):
+        """Full k-means over the current window; the slow part runs without holding the lock"""
+        with self._lock:
+            if self.filled < self.k:
+                return
+            snapshot = self.points[:self.filled].copy()
+        start = time.perf_counter()
+        centroids = kmeans(snapshot, self.k, self.refit_iters, self.rng)
+        with self._lock:
+            # Reassign the window as it is now, including samples that arrived during the fit
+            self._fit_locked(centroids)
+            self.counters["refits"] += 1
+        self.last_refit_ms = round((time.perf_counter() - start) * 1000, 2)
+        self.last_refit_at = time.time()
+
+    def zones(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Non-empty clusters, worst health first, in the shape the heatmap expects"""
+        with self._lock:
+            if self.centroids is None:
+                return []
+            total = self.counts.sum()
+            zones = []
+            for i in np.flatnonzero(self.counts > 0):
+                members = self.counts[i]
+                latency = self.lat_sum[i] / members
+                loss = self.loss_sum[i] / members
+                score = health_score(latency, loss)
+                top = {name: sorted(values, key=values.get, reverse=True)[:3]
+                       for name, values in self.label_counts[i].items()}
+                zones.append({
+                    "device_id": f"zone-{i}",
+                    "zone": int(i),
+                    "centroid": [round(float(v), 4) for v in self.centroids[i]],
+                    "embedding": [round(float(v), 4) for v in self.centroids[i]],
+                    "members": int(members),
+                    "share": round(float(members / total), 4),
+                    "latency": round(float(latency), 2),
+                    "packet_loss": round(float(loss), 4),
+                    "health_score": round(score, 1),
+                    "color": health_color(score),
+                    "timestamp": dt.datetime.utcfromtimestamp(self.last_seen[i]).isoformat(),
+                    "location": top["location"][0] if top["location"] else None,
+                    "ssid": top["ssid"][0] if top["ssid"] else None,
+                    "bssid": top["bssid"][0] if top["bssid"] else None,
+                    "locations": top["location"],
+                    "ssids": top["ssid"],
+                })
+        zones.sort(key=lambda z: z["health_score"])
+        return zones[:limit] if limit else zones
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.refit_interval)
+            try:
+                await run_in_threadpool(self.refit)
+            except Exception as e:
+                logger.error(f"Zone clustering re-fit failed: {e}")
+
+    def start(self):
+        if self._task is None and self.refit_interval > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "k": self.k,
+                "count": int(self.filled),
+                "window": self.window,
+                "fitted": self.centroids is not None,
+                "refit_interval_s": self.refit_interval,
+                "last_refit_ms": self.last_refit_ms,
+                "last_refit_at": self.last_refit_at,
+                **self.counters,
+            }